@@ -0,0 +1,164 @@
+import json
+
+from qgis.PyQt.QtCore import QObject, QEventLoop, QTimer, QUrl
+
+try:
+    from qgis.PyQt.QtNetwork import QAbstractSocket
+    from qgis.PyQt.QtWebSockets import QWebSocket
+except ImportError:
+    # Some QGIS builds ship without the QtWebSockets module; the plugin then uses HTTP.
+    QWebSocket = None
+
+# Message types that end a request.
+FINAL_TYPES = ("initialized", "chat", "done", "closed", "error", "cancelled")
+
+
+class ChannelResponse:
+    """The final message of a channel request, with the interface of a requests response"""
+
+    def __init__(self, message):
+        self.message = message
+        self.status_code = (
+            message.get("status", 500) if message["type"] == "error" else 200
+        )
+
+    def json(self):
+        return self.message
+
+
+class SessionChannel(QObject):
+    """
+    WebSocket connection to the /ws endpoint of one session.
+
+    Requests are multiplexed over the connection and answered through Qt signals, so
+    waiting for an answer runs the Qt event loop: QGIS stays responsive while a model
+    generates or a query runs, and tokens, progress and rows arrive as they are produced.
+    """
+
+    def __init__(self, api_url, session_id, parent=None):
+        super().__init__(parent)
+        scheme, _, address = api_url.rstrip("/").partition("://")
+        self.url = f"{'wss' if scheme == 'https' else 'ws'}://{address}/ws/{session_id}"
+
+        self.socket = QWebSocket()
+        self.socket.textMessageReceived.connect(self.message_received)
+        self.socket.disconnected.connect(self.connection_lost)
+
+        self.handlers = {}
+        self.next_id = 0
+
+    @staticmethod
+    def available():
+        """Whether this QGIS build can open WebSocket connections"""
+        return QWebSocket is not None
+
+    def open(self, timeout_ms=5000):
+        """Connect to the server; returns False if it does not answer or has no /ws endpoint"""
+        loop = QEventLoop()
+        self.socket.connected.connect(loop.quit)
+        self.socket.disconnected.connect(loop.quit)
+        QTimer.singleShot(timeout_ms, loop.quit)
+
+        self.socket.open(QUrl(self.url))
+        if self.socket.state() != QAbstractSocket.ConnectedState:
+            loop.exec_()
+
+        self.socket.connected.disconnect(loop.quit)
+        self.socket.disconnected.disconnect(loop.quit)
+
+        return self.is_open()
+
+    def is_open(self):
+        return self.socket.state() == QAbstractSocket.ConnectedState
+
+    def close(self):
+        self.socket.close()
+
+    def send(self, message_type, fields=None, on_message=None):
+        """
+        Send a request. on_message is called with every message of the request, the
+        last one being of a type in FINAL_TYPES. Returns the request id.
+        """
+        request_id = self.next_id
+        self.next_id += 1
+
+        self.handlers[request_id] = on_message or (lambda message: None)
+        self.socket.sendTextMessage(
+            json.dumps({**(fields or {}), "type": message_type, "id": request_id})
+        )
+
+        return request_id
+
+    def cancel(self, request_id):
+        """Cancel a running request; it ends with a "cancelled" message"""
+        if request_id in self.handlers:
+            self.socket.sendTextMessage(
+                json.dumps({"type": "cancel", "id": request_id})
+            )
+
+    def call(self, message_type, fields=None, on_message=None, timeout_ms=60000):
+        """
+        Send a request and run the event loop until it ends (or times out).
+
+        Returns a ChannelResponse for its final message.
+        """
+        loop = QEventLoop()
+        final = {}
+
+        def handle(message):
+            if message["type"] in FINAL_TYPES:
+                final["message"] = message
+                loop.quit()
+            elif on_message is not None:
+                on_message(message)
+
+        request_id = self.send(message_type, fields, handle)
+
+        timer = QTimer()
+        timer.setSingleShot(True)
+        timer.timeout.connect(loop.quit)
+        timer.start(timeout_ms)
+
+        if "message" not in final:
+            loop.exec_()
+        timer.stop()
+
+        if "message" not in final:
+            self.cancel(request_id)
+            self.handlers.pop(request_id, None)
+            return ChannelResponse(
+                {
+                    "type": "error",
+                    "id": request_id,
+                    "status": 504,
+                    "detail": "The server did not answer in time.",
+                }
+            )
+
+        return ChannelResponse(final["message"])
+
+    def message_received(self, text):
+        message = json.loads(text)
+
+        if message.get("type") in FINAL_TYPES:
+            handler = self.handlers.pop(message.get("id"), None)
+        else:
+            handler = self.handlers.get(message.get("id"))
+
+        if handler is not None:
+            handler(message)
+        elif message.get("id") is None:
+            print(f"Spatial Mind channel: {message}")
+
+    def connection_lost(self):
+        """End the requests still running with an error"""
+        handlers, self.handlers = self.handlers, {}
+        for request_id, handler in handlers.items():
+            handler(
+                {
+                    "type": "error",
+                    "id": request_id,
+                    "status": 503,
+                    "detail": "The connection to the server was lost.",
+                }
+            )
@@ -1,10 +1,28 @@
 import os
 import re
 import json
+import time
 import base64
 import requests
 
-from qgis.PyQt.QtCore import QSettings, QTranslator, QCoreApplication, Qt, QVariant
+try:
+    # Ask for compressed results, including zstd when urllib3 can decode it.
+    from urllib3.util.request import ACCEPT_ENCODING
+except ImportError:
+    ACCEPT_ENCODING = "gzip, deflate"
+
+from qgis.PyQt.QtCore import (
+    QSettings,
+    QTranslator,
+    QCoreApplication,
+    Qt,
+    QVariant,
+    QDate,
+    QTime,
+    QDateTime,
+    QTimer,
+    QEventLoop,
+)
 from qgis.PyQt.QtGui import QIcon
 from qgis.PyQt.QtWidgets import (
     QAction,
@@ -22,8 +40,12 @@ from qgis.PyQt.QtWidgets import (
     QWidget,
     QFileDialog,
     QComboBox,
+    QProgressDialog,
 )
 from qgis.core import (
+    Qgis,
+    QgsApplication,
+    QgsTask,
     QgsProject,
     QgsVectorLayer,
     QgsFeature,
@@ -34,6 +56,36 @@ from qgis.core import (
     QgsCoordinateReferenceSystem,
 )
 
+from .session_channel import SessionChannel, FINAL_TYPES
+
+# Rows per result page; the first page is shown while the rest loads.
+PAGE_SIZE = 5000
+
+# Milliseconds between two page requests while a query is still producing rows.
+PAGE_POLL_INTERVAL = 500
+
+# QGIS field type of each column type reported by the API; other columns are strings.
+FIELD_TYPES = {
+    "boolean": QVariant.Bool,
+    "integer": QVariant.Int,
+    "bigint": QVariant.LongLong,
+    "double": QVariant.Double,
+    # NUMERIC values arrive as exact decimal strings; a Double field would round them.
+    "numeric": QVariant.String,
+    "interval": QVariant.Double,
+    "date": QVariant.Date,
+    "time": QVariant.Time,
+    "datetime": QVariant.DateTime,
+}
+
+# Conversion of the JSON values of a column type to attribute values.
+VALUE_CONVERTERS = {
+    "date": lambda value: QDate.fromString(value[:10], Qt.ISODate),
+    "time": lambda value: QTime.fromString(value[:8], Qt.ISODate),
+    "datetime": lambda value: QDateTime.fromString(value, Qt.ISODateWithMs),
+    "json": json.dumps,
+}
+
 
 class SQLQueryDialog(QDialog):
     def __init__(self, iface=None, parent=None):
@@ -47,6 +99,10 @@ class SQLQueryDialog(QDialog):
         self.vision_session_id = None
         self.api_url = "http://localhost:8000"
         self.current_image_path = None
+        self.uploaded_images = {}
+        self.channels = {}
+        # Running page downloads; QgsTask objects must be referenced until they finish.
+        self.page_tasks = set()
 
         self.init_ui()
 
@@ -118,7 +174,9 @@ class SQLQueryDialog(QDialog):
 
         # Chatbot type selection
         self.text_chatbot_type_combo = QComboBox()
-        self.text_chatbot_type_combo.addItems(["gemini_text", "ollama_text"])
+        self.text_chatbot_type_combo.addItems(
+            ["gemini_text", "ollama_text", "hedged_text"]
+        )
         text_model_layout.addRow("Chatbot Type:", self.text_chatbot_type_combo)
 
         # Model name input
@@ -289,15 +347,38 @@ class SQLQueryDialog(QDialog):
         except Exception as e:
             raise Exception(f"Failed to encode image: {str(e)}")
 
+    def upload_image(self, image_path, force=False):
+        """Upload image to the API once and return its content id"""
+        stat = os.stat(image_path)
+        cache_key = (self.api_url, image_path, stat.st_mtime, stat.st_size)
+
+        if not force and cache_key in self.uploaded_images:
+            return self.uploaded_images[cache_key]
+
+        with open(image_path, "rb") as image_file:
+            response = requests.post(
+                f"{self.api_url}/images",
+                files={"file": (os.path.basename(image_path), image_file)},
+                timeout=60,
+            )
+
+        if response.status_code != 200:
+            error_msg = response.json().get("detail", "Unknown error")
+            raise Exception(f"Failed to upload image: {error_msg}")
+
+        image_id = response.json()["image_id"]
+        self.uploaded_images[cache_key] = image_id
+        print(f"Uploaded image {image_path} as {image_id}")
+
+        return image_id
+
     def initialize_text_session(self):
         """Initialize text chatbot session"""
         try:
             # Close existing text session if any
             if self.text_session_id:
                 try:
-                    requests.delete(
-                        f"{self.api_url}/session/{self.text_session_id}", timeout=5
-                    )
+                    self.close_session(self.text_session_id)
                     print(f"Closed existing text session: {self.text_session_id}")
                 except:
                     pass
@@ -331,10 +412,9 @@ class SQLQueryDialog(QDialog):
             print(f"Initializing text session: {self.text_session_id}")
             print(f"Using chatbot type: {chatbot_type}, model: {model_name}")
 
-            # Send request
-            response = requests.post(
-                f"{self.api_url}/initialize", json=data, timeout=30
-            )
+            # Send request, over the session's WebSocket channel when the server has one
+            self.open_channel(self.text_session_id)
+            response = self.post("initialize", "/initialize", data, timeout=30)
 
             if response.status_code == 200:
                 self.text_status_label.setText(
@@ -352,6 +432,7 @@ class SQLQueryDialog(QDialog):
                 QMessageBox.warning(
                     self, "Error", f"Failed to initialize text session: {error_msg}"
                 )
+                self.close_channel(self.text_session_id)
                 self.text_session_id = None
 
         except Exception as e:
@@ -359,6 +440,7 @@ class SQLQueryDialog(QDialog):
 
             print(traceback.format_exc())
             QMessageBox.critical(self, "Error", f"Connection error: {str(e)}")
+            self.close_channel(self.text_session_id)
             self.text_session_id = None
 
     def initialize_vision_session(self):
@@ -367,9 +449,7 @@ class SQLQueryDialog(QDialog):
             # Close existing vision session if any
             if self.vision_session_id:
                 try:
-                    requests.delete(
-                        f"{self.api_url}/session/{self.vision_session_id}", timeout=5
-                    )
+                    self.close_session(self.vision_session_id)
                     print(f"Closed existing vision session: {self.vision_session_id}")
                 except:
                     pass
@@ -403,10 +483,9 @@ class SQLQueryDialog(QDialog):
             print(f"Initializing vision session: {self.vision_session_id}")
             print(f"Using chatbot type: {chatbot_type}, model: {model_name}")
 
-            # Send request
-            response = requests.post(
-                f"{self.api_url}/initialize", json=data, timeout=30
-            )
+            # Send request, over the session's WebSocket channel when the server has one
+            self.open_channel(self.vision_session_id)
+            response = self.post("initialize", "/initialize", data, timeout=30)
 
             if response.status_code == 200:
                 self.vision_status_label.setText(
@@ -424,6 +503,7 @@ class SQLQueryDialog(QDialog):
                 QMessageBox.warning(
                     self, "Error", f"Failed to initialize vision session: {error_msg}"
                 )
+                self.close_channel(self.vision_session_id)
                 self.vision_session_id = None
 
         except Exception as e:
@@ -431,6 +511,7 @@ class SQLQueryDialog(QDialog):
 
             print(traceback.format_exc())
             QMessageBox.critical(self, "Error", f"Connection error: {str(e)}")
+            self.close_channel(self.vision_session_id)
             self.vision_session_id = None
 
     def get_text_sql_query(self):
@@ -452,7 +533,13 @@ class SQLQueryDialog(QDialog):
             # Send chat request to /chat/text endpoint
             data = {"session_id": self.text_session_id, "message": question}
 
-            response = requests.post(f"{self.api_url}/chat/text", json=data, timeout=60)
+            response = self.post(
+                "chat",
+                "/chat/text",
+                data,
+                timeout=60,
+                on_message=self.stream_to(self.text_response_display),
+            )
 
             if response.status_code == 200:
                 chatbot_response = response.json()["response"]
@@ -503,17 +590,36 @@ class SQLQueryDialog(QDialog):
 
             print(f"Sending vision query: {question}")
 
-            # Send chat request to /chat/vision endpoint
+            # Upload the image once; follow-up questions only send its id
             data = {
                 "session_id": self.vision_session_id,
                 "message": question,
-                "image": self.current_image_path,
+                "image_id": self.upload_image(self.current_image_path),
             }
 
-            response = requests.post(
-                f"{self.api_url}/chat/vision", json=data, timeout=60
+            response = self.post(
+                "chat",
+                "/chat/vision",
+                data,
+                timeout=60,
+                on_message=self.stream_to(self.vision_response_display),
             )
 
+            # The server evicted the image; upload it again and retry once
+            if response.status_code == 404 and response.json().get(
+                "detail", ""
+            ).startswith("Image"):
+                data["image_id"] = self.upload_image(
+                    self.current_image_path, force=True
+                )
+                response = self.post(
+                    "chat",
+                    "/chat/vision",
+                    data,
+                    timeout=60,
+                    on_message=self.stream_to(self.vision_response_display),
+                )
+
             if response.status_code == 200:
                 chatbot_response = response.json()["response"]
                 self.vision_response_display.setText(chatbot_response)
@@ -543,6 +649,70 @@ class SQLQueryDialog(QDialog):
             print(traceback.format_exc())
             QMessageBox.critical(self, "Error", f"Request error: {str(e)}")
 
+    def open_channel(self, session_id):
+        """
+        Open the WebSocket channel of a session. Requests of the session then go over it;
+        without QtWebSockets or on servers without the /ws endpoint they use HTTP.
+        """
+        if not SessionChannel.available():
+            return None
+
+        channel = SessionChannel(self.api_url, session_id, self)
+        if not channel.open():
+            print("WebSocket channel unavailable, using HTTP requests")
+            channel.close()
+            return None
+
+        self.channels[session_id] = channel
+        return channel
+
+    def close_channel(self, session_id):
+        channel = self.channels.pop(session_id, None)
+        if channel is not None:
+            channel.close()
+
+    def post(self, message_type, path, data, timeout, on_message=None):
+        """
+        Send a request of a session over its channel (as a message of the given type),
+        or as an HTTP POST to the path. Returns a response with status_code and json().
+        """
+        channel = self.channels.get(data["session_id"])
+        if channel is None or not channel.is_open():
+            return requests.post(f"{self.api_url}{path}", json=data, timeout=timeout)
+
+        fields = {key: value for key, value in data.items() if key != "session_id"}
+
+        # The event loop runs while waiting; keep the dialog from sending another request.
+        self.setEnabled(False)
+        try:
+            return channel.call(message_type, fields, on_message, timeout * 1000)
+        finally:
+            self.setEnabled(True)
+
+    def close_session(self, session_id):
+        """Close a session on the server and its channel"""
+        channel = self.channels.get(session_id)
+        try:
+            if channel is not None and channel.is_open():
+                channel.call("close", timeout_ms=5000)
+            else:
+                requests.delete(f"{self.api_url}/session/{session_id}", timeout=5)
+        finally:
+            self.close_channel(session_id)
+
+    def stream_to(self, display):
+        """Return a message handler showing a chat answer in a display while it is generated"""
+        answers = {}
+
+        def on_message(message):
+            if message["type"] == "token":
+                # Each model call (rephrasing, answer, repair) streams its own text.
+                call = message["call"]
+                answers[call] = answers.get(call, "") + message["text"]
+                display.setPlainText(answers[call])
+
+        return on_message
+
     def extract_sql_query(self, response):
         """Extract SQL query from chatbot response"""
         # Look for ```sql ... ``` pattern
@@ -580,46 +750,446 @@ class SQLQueryDialog(QDialog):
                 QMessageBox.warning(self, "Warning", "Session not initialized")
                 return
 
-            # Send execute request to API
-            data = {"session_id": session_id, "query": sql_query}
+            result = self.run_query_job(session_id, sql_query)
+            if result is None:
+                return
 
-            response = requests.post(f"{self.api_url}/execute", json=data, timeout=30)
+            rows, column_names, column_types, truncated, next_page = result
 
-            if response.status_code == 200:
-                result = response.json()
+            if not rows:
+                if next_page is not None:
+                    next_page(discard=True)
+                QMessageBox.information(self, "Info", "Query returned no results")
+                return
 
-                if not result["success"]:
-                    QMessageBox.critical(
-                        self, "Error", f"Query execution failed: {result['error']}"
-                    )
-                    return
+            # Check if there's a geometry column
+            geom_col_index = self.find_geometry_column(column_names, rows[0])
 
-                rows = result["rows"]
-                column_names = result["column_names"]
+            if geom_col_index is not None:
+                append = self.add_vector_layer(
+                    rows, column_names, geom_col_index, column_types
+                )
+            else:
+                append = self.add_attribute_table(rows, column_names, column_types)
 
-                if not rows:
-                    QMessageBox.information(self, "Info", "Query returned no results")
-                    return
+            if next_page is not None:
+                if append is None:
+                    next_page(discard=True)
+                else:
+                    # Show the first page now and append the rest as it arrives.
+                    self.load_remaining_pages(next_page, append, len(rows))
+                return
 
-                # Check if there's a geometry column
-                geom_col_index = self.find_geometry_column(column_names, rows[0])
+            if append is None:
+                return
 
-                if geom_col_index is not None:
-                    self.add_vector_layer(rows, column_names, geom_col_index)
-                else:
-                    self.add_attribute_table(rows, column_names)
+            message = f"Added layer with {len(rows)} features!"
+            if truncated:
+                message += " The result was truncated by the server's row limit."
+            QMessageBox.information(self, "Success", message)
 
-                QMessageBox.information(
-                    self, "Success", f"Added layer with {len(rows)} features!"
+        except Exception as e:
+            QMessageBox.critical(self, "Error", f"Execution error: {str(e)}")
+
+    def load_remaining_pages(self, next_page, append, loaded):
+        """
+        Load the remaining pages of a result one request at a time and append them to
+        the layer showing the first page. The requests run in the background (see
+        run_query_job); each page is appended on the GUI thread once it arrived.
+        """
+
+        def on_page(rows, finished, error):
+            nonlocal loaded
+            if error is not None:
+                self.notify(f"Loading the remaining results failed: {str(error)}", True)
+                return
+
+            if rows:
+                append(rows)
+                loaded += len(rows)
+
+            if finished is None:
+                # No new rows while the query is still running; ask again in a moment.
+                QTimer.singleShot(
+                    0 if rows else PAGE_POLL_INTERVAL, lambda: next_page(on_page)
+                )
+                return
+
+            if finished.get("error"):
+                self.notify(
+                    f"Query execution failed after {loaded} rows: {finished['error']}",
+                    True,
+                )
+            elif finished.get("truncated"):
+                self.notify(
+                    f"Loaded {loaded} rows. The result was truncated by the server's "
+                    f"row limit.",
+                    True,
                 )
             else:
-                error_msg = response.json().get("detail", "Unknown error")
-                QMessageBox.warning(
-                    self, "Error", f"Failed to execute query: {error_msg}"
+                self.notify(f"Loaded all {loaded} rows.")
+
+        self.notify(f"Showing the first {loaded} rows; loading the rest...")
+        next_page(on_page)
+
+    def in_background(self, fetch, on_page):
+        """
+        Run a blocking page request (fetch returns (rows, finished)) in a QgsTask worker
+        thread, so QGIS stays responsive while it downloads, and call
+        on_page(rows, finished, error) on the GUI thread when it completes.
+        """
+
+        def completed(exception, result=None):
+            self.page_tasks.discard(task)
+            if exception is not None:
+                on_page(None, None, exception)
+            else:
+                on_page(*result, None)
+
+        task = QgsTask.fromFunction(
+            "Spatial Mind: loading results",
+            lambda task: fetch(),
+            on_finished=completed,
+        )
+        self.page_tasks.add(task)
+        QgsApplication.taskManager().addTask(task)
+
+    def notify(self, message, warning=False):
+        """Show a message in the QGIS message bar (without blocking the user)"""
+        print(message)
+        if self.iface:
+            self.iface.messageBar().pushMessage(
+                "Spatial Mind",
+                message,
+                level=Qgis.Warning if warning else Qgis.Info,
+                duration=10,
+            )
+
+    def run_query_job(self, session_id, sql_query):
+        """
+        Execute a query as a background job on the server and download its first page.
+
+        Quick queries finish within the first status request. Longer ones show a progress
+        dialog with the number of rows fetched so far and a Cancel button until the first
+        page is available, so no request has to stay open for the whole query. Falls back
+        to /execute on servers without the job API.
+
+        Returns (rows, column_names, column_types, truncated, next_page), or None if the
+        query failed or was cancelled (the user has been told). next_page is None when
+        the rows are complete; otherwise next_page(on_page) requests the next page in
+        the background and calls on_page(rows, finished, error) on the GUI thread, where
+        finished is None while pages remain and the final job info afterwards, and
+        next_page(discard=True) frees the result on the server instead.
+        """
+        channel = self.channels.get(session_id)
+        if channel is not None and channel.is_open():
+            return self.run_query_channel(channel, sql_query)
+
+        data = {"session_id": session_id, "query": sql_query}
+
+        response = requests.post(f"{self.api_url}/jobs", json=data, timeout=30)
+
+        if response.status_code in (404, 405) and (
+            response.json().get("detail") in ("Not Found", "Method Not Allowed")
+        ):
+            return self.execute_query(data)
+
+        if response.status_code != 202:
+            error_msg = response.json().get("detail", "Unknown error")
+            QMessageBox.warning(self, "Error", f"Failed to execute query: {error_msg}")
+            return None
+
+        job_url = f"{self.api_url}/jobs/{response.json()['job_id']}"
+        job = self.poll_job(job_url, wait=2)
+
+        progress = None
+        try:
+            while (
+                job is not None
+                and job["status"] in ("queued", "running")
+                and job.get("rows_fetched", 0) < PAGE_SIZE
+            ):
+                if progress is None:
+                    progress = QProgressDialog("Running query...", "Cancel", 0, 0, self)
+                    progress.setWindowTitle("Spatial Mind")
+                    progress.setWindowModality(Qt.WindowModal)
+                    progress.setMinimumDuration(0)
+                    progress.show()
+
+                progress.setLabelText(
+                    f"Running query... {job['rows_fetched']} rows fetched"
                 )
+                QCoreApplication.processEvents()
 
-        except Exception as e:
-            QMessageBox.critical(self, "Error", f"Execution error: {str(e)}")
+                if progress.wasCanceled():
+                    requests.post(f"{job_url}/cancel", timeout=10)
+                    requests.delete(job_url, timeout=10)
+                    return None
+
+                job = self.poll_job(job_url, wait=1)
+        finally:
+            if progress is not None:
+                progress.close()
+
+        if job is None:
+            QMessageBox.critical(
+                self,
+                "Error",
+                "The query job is no longer available on the server (it expired, or "
+                "the server runs several workers without sticky routing). Please run "
+                "the query again.",
+            )
+            return None
+
+        if job["status"] not in ("running", "succeeded"):
+            QMessageBox.critical(
+                self,
+                "Error",
+                f"Query execution failed: {job.get('error') or job['status']}",
+            )
+            requests.delete(job_url, timeout=10)
+            return None
+
+        offset = 0
+
+        def fetch_page():
+            nonlocal offset
+            response = requests.get(
+                f"{job_url}/rows",
+                params={"offset": offset, "limit": PAGE_SIZE},
+                headers={"Accept-Encoding": ACCEPT_ENCODING},
+                timeout=60,
+            )
+            if response.status_code != 200:
+                raise RuntimeError(response.json().get("detail", "Unknown error"))
+
+            page = response.json()
+            offset = page["next_offset"]
+            if offset is not None:
+                return page["rows"], None
+
+            # The rows are downloaded; free them on the server.
+            finished = self.poll_job(job_url) or {
+                "column_names": page.get("column_names", []),
+                "column_types": page.get("column_types"),
+            }
+            finished.setdefault("truncated", False)
+            requests.delete(job_url, timeout=10)
+            return page["rows"], finished
+
+        def next_page(on_page=None, discard=False):
+            if discard:
+                requests.delete(job_url, timeout=10)
+                return
+
+            self.in_background(fetch_page, on_page)
+
+        rows, finished = fetch_page()
+        if finished is not None:
+            return (
+                rows,
+                finished["column_names"],
+                finished.get("column_types"),
+                finished["truncated"],
+                None,
+            )
+
+        return (
+            rows,
+            job.get("column_names", []),
+            job.get("column_types"),
+            False,
+            next_page,
+        )
+
+    def poll_job(self, job_url, wait=0):
+        """
+        Request the status of a query job, waiting up to `wait` seconds for it to finish.
+
+        Returns the job info, or None if the server does not know the job (anymore): it
+        expired or was discarded, or another API worker answered the request.
+        """
+        try:
+            response = requests.get(job_url, params={"wait": wait}, timeout=30)
+            job = response.json()
+        except (requests.RequestException, ValueError):
+            return None
+
+        if response.status_code != 200 or "status" not in job:
+            return None
+
+        return job
+
+    def run_query_channel(self, channel, sql_query):
+        """
+        Execute a query over the session's WebSocket channel.
+
+        The server pushes progress and chunks of rows as they are fetched. This waits for
+        the first page (with a progress dialog and Cancel button) and returns the same
+        tuple as run_query_job; the remaining rows keep arriving while the event loop runs
+        and next_page hands over those received so far without waiting.
+        """
+        state = {"rows": [], "fetched": 0, "columns": None, "final": None}
+        loop = QEventLoop()
+
+        def on_message(message):
+            if message["type"] == "rows":
+                if "column_names" in message:
+                    state["columns"] = (
+                        message["column_names"],
+                        message["column_types"],
+                    )
+                state["rows"].extend(message["rows"])
+            elif message["type"] == "progress":
+                state["fetched"] = message["rows_fetched"]
+            elif message["type"] in FINAL_TYPES:
+                state["final"] = message
+            loop.quit()
+
+        request_id = channel.send(
+            "execute", {"query": sql_query, "chunk_size": PAGE_SIZE}, on_message
+        )
+
+        # Wake up regularly in case the dialog was cancelled.
+        timer = QTimer()
+        timer.timeout.connect(loop.quit)
+        timer.start(PAGE_POLL_INTERVAL)
+
+        started = time.monotonic()
+        progress = None
+        try:
+            while state["final"] is None and len(state["rows"]) < PAGE_SIZE:
+                loop.exec_()
+
+                # Like run_query_job, quick queries finish without a progress dialog.
+                if progress is None and time.monotonic() - started < 1:
+                    continue
+
+                if progress is None:
+                    progress = QProgressDialog("Running query...", "Cancel", 0, 0, self)
+                    progress.setWindowTitle("Spatial Mind")
+                    progress.setWindowModality(Qt.WindowModal)
+                    progress.setMinimumDuration(0)
+                    progress.canceled.connect(loop.quit)
+                    progress.show()
+
+                fetched = max(state["fetched"], len(state["rows"]))
+                progress.setLabelText(f"Running query... {fetched} rows fetched")
+
+                if progress.wasCanceled():
+                    channel.cancel(request_id)
+                    return None
+        finally:
+            timer.stop()
+            if progress is not None:
+                progress.close()
+
+        final = state["final"]
+        if final is not None and (
+            final["type"] != "done" or final["status"] != "succeeded"
+        ):
+            error = (
+                final.get("detail")
+                or final.get("error")
+                or final.get("status")
+                or final["type"]
+            )
+            QMessageBox.critical(self, "Error", f"Query execution failed: {error}")
+            return None
+
+        rows, state["rows"] = state["rows"], []
+
+        if final is not None:
+            return (
+                rows,
+                final["column_names"],
+                final["column_types"],
+                final["truncated"],
+                None,
+            )
+
+        def next_page(on_page=None, discard=False):
+            if discard:
+                channel.cancel(request_id)
+                return
+
+            rows, state["rows"] = state["rows"], []
+            final = state["final"]
+            if final is not None and (
+                final["type"] != "done" or final["status"] == "cancelled"
+            ):
+                error = final.get("detail") or final.get("status") or final["type"]
+                on_page(None, None, RuntimeError(error))
+                return
+
+            on_page(rows, final, None)
+
+        column_names, column_types = state["columns"]
+
+        return rows, column_names, column_types, False, next_page
+
+    def execute_query(self, data):
+        """
+        Execute a query with /execute (servers without the job API), one page per
+        request where the server supports continuation tokens.
+        """
+        response = requests.post(
+            f"{self.api_url}/execute",
+            json={**data, "page_size": PAGE_SIZE},
+            headers={"Accept-Encoding": ACCEPT_ENCODING},
+            timeout=30,
+        )
+
+        if response.status_code != 200:
+            error_msg = response.json().get("detail", "Unknown error")
+            QMessageBox.warning(self, "Error", f"Failed to execute query: {error_msg}")
+            return None
+
+        result = response.json()
+
+        if not result["success"]:
+            QMessageBox.critical(
+                self, "Error", f"Query execution failed: {result['error']}"
+            )
+            return None
+
+        continuation = result.get("continuation")
+
+        def fetch_page():
+            nonlocal continuation
+            response = requests.post(
+                f"{self.api_url}/execute",
+                json={
+                    "session_id": data["session_id"],
+                    "continuation": continuation,
+                    "page_size": PAGE_SIZE,
+                },
+                headers={"Accept-Encoding": ACCEPT_ENCODING},
+                timeout=60,
+            )
+            page = response.json()
+            if response.status_code != 200 or not page["success"]:
+                raise RuntimeError(
+                    page.get("detail") or page.get("error") or "Unknown error"
+                )
+
+            continuation = page.get("continuation")
+            return page["rows"], None if continuation else {"truncated": False}
+
+        def next_page(on_page=None, discard=False):
+            if discard:
+                requests.delete(f"{self.api_url}/execute/{continuation}", timeout=10)
+                return
+
+            self.in_background(fetch_page, on_page)
+
+        return (
+            result["rows"],
+            result["column_names"],
+            result.get("column_types"),
+            False,
+            next_page if continuation else None,
+        )
 
     def find_geometry_column(self, column_names, first_row):
         """Find geometry column in results"""
@@ -657,8 +1227,39 @@ class SQLQueryDialog(QDialog):
 
         return None
 
-    def add_vector_layer(self, rows, column_names, geom_col_index):
-        """Add results as vector layer with geometries"""
+    def create_fields(self, column_names, column_types, indices):
+        """
+        Create a QgsField for each of the given columns, typed after the column types
+        reported by the API (strings for servers that do not report them), and the
+        function converting the column's values to attribute values.
+        """
+        column_types = column_types or ["string"] * len(column_names)
+
+        fields, converters = [], []
+        for i in indices:
+            column_type = column_types[i]
+            fields.append(
+                QgsField(column_names[i], FIELD_TYPES.get(column_type, QVariant.String))
+            )
+            convert = VALUE_CONVERTERS.get(
+                column_type, str if column_type not in FIELD_TYPES else None
+            )
+            converters.append(convert)
+
+        return fields, converters
+
+    def row_attributes(self, row, indices, converters):
+        """Convert the values of a result row to feature attributes (None is NULL)"""
+        return [
+            (row[i] if row[i] is None or convert is None else convert(row[i]))
+            for i, convert in zip(indices, converters)
+        ]
+
+    def add_vector_layer(self, rows, column_names, geom_col_index, column_types=None):
+        """
+        Add results as vector layer with geometries. Returns a function appending further
+        rows to the layer, or None if the layer could not be created.
+        """
         try:
             # Debug: Show what we're working with
             print(f"Column names: {column_names}")
@@ -758,12 +1359,10 @@ class SQLQueryDialog(QDialog):
             provider = layer.dataProvider()
 
             # Add attribute fields (excluding geometry column)
-            fields = []
-            attr_indices = []
-            for i, col_name in enumerate(column_names):
-                if i != geom_col_index:
-                    fields.append(QgsField(col_name, QVariant.String))
-                    attr_indices.append(i)
+            attr_indices = [i for i in range(len(column_names)) if i != geom_col_index]
+            fields, converters = self.create_fields(
+                column_names, column_types, attr_indices
+            )
 
             if not provider.addAttributes(fields):
                 QMessageBox.critical(self, "Error", "Failed to add attributes to layer")
@@ -772,65 +1371,67 @@ class SQLQueryDialog(QDialog):
             layer.updateFields()
             print(f"Added {len(fields)} attribute fields")
 
-            # Add features
-            features = []
-            skipped = 0
+            def make_features(rows, first_row_idx=0):
+                features = []
+                skipped = 0
 
-            for row_idx, row in enumerate(rows):
-                try:
-                    feature = QgsFeature(layer.fields())
+                for row_idx, row in enumerate(rows, first_row_idx):
+                    try:
+                        feature = QgsFeature(layer.fields())
 
-                    # Get geometry data
-                    geom_data = (
-                        str(row[geom_col_index]).strip()
-                        if row[geom_col_index]
-                        else None
-                    )
+                        # Get geometry data
+                        geom_data = (
+                            str(row[geom_col_index]).strip()
+                            if row[geom_col_index]
+                            else None
+                        )
 
-                    if not geom_data:
-                        skipped += 1
-                        continue
+                        if not geom_data:
+                            skipped += 1
+                            continue
+
+                        # Parse geometry based on format
+                        if is_wkb:
+                            # Parse WKB (hex string)
+                            try:
+                                wkb_bytes = bytes.fromhex(geom_data)
+                                geometry = QgsGeometry()
+                                geometry.fromWkb(wkb_bytes)
+                            except Exception as e:
+                                print(f"Row {row_idx}: Failed to parse WKB: {str(e)}")
+                                skipped += 1
+                                continue
+                        else:
+                            # Parse WKT
+                            geometry = QgsGeometry.fromWkt(geom_data)
 
-                    # Parse geometry based on format
-                    if is_wkb:
-                        # Parse WKB (hex string)
-                        try:
-                            wkb_bytes = bytes.fromhex(geom_data)
-                            geometry = QgsGeometry()
-                            geometry.fromWkb(wkb_bytes)
-                        except Exception as e:
-                            print(f"Row {row_idx}: Failed to parse WKB: {str(e)}")
+                        if geometry.isNull():
+                            print(f"Row {row_idx}: Invalid geometry")
                             skipped += 1
                             continue
-                    else:
-                        # Parse WKT
-                        geometry = QgsGeometry.fromWkt(geom_data)
 
-                    if geometry.isNull():
-                        print(f"Row {row_idx}: Invalid geometry")
-                        skipped += 1
-                        continue
+                        if geometry.isEmpty():
+                            print(f"Row {row_idx}: Empty geometry")
+                            skipped += 1
+                            continue
 
-                    if geometry.isEmpty():
-                        print(f"Row {row_idx}: Empty geometry")
-                        skipped += 1
-                        continue
+                        feature.setGeometry(geometry)
 
-                    feature.setGeometry(geometry)
+                        # Set attributes (only non-geometry columns)
+                        feature.setAttributes(
+                            self.row_attributes(row, attr_indices, converters)
+                        )
+                        features.append(feature)
 
-                    # Set attributes (only non-geometry columns)
-                    attrs = []
-                    for i in attr_indices:
-                        val = row[i]
-                        attrs.append(str(val) if val is not None else "")
+                    except Exception as e:
+                        print(f"Row {row_idx}: Error processing - {str(e)}")
+                        skipped += 1
+                        continue
 
-                    feature.setAttributes(attrs)
-                    features.append(feature)
+                return features, skipped
 
-                except Exception as e:
-                    print(f"Row {row_idx}: Error processing - {str(e)}")
-                    skipped += 1
-                    continue
+            # Add features
+            features, skipped = make_features(rows)
 
             print(f"Processed {len(features)} valid features, skipped {skipped}")
 
@@ -867,6 +1468,21 @@ class SQLQueryDialog(QDialog):
             if skipped > 0:
                 msg += f" ({skipped} features skipped)"
 
+            row_count = len(rows)
+
+            def append(rows):
+                """Add further result rows to the layer"""
+                nonlocal row_count
+                features, skipped = make_features(rows, row_count)
+                row_count += len(rows)
+                if skipped > 0:
+                    print(f"Skipped {skipped} features")
+                provider.addFeatures(features)
+                layer.updateExtents()
+                layer.triggerRepaint()
+
+            return append
+
         except Exception as e:
             import traceback
 
@@ -878,8 +1494,11 @@ class SQLQueryDialog(QDialog):
                 f"Failed to add vector layer:\n{str(e)}",
             )
 
-    def add_attribute_table(self, rows, column_names):
-        """Add results as attribute table (no geometry)"""
+    def add_attribute_table(self, rows, column_names, column_types=None):
+        """
+        Add results as attribute table (no geometry). Returns a function appending further
+        rows to the table, or None if the table could not be created.
+        """
         try:
             layer = QgsVectorLayer("none", "Query Result (No Geometry)", "memory")
 
@@ -890,23 +1509,29 @@ class SQLQueryDialog(QDialog):
             provider = layer.dataProvider()
 
             # Add fields
-            fields = [QgsField(col_name, QVariant.String) for col_name in column_names]
+            indices = list(range(len(column_names)))
+            fields, converters = self.create_fields(column_names, column_types, indices)
             provider.addAttributes(fields)
             layer.updateFields()
 
-            # Add features
-            features = []
-            for row in rows:
-                feature = QgsFeature()
-                attrs = [str(val) if val is not None else "" for val in row]
-                feature.setAttributes(attrs)
-                features.append(feature)
+            def append(rows):
+                """Add further result rows to the table"""
+                features = []
+                for row in rows:
+                    feature = QgsFeature()
+                    feature.setAttributes(self.row_attributes(row, indices, converters))
+                    features.append(feature)
 
-            provider.addFeatures(features)
+                provider.addFeatures(features)
+
+            # Add features
+            append(rows)
 
             # Add to project
             QgsProject.instance().addMapLayer(layer)
 
+            return append
+
         except Exception as e:
             QMessageBox.critical(
                 self, "Error", f"Failed to add attribute table: {str(e)}"
@@ -917,9 +1542,7 @@ class SQLQueryDialog(QDialog):
         # Close text session
         if self.text_session_id:
             try:
-                requests.delete(
-                    f"{self.api_url}/session/{self.text_session_id}", timeout=5
-                )
+                self.close_session(self.text_session_id)
                 print(f"Closed text session: {self.text_session_id}")
             except:
                 pass
@@ -927,9 +1550,7 @@ class SQLQueryDialog(QDialog):
         # Close vision session
         if self.vision_session_id:
             try:
-                requests.delete(
-                    f"{self.api_url}/session/{self.vision_session_id}", timeout=5
-                )
+                self.close_session(self.vision_session_id)
                 print(f"Closed vision session: {self.vision_session_id}")
             except:
                 pass
@@ -0,0 +1,266 @@
+import threading
+from contextlib import ExitStack, AsyncExitStack, contextmanager, asynccontextmanager
+from chatbot.concurrency import ConcurrencyGate, QueueFull
+from metrics import registry, Counter, Gauge, Histogram
+from config import (
+    llm_max_concurrency,
+    llm_max_queue,
+    llm_provider_max_concurrency,
+    llm_provider_max_queue,
+    db_max_concurrency,
+    db_max_queue,
+    db_database_max_concurrency,
+    db_database_max_queue,
+    session_max_concurrency,
+    session_max_queue,
+    job_database_max_concurrency,
+    job_database_max_queue,
+)
+
+queue_wait_seconds = registry.register(
+    Histogram(
+        "spatialmind_queue_wait_seconds",
+        "Time requests waited for admission, by resource and limit.",
+        ["resource", "scope"],
+    )
+)
+
+admission_rejected = registry.register(
+    Counter(
+        "spatialmind_admission_rejected_total",
+        "Requests rejected with 429 because a queue was full, by resource and limit.",
+        ["resource", "scope"],
+    )
+)
+
+
+class AdmissionControl:
+    """
+    Concurrency limits and bounded queues for one kind of work (LLM chat turns, database
+    executions on the shared connector or background query jobs).
+
+    A request takes a slot of its session's gate, then of its provider's (or database's)
+    gate, then of the global gate, always in that order, and holds them until it is done.
+    When a queue is full the request is rejected with `QueueFull` right away instead of
+    piling up behind the others.
+    """
+
+    def __init__(
+        self,
+        resource,
+        limit,
+        max_queue,
+        scope,
+        key_limits,
+        key_max_queue,
+        session_limit,
+        session_max_queue,
+    ):
+        """
+        :param resource: Name of the work ("llm", "db" or "job") used in gate names and
+                         metrics.
+        :param limit: Global concurrency limit (0 for none).
+        :param max_queue: Global queue bound (0 for unbounded).
+        :param scope: What the per-key gates limit ("provider" or "database").
+        :param key_limits: Callable (key) -> concurrency limit of a provider or database
+                           (0 for none).
+        :param key_max_queue: Queue bound of each provider or database gate.
+        :param session_limit: Concurrency limit of each session (0 for none).
+        :param session_max_queue: Queue bound of each session gate.
+        """
+        self.resource = resource
+        self.scope = scope
+        self.key_limits = key_limits
+        self.key_max_queue = key_max_queue
+        self.session_limit = session_limit
+        self.session_max_queue = session_max_queue
+
+        self.gate = ConcurrencyGate(resource, limit, max_queue) if limit else None
+
+        self._keys = {}
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def _key_gate(self, key):
+        with self._lock:
+            if key not in self._keys:
+                limit = self.key_limits(key)
+                self._keys[key] = (
+                    ConcurrencyGate(f"{self.resource}:{key}", limit, self.key_max_queue)
+                    if limit
+                    else None
+                )
+
+            return self._keys[key]
+
+    def _session_gate(self, session_id):
+        if not self.session_limit:
+            return None
+
+        with self._lock:
+            if session_id not in self._sessions:
+                self._sessions[session_id] = ConcurrencyGate(
+                    f"{self.resource}:session:{session_id}",
+                    self.session_limit,
+                    self.session_max_queue,
+                )
+
+            return self._sessions[session_id]
+
+    def _discard_session_gate(self, session_id, gate):
+        """Drop a session's gate once nobody holds or waits for it."""
+        with self._lock:
+            if self._sessions.get(session_id) is gate and gate.idle():
+                del self._sessions[session_id]
+
+    def _gates(self, session_id, key):
+        """:return: The (scope, gate) pairs a request takes in order; gates may be None."""
+        return [
+            ("session", self._session_gate(session_id)),
+            (self.scope, self._key_gate(key)),
+            ("global", self.gate),
+        ]
+
+    @asynccontextmanager
+    async def admit(self, session_id, key):
+        """
+        Hold a slot of every applicable gate for the duration of the block.
+
+        :param session_id: The session making the request.
+        :param key: The provider (LLM) or database (DB) the work goes to.
+        :raises QueueFull: If one of the queues is full; no slot is held then.
+        """
+        gates = self._gates(session_id, key)
+        session_gate = gates[0][1]
+
+        try:
+            async with AsyncExitStack() as stack:
+                for scope, gate in gates:
+                    if gate is None:
+                        continue
+
+                    try:
+                        waited = await stack.enter_async_context(gate.aslot())
+                    except QueueFull:
+                        admission_rejected.inc(resource=self.resource, scope=scope)
+                        raise
+
+                    queue_wait_seconds.observe(
+                        waited, resource=self.resource, scope=scope
+                    )
+
+                yield
+        finally:
+            if session_gate is not None:
+                self._discard_session_gate(session_id, session_gate)
+
+    @contextmanager
+    def slot(self, session_id, key):
+        """
+        Like `admit`, for work running in a worker thread: blocks the thread while the
+        request waits in a queue.
+
+        :param session_id: The session making the request.
+        :param key: The provider (LLM) or database (DB) the work goes to.
+        :raises QueueFull: If one of the queues is full; no slot is held then.
+        """
+        gates = self._gates(session_id, key)
+        session_gate = gates[0][1]
+
+        try:
+            with ExitStack() as stack:
+                for scope, gate in gates:
+                    if gate is None:
+                        continue
+
+                    try:
+                        waited = stack.enter_context(gate.slot())
+                    except QueueFull:
+                        admission_rejected.inc(resource=self.resource, scope=scope)
+                        raise
+
+                    queue_wait_seconds.observe(
+                        waited, resource=self.resource, scope=scope
+                    )
+
+                yield
+        finally:
+            if session_gate is not None:
+                self._discard_session_gate(session_id, session_gate)
+
+    def stats(self):
+        """
+        :return: A dict mapping the global gate ("global") and every provider or database
+                 gate to its statistics; session gates are left out.
+        """
+        with self._lock:
+            gates = {key: gate for key, gate in self._keys.items() if gate is not None}
+
+        stats = {"global": self.gate.stats()} if self.gate is not None else {}
+        stats.update((key, gate.stats()) for key, gate in gates.items())
+
+        return stats
+
+
+llm_admission = AdmissionControl(
+    "llm",
+    llm_max_concurrency,
+    llm_max_queue,
+    "provider",
+    lambda provider: llm_provider_max_concurrency.get(provider, 0),
+    llm_provider_max_queue,
+    # A chat turn reads the history the previous turn saved, so the turns of one session
+    # run one at a time; the others wait in the session's queue.
+    1,
+    session_max_queue,
+)
+
+db_admission = AdmissionControl(
+    "db",
+    db_max_concurrency,
+    db_max_queue,
+    "database",
+    lambda database: db_database_max_concurrency,
+    db_database_max_queue,
+    session_max_concurrency,
+    session_max_queue,
+)
+
+# Background jobs: each runs on a dedicated connection, so it must not take the shared
+# connector's per-database slot, where one long job would block every /execute on that
+# database. The job worker pool already bounds them globally.
+job_admission = AdmissionControl(
+    "job",
+    0,
+    0,
+    "database",
+    lambda database: job_database_max_concurrency,
+    job_database_max_queue,
+    session_max_concurrency,
+    session_max_queue,
+)
+
+
+def admission_stats():
+    """
+    :return: A dict mapping "llm", "db" and "job" to the statistics of their gates.
+    """
+    return {
+        admission.resource: admission.stats()
+        for admission in (llm_admission, db_admission, job_admission)
+    }
+
+
+registry.register(
+    Gauge(
+        "spatialmind_admission_requests",
+        "Requests holding or waiting for a slot, by resource and gate.",
+        ["resource", "gate", "state"],
+        function=lambda: {
+            (resource, gate, state): stats[state]
+            for resource, gates in admission_stats().items()
+            for gate, stats in gates.items()
+            for state in ("active", "queued")
+        },
+    )
+)
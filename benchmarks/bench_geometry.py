@@ -0,0 +1,137 @@
+import math
+import struct
+from benchmarks.harness import measure, result
+
+try:
+    from qgis.core import QgsGeometry
+except ImportError:
+    QgsGeometry = None
+
+VERTEX_COUNTS = [4, 100, 10_000]
+
+HEX_DIGITS = "0123456789ABCDEFabcdef"
+
+
+def polygon_coordinates(vertices):
+    """:return: A closed ring of (x, y) around (10, 50) with the given number of vertices."""
+    ring = [
+        (
+            10 + math.cos(2 * math.pi * i / vertices),
+            50 + math.sin(2 * math.pi * i / vertices),
+        )
+        for i in range(vertices)
+    ]
+    return ring + [ring[0]]
+
+
+def polygon_wkt(vertices):
+    """:return: The polygon as WKT, the way ST_AsText returns it."""
+    ring = ",".join(f"{x!r} {y!r}" for x, y in polygon_coordinates(vertices))
+    return f"POLYGON(({ring}))"
+
+
+def polygon_wkb_hex(vertices):
+    """:return: The polygon as little-endian EWKB hex with SRID 4326, the way PostGIS returns geometries."""
+    ring = polygon_coordinates(vertices)
+    data = struct.pack("<BII", 1, 3 | 0x20000000, 4326)
+    data += struct.pack("<II", 1, len(ring))
+    data += b"".join(struct.pack("<dd", x, y) for x, y in ring)
+    return data.hex().upper()
+
+
+def is_hex(text):
+    """The WKB detection of `add_vector_layer`."""
+    return all(c in HEX_DIGITS for c in text.replace(" ", ""))
+
+
+def wkt_geometry_type(text):
+    """The WKT type detection of `add_vector_layer`."""
+    upper = text.upper()
+    if "MULTIPOLYGON" in upper:
+        return "MultiPolygon"
+    if "POLYGON" in upper:
+        return "Polygon"
+    if "MULTILINESTRING" in upper:
+        return "MultiLineString"
+    if "LINESTRING" in upper:
+        return "LineString"
+    if "MULTIPOINT" in upper:
+        return "MultiPoint"
+    return "Point"
+
+
+def decode_wkb_polygon(text):
+    """
+    Decode a single-ring (E)WKB polygon from hex, as a reference for the work
+    `QgsGeometry.fromWkb` does.
+
+    :return: A list of (x, y).
+    """
+    data = bytes.fromhex(text)
+    endian = "<" if data[0] == 1 else ">"
+    (geometry_type,) = struct.unpack_from(f"{endian}I", data, 1)
+    offset = 9 if geometry_type & 0x20000000 else 5
+
+    _, points = struct.unpack_from(f"{endian}II", data, offset)
+    values = struct.unpack_from(f"{endian}{2 * points}d", data, offset + 8)
+
+    return list(zip(values[::2], values[1::2]))
+
+
+def decode_wkt_polygon(text):
+    """
+    Parse the coordinates of a single-ring WKT polygon, as a reference for the work
+    `QgsGeometry.fromWkt` does.
+
+    :return: A list of (x, y).
+    """
+    body = text[text.index("((") + 2 : text.rindex("))")]
+    return [tuple(map(float, pair.split())) for pair in body.split(",")]
+
+
+def run(quick=False):
+    """
+    Benchmark the geometry handling of the plugin's `add_vector_layer` on polygons of
+    increasing size: format and type detection, hex decoding, and coordinate parsing.
+    QGIS parsing is measured too when `qgis.core` can be imported.
+
+    :param quick: Skip the largest polygons.
+    :return: A list of results.
+    """
+    results = []
+    counts = VERTEX_COUNTS[:2] if quick else VERTEX_COUNTS
+
+    for vertices in counts:
+        wkt = polygon_wkt(vertices)
+        wkb = polygon_wkb_hex(vertices)
+
+        cases = [
+            ("geometry.detect_hex", "wkb", lambda: is_hex(wkb)),
+            ("geometry.detect_hex", "wkt", lambda: is_hex(wkt)),
+            ("geometry.wkt_type", "wkt", lambda: wkt_geometry_type(wkt)),
+            ("geometry.fromhex", "wkb", lambda: bytes.fromhex(wkb)),
+            ("geometry.decode", "wkb", lambda: decode_wkb_polygon(wkb)),
+            ("geometry.decode", "wkt", lambda: decode_wkt_polygon(wkt)),
+        ]
+
+        if QgsGeometry is not None:
+
+            def from_wkb():
+                geometry = QgsGeometry()
+                geometry.fromWkb(bytes.fromhex(wkb))
+                return geometry
+
+            cases.append(("geometry.qgis", "wkb", from_wkb))
+            cases.append(("geometry.qgis", "wkt", lambda: QgsGeometry.fromWkt(wkt)))
+
+        for name, format, func in cases:
+            results.append(
+                result(
+                    name,
+                    {"vertices": vertices, "format": format},
+                    measure(func),
+                    chars=len(wkb if format == "wkb" else wkt),
+                )
+            )
+
+    return results
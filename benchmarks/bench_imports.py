@@ -0,0 +1,84 @@
+import os
+import sys
+import json
+import subprocess
+from benchmarks.harness import measure, result
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Provider integrations whose import dominates a cold start.
+PROVIDER_MODULES = (
+    "langchain_google_genai",
+    "google.genai",
+    "langchain_ollama",
+    "ollama",
+)
+
+RESOLVE = (
+    "import main\n"
+    "from factory import ChatbotFactory, ChatbotType\n"
+    "for name in {types!r}:\n"
+    "    ChatbotFactory.chatbot_class(ChatbotType(name))\n"
+)
+
+# Code run by a fresh interpreter for each case.
+CASES = {
+    "python": "pass",
+    "main": "import main",
+    "main+gemini_text": RESOLVE.format(types=["gemini_text"]),
+    "main+ollama_text": RESOLVE.format(types=["ollama_text"]),
+    "main+all_providers": RESOLVE.format(
+        types=["gemini_text", "gemini_vision", "ollama_text", "hedged_text"]
+    ),
+}
+
+REPORT = (
+    "import sys, json, resource\n"
+    "print(json.dumps({{\n"
+    "    'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,\n"
+    "    'modules': len(sys.modules),\n"
+    "    'providers': [m for m in {providers!r} if m in sys.modules],\n"
+    "}}))\n"
+)
+
+
+def start_process(code):
+    """
+    Run code in a new interpreter started from the repository root.
+
+    :param code: Python source.
+    :return: The process's standard output.
+    """
+    return subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=ROOT,
+        capture_output=True,
+        text=True,
+        check=True,
+    ).stdout
+
+
+def run(quick=False):
+    """
+    Benchmark the cold start of the API process: the wall time of a new interpreter
+    importing `main`, alone and after resolving chatbot providers, with the resident
+    memory and the number of modules loaded afterwards.
+
+    :return: A list of results.
+    """
+    results = []
+
+    for case, code in CASES.items():
+        stats = measure(
+            lambda: start_process(code), repeat=3 if quick else 7, min_time=0
+        )
+
+        report = start_process(
+            code + "\n" + REPORT.format(providers=PROVIDER_MODULES)
+        ).splitlines()[-1]
+
+        results.append(
+            result("imports.cold_start", {"case": case}, stats, **json.loads(report))
+        )
+
+    return results
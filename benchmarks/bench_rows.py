@@ -0,0 +1,98 @@
+import random
+from decimal import Decimal
+from datetime import datetime, timedelta
+from database import rows_to_json
+from response_encoding import dumps, compress, supported_encodings
+from benchmarks.harness import measure, result
+
+SIZES = [1_000, 10_000, 100_000, 1_000_000]
+
+# Column name and type OID of the synthetic rows, as in cursor.description.
+DESCRIPTION = [
+    ("id", 23),
+    ("name", 25),
+    ("value", 701),
+    ("amount", 1700),
+    ("created_at", 1114),
+    ("landuse", 25),
+    ("geom", 25),
+]
+
+
+def synthetic_rows(count, seed=0):
+    """
+    Build rows shaped like a typical spatial query result.
+
+    :param count: Number of rows.
+    :return: A list of tuples (int, str, float, Decimal, datetime, None or str, WKT).
+    """
+    rng = random.Random(seed)
+    start = datetime(2024, 1, 1)
+
+    return [
+        (
+            i,
+            f"feature {i}",
+            rng.random() * 1000,
+            Decimal(f"{rng.randint(0, 10**6)}.{rng.randint(0, 99):02d}"),
+            start + timedelta(minutes=i),
+            None if i % 7 == 0 else "residential",
+            f"POINT({rng.uniform(-180, 180):.6f} {rng.uniform(-90, 90):.6f})",
+        )
+        for i in range(count)
+    ]
+
+
+def run(quick=False):
+    """
+    Benchmark the /execute response path: column-wise conversion of the rows to JSON
+    values, serialization, and compression with each supported coding.
+
+    :param quick: Stop at 10^5 rows instead of 10^6.
+    :return: A list of results.
+    """
+    results = []
+    sizes = SIZES[:3] if quick else SIZES
+
+    for count in sizes:
+        rows = synthetic_rows(count)
+        rows_list = rows_to_json(rows, DESCRIPTION)
+        params = {"rows": count}
+        repeat = 3 if count >= 100_000 else 5
+
+        body = dumps(
+            {
+                "session_id": "bench",
+                "success": True,
+                "rows": rows_list,
+                "column_names": [name for name, _ in DESCRIPTION],
+                "row_count": len(rows_list),
+            }
+        )
+
+        results.append(
+            result(
+                "rows.to_json",
+                params,
+                measure(lambda: rows_to_json(rows, DESCRIPTION), repeat=repeat),
+            )
+        )
+        results.append(
+            result(
+                "rows.dumps",
+                params,
+                measure(lambda: dumps(rows_list), repeat=repeat),
+                bytes=len(body),
+            )
+        )
+        for encoding in supported_encodings():
+            results.append(
+                result(
+                    f"rows.{encoding}",
+                    params,
+                    measure(lambda: compress(body, encoding), repeat=repeat),
+                    bytes=len(compress(body, encoding)),
+                )
+            )
+
+    return results
@@ -0,0 +1,80 @@
+import io
+import contextlib
+from database import SchemaRenderer
+from benchmarks.harness import measure, result
+from benchmarks.standin import synthetic_catalog, standin_connector
+
+SIZES = [10, 100, 1000]
+
+
+def run(quick=False, round_trip=0.0002, token_budget=8000):
+    """
+    Benchmark schema introspection and rendering on synthetic catalogs.
+
+    Uncached cases re-read the catalog through the stand-in (each statement costs
+    `round_trip` seconds), cached cases measure the per-request lookup.
+
+    :param quick: Only run the smaller catalogs.
+    :param round_trip: Simulated seconds per SQL statement.
+    :param token_budget: Budget of the compact rendering.
+    :return: A list of results.
+    """
+    # The connector logs every schema it renders; keep that out of the report.
+    with contextlib.redirect_stdout(io.StringIO()):
+        return _run(quick, round_trip, token_budget)
+
+
+def _run(quick, round_trip, token_budget):
+    results = []
+    sizes = SIZES[:2] if quick else SIZES
+
+    for tables in sizes:
+        catalog = synthetic_catalog(tables)
+        connector = standin_connector(catalog, round_trip)
+        cursor = connector.cursor
+        params = {"tables": tables, "round_trip_ms": round_trip * 1000}
+        repeat = 3 if tables >= 1000 else 5
+
+        cases = [
+            ("schema.full", lambda: connector.get_schema(refresh=True)),
+            ("schema.short", lambda: connector.get_schema(short=True, refresh=True)),
+            (
+                "schema.compact",
+                lambda: connector.get_compact_schema(token_budget, refresh=True),
+            ),
+        ]
+
+        for name, func in cases:
+            cursor.statements = 0
+            func()
+            statements = cursor.statements
+
+            stats = measure(func, repeat=repeat, min_time=0.05)
+            results.append(result(name, params, stats, statements=statements))
+
+        rendered = connector.get_compact_schema(token_budget)
+        results.append(
+            result(
+                "schema.compact_cached",
+                params,
+                measure(lambda: connector.get_compact_schema(token_budget)),
+                tokens=connector.schema_tokens[token_budget],
+                chars=len(rendered),
+            )
+        )
+
+        schema_catalog = connector.get_schema_catalog()
+        results.append(
+            result(
+                "schema.render_only",
+                {"tables": tables, "token_budget": token_budget},
+                measure(
+                    lambda: SchemaRenderer().render(schema_catalog, token_budget),
+                    repeat=repeat,
+                ),
+            )
+        )
+
+        connector.close()
+
+    return results
@@ -0,0 +1,60 @@
+from chatbot.sql_utils import extract_sql_query, single_statement
+from benchmarks.harness import measure, result
+
+SHORT_QUERY = (
+    "SELECT p.id, ST_AsText(p.geom) AS geom\n"
+    "FROM parcels p\n"
+    "WHERE ST_Area(p.geom::geography) > 1000;"
+)
+
+
+def long_query(joins):
+    """:return: A query with the given number of joins, like a large generated answer."""
+    lines = ["SELECT t0.id, ST_AsText(t0.geom) AS geom", "FROM layer_0000 t0"]
+    for i in range(1, joins + 1):
+        lines.append(
+            f"JOIN layer_{i:04d} t{i} ON ST_Intersects(t{i - 1}.geom, t{i}.geom) "
+            f"AND t{i}.name <> 'x;y'"
+        )
+    lines.append("WHERE t0.id > 10;")
+    return "\n".join(lines)
+
+
+RESPONSES = {
+    "code_block": f"```sql\n{SHORT_QUERY}\n```",
+    "code_block_prose": "Here is the query you asked for.\n\n"
+    f"```sql\n{SHORT_QUERY}\n```\n\nIt returns every large parcel.",
+    "bare_sql": SHORT_QUERY,
+    "long_code_block": f"```sql\n{long_query(200)}\n```",
+    "no_sql": "The parcels table has the columns id, owner and geom. " * 20,
+}
+
+
+def run(quick=False):
+    """
+    Benchmark SQL extraction from model answers and the single-statement check.
+
+    :return: A list of results.
+    """
+    results = []
+
+    for case, response in RESPONSES.items():
+        results.append(
+            result(
+                "sql.extract_sql_query",
+                {"case": case, "chars": len(response)},
+                measure(lambda: extract_sql_query(response)),
+            )
+        )
+
+        query = extract_sql_query(response)
+        if query is not None:
+            results.append(
+                result(
+                    "sql.single_statement",
+                    {"case": case, "chars": len(query)},
+                    measure(lambda: single_statement(query)),
+                )
+            )
+
+    return results
@@ -0,0 +1,155 @@
+import gc
+import sys
+import json
+import time
+import platform
+import statistics
+import subprocess
+from datetime import datetime, timezone
+
+
+def measure(func, repeat=5, min_time=0.05, max_number=1_000_000):
+    """
+    Time a zero-argument callable.
+
+    The number of calls per sample is raised until one sample takes at least `min_time`
+    seconds, then `repeat` samples are taken with garbage collection disabled.
+
+    :param func: The callable to time.
+    :param repeat: Number of samples.
+    :param min_time: Minimum duration of one sample in seconds.
+    :param max_number: Upper bound for the number of calls per sample.
+    :return: A dict with the calls per sample and the min/median/mean/stdev seconds per call.
+    """
+    number = 1
+    while True:
+        elapsed = _run(func, number)
+        if elapsed >= min_time or number >= max_number:
+            break
+        number = min(max_number, number * max(2, int(min_time / max(elapsed, 1e-9))))
+
+    samples = [_run(func, number) / number for _ in range(repeat)]
+
+    return {
+        "number": number,
+        "repeat": repeat,
+        "min": min(samples),
+        "median": statistics.median(samples),
+        "mean": statistics.fmean(samples),
+        "stdev": statistics.stdev(samples) if len(samples) > 1 else 0.0,
+    }
+
+
+def _run(func, number):
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        started = time.perf_counter()
+        for _ in range(number):
+            func()
+        return time.perf_counter() - started
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def result(name, params, stats, **extra):
+    """
+    Build one benchmark result entry.
+
+    :param name: Benchmark name (e.g., "schema.compact").
+    :param params: Dict of parameters that identify the case (e.g., {"tables": 100}).
+    :param stats: The dict returned by `measure`.
+    :param extra: Additional values to store (e.g., rendered token counts).
+    :return: The result dict.
+    """
+    return {"name": name, "params": params, **stats, **extra}
+
+
+def result_key(entry):
+    """:return: A string identifying a benchmark case across runs."""
+    params = ",".join(f"{k}={v}" for k, v in sorted(entry["params"].items()))
+    return f"{entry['name']}[{params}]"
+
+
+def git_commit():
+    """:return: The current git commit, or None outside a git checkout."""
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def save_results(path, results, args, **sections):
+    """
+    Write benchmark results and the environment they were measured in to a JSON file.
+
+    :param path: Output file.
+    :param results: List of result dicts.
+    :param args: Dict of the command line options used.
+    :param sections: Additional top-level entries (e.g., a memory timeline).
+    :return: None
+    """
+    document = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "processor": platform.processor() or platform.machine(),
+            "args": args,
+        },
+        "results": results,
+        **sections,
+    }
+
+    with open(path, "w", encoding="utf-8") as output:
+        json.dump(document, output, indent=2)
+
+
+def compare(baseline_path, results, threshold=0.10):
+    """
+    Print the change of every case against a baseline results file.
+
+    :param baseline_path: JSON file written by `save_results` for the baseline commit.
+    :param results: List of result dicts of the current run.
+    :param threshold: Relative slowdown of the median reported as a regression.
+    :return: The number of regressions.
+    """
+    with open(baseline_path, "r", encoding="utf-8") as baseline_file:
+        baseline = json.load(baseline_file)
+
+    previous = {result_key(entry): entry for entry in baseline["results"]}
+    regressions = 0
+
+    print(f"\nCompared with {baseline['meta'].get('commit') or baseline_path}:")
+    for entry in results:
+        key = result_key(entry)
+        if key not in previous:
+            print(f"  {key:<60} new")
+            continue
+
+        ratio = entry["median"] / previous[key]["median"]
+        flag = ""
+        if ratio > 1 + threshold:
+            flag = "  REGRESSION"
+            regressions += 1
+        elif ratio < 1 - threshold:
+            flag = "  faster"
+
+        print(f"  {key:<60} x{ratio:6.2f}{flag}")
+
+    return regressions
+
+
+def format_seconds(seconds):
+    """:return: A duration with a readable unit."""
+    for unit, scale in (("s", 1), ("ms", 1e-3), ("us", 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.3f} {unit}"
+    return f"{seconds / 1e-9:.1f} ns"
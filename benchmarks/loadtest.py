@@ -0,0 +1,559 @@
+"""
+End-to-end load test of the HTTP API.
+
+Opens N sessions through /initialize, then replays a mix of /chat/text, /chat/vision
+and /execute requests at a target rate and reports throughput, latency percentiles
+and errors per endpoint, and how the sessions grow in memory over the run.
+
+By default the app in main.py is served in-process with the offline fake chatbots
+and the database stand-in from benchmarks/standin.py, so no server, database or
+model is needed:
+
+    python -m benchmarks.loadtest --sessions 50 --rate 40 --duration 60
+
+Against a running server and a local PostgreSQL/PostGIS database:
+
+    python -m benchmarks.loadtest --url http://localhost:8000 \\
+        --db-name gis --db-user postgres --db-password postgres
+
+Arrivals are open-loop (Poisson at --rate), so a slow server accumulates in-flight
+requests instead of quietly lowering the offered load.
+"""
+
+import io
+import gc
+import os
+import sys
+import time
+import uuid
+import random
+import asyncio
+import argparse
+from collections import defaultdict
+from benchmarks.harness import save_results
+
+QUESTIONS = [
+    "Show all buildings within 500 meters of the river",
+    "Which parcels intersect the flood zone?",
+    "List the roads longer than 2 km",
+    "Count the trees in each district",
+    "Find the schools closest to the main station",
+    "Which layers contain polygons larger than one hectare?",
+    "Show the land use of the area around the lake",
+    "What is the total length of the railway network?",
+]
+
+VISION_QUESTIONS = [
+    "Find the features shown in this map extent",
+    "Which buildings are inside the highlighted area?",
+    "Show the parcels that look like the one in the picture",
+]
+
+FALLBACK_QUERY = "SELECT t.id, ST_AsText(t.geom) AS geom FROM layer_0000 t LIMIT 100;"
+
+ENDPOINTS = ("text", "vision", "execute")
+
+# Requests made before the load phase; reported without a throughput.
+SETUP_ENDPOINTS = ("initialize", "images")
+
+
+def parse_mix(spec):
+    """
+    :param spec: Relative weights, e.g. "text=6,vision=1,execute=3".
+    :return: A dict mapping each endpoint to its weight.
+    :raises ValueError: If the specification names an unknown endpoint.
+    """
+    mix = {}
+    for item in spec.split(","):
+        name, _, weight = item.partition("=")
+        name = name.strip()
+        if name not in ENDPOINTS:
+            raise ValueError(
+                f"Unknown endpoint in mix: {name}, expected one of {', '.join(ENDPOINTS)}."
+            )
+        mix[name] = float(weight)
+
+    return mix
+
+
+def percentile(values, q):
+    """:return: The q-th percentile (0-1) of the values by nearest rank, or None if empty."""
+    if not values:
+        return None
+
+    ordered = sorted(values)
+
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def deep_sizeof(roots):
+    """
+    Approximate the memory reachable from some objects.
+
+    Modules, classes and functions are not followed, so shared code is not counted;
+    objects shared with other roots are counted once.
+
+    :param roots: The objects to measure.
+    :return: The size in bytes.
+    """
+    seen = set()
+    pending = list(roots)
+    total = 0
+    skip = (type, type(sys), type(deep_sizeof), type(len))
+
+    while pending:
+        obj = pending.pop()
+        if id(obj) in seen or isinstance(obj, skip):
+            continue
+
+        seen.add(id(obj))
+        total += sys.getsizeof(obj, 0)
+        pending.extend(gc.get_referents(obj))
+
+    return total
+
+
+def process_rss():
+    """:return: The resident memory of this process in bytes, or None where unavailable."""
+    try:
+        with open("/proc/self/statm", "r") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        pass
+
+    try:
+        import resource
+
+        # Peak rather than current usage; ru_maxrss is in bytes on macOS, KiB on Linux.
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+    except ImportError:
+        return None
+
+
+def test_image():
+    """:return: A small PNG map tile to upload for the vision requests."""
+    from PIL import Image, ImageDraw
+
+    image = Image.new("RGB", (256, 256), "white")
+    draw = ImageDraw.Draw(image)
+    draw.rectangle((40, 60, 200, 180), outline="red", width=4)
+    draw.line((0, 128, 256, 140), fill="blue", width=6)
+
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+
+    return buffer.getvalue()
+
+
+def install_database_standin(tables, round_trip, result_rows):
+    """
+    Route every PostgreSQL connection opened in this process to the stand-in.
+
+    :param tables: Number of relations of the synthetic catalog.
+    :param round_trip: Simulated seconds per statement.
+    :param result_rows: Number of rows returned by a SELECT.
+    :return: None
+    """
+    import database.postgres
+    from benchmarks.standin import synthetic_catalog, StandInConnection
+
+    catalog = synthetic_catalog(tables)
+
+    def connect(**kwargs):
+        return StandInConnection(catalog, round_trip, result_rows)
+
+    database.postgres.psycopg2.connect = connect
+
+
+class Recorder:
+    """Collects the outcome of every request by endpoint."""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+        self.statuses = defaultdict(lambda: defaultdict(int))
+
+    def record(self, endpoint, seconds, status):
+        self.statuses[endpoint][status] += 1
+
+        if isinstance(status, int) and status < 400:
+            self.latencies[endpoint].append(seconds)
+        else:
+            self.errors[endpoint] += 1
+
+    def summary(self, elapsed):
+        """
+        :param elapsed: Duration of the measured phase in seconds.
+        :return: A list of result dicts, one per endpoint.
+        """
+        results = []
+
+        for endpoint in sorted(self.statuses):
+            latencies = self.latencies[endpoint]
+            requests = sum(self.statuses[endpoint].values())
+
+            results.append(
+                {
+                    "name": f"loadtest.{endpoint}",
+                    "params": {},
+                    "requests": requests,
+                    "errors": self.errors[endpoint],
+                    "error_rate": self.errors[endpoint] / requests,
+                    "throughput": len(latencies) / elapsed if elapsed else None,
+                    "median": percentile(latencies, 0.50),
+                    "p95": percentile(latencies, 0.95),
+                    "p99": percentile(latencies, 0.99),
+                    "max": max(latencies) if latencies else None,
+                    "statuses": {
+                        str(status): count
+                        for status, count in self.statuses[endpoint].items()
+                    },
+                }
+            )
+
+        return results
+
+
+class LoadTest:
+    """Drives the API through an httpx.AsyncClient."""
+
+    def __init__(self, client, args, sessions_dict=None):
+        """
+        :param client: An httpx.AsyncClient for the server.
+        :param args: The parsed command line options.
+        :param sessions_dict: The server's `sessions` dict when it runs in-process, so
+                              its memory can be measured.
+        """
+        self.client = client
+        self.args = args
+        self.sessions_dict = sessions_dict
+        self.rng = random.Random(args.seed)
+        self.setup = Recorder()
+        self.recorder = Recorder()
+        self.timeline = []
+
+        self.text_sessions = []
+        self.vision_sessions = []
+        self.last_query = {}
+        self.image_id = None
+
+    async def request(self, endpoint, method, path, **kwargs):
+        """Send a request, record its latency and status, and return the response (or None)."""
+        started = time.perf_counter()
+
+        try:
+            response = await self.client.request(
+                method, path, timeout=self.args.timeout, **kwargs
+            )
+            status = response.status_code
+        except Exception as e:
+            response, status = None, type(e).__name__
+
+        recorder = self.setup if endpoint in SETUP_ENDPOINTS else self.recorder
+        recorder.record(endpoint, time.perf_counter() - started, status)
+
+        return response
+
+    async def open_sessions(self):
+        mix = self.args.mix
+        count = self.args.sessions
+        vision = 0
+        if mix.get("vision"):
+            vision = max(1, round(count * mix["vision"] / sum(mix.values())))
+            vision = min(vision, count - 1) if mix.get("text") else count
+
+        run = uuid.uuid4().hex[:8]
+        requests = []
+        for i in range(count):
+            session_id = f"load-{run}-{i}"
+            chatbot_type = (
+                self.args.vision_chatbot if i < vision else self.args.text_chatbot
+            )
+            (self.vision_sessions if i < vision else self.text_sessions).append(
+                session_id
+            )
+            requests.append(self.initialize(session_id, chatbot_type))
+
+        await asyncio.gather(*requests)
+
+        if self.vision_sessions:
+            response = await self.request(
+                "images",
+                "POST",
+                "/images",
+                files={"file": ("tile.png", test_image(), "image/png")},
+            )
+            if response is not None and response.status_code == 200:
+                self.image_id = response.json()["image_id"]
+
+    async def initialize(self, session_id, chatbot_type):
+        await self.request(
+            "initialize",
+            "POST",
+            "/initialize",
+            json={
+                "session_id": session_id,
+                "database_config": {
+                    "db_type": "postgresql",
+                    "db_name": self.args.db_name,
+                    "db_user": self.args.db_user,
+                    "db_password": self.args.db_password,
+                    "db_host": self.args.db_host,
+                    "db_port": self.args.db_port,
+                },
+                "chatbot_type": chatbot_type,
+                "model_name": self.args.model,
+            },
+        )
+
+    async def text_chat(self):
+        session_id = self.rng.choice(self.text_sessions)
+        response = await self.request(
+            "text",
+            "POST",
+            "/chat/text",
+            json={"session_id": session_id, "message": self.rng.choice(QUESTIONS)},
+        )
+        self.remember_query(session_id, response)
+
+    async def vision_chat(self):
+        session_id = self.rng.choice(self.vision_sessions)
+        response = await self.request(
+            "vision",
+            "POST",
+            "/chat/vision",
+            json={
+                "session_id": session_id,
+                "message": self.rng.choice(VISION_QUESTIONS),
+                "image_id": self.image_id,
+            },
+        )
+        self.remember_query(session_id, response)
+
+    async def execute(self):
+        session_id = self.rng.choice(self.text_sessions + self.vision_sessions)
+        await self.request(
+            "execute",
+            "POST",
+            "/execute",
+            json={
+                "session_id": session_id,
+                "query": self.last_query.get(session_id, FALLBACK_QUERY),
+            },
+        )
+
+    def remember_query(self, session_id, response):
+        """Keep the last generated query of a session, like a user about to run it."""
+        from chatbot.sql_utils import extract_sql_query
+
+        if response is None or response.status_code != 200:
+            return
+
+        query = extract_sql_query(response.json()["response"])
+        if query:
+            self.last_query[session_id] = query
+
+    def next_request(self):
+        mix = dict(self.args.mix)
+        if not self.vision_sessions or self.image_id is None:
+            mix.pop("vision", None)
+        if not self.text_sessions:
+            mix.pop("text", None)
+
+        endpoint = self.rng.choices(list(mix), weights=list(mix.values()))[0]
+
+        return {
+            "text": self.text_chat,
+            "vision": self.vision_chat,
+            "execute": self.execute,
+        }[endpoint]()
+
+    async def sample_memory(self, started):
+        """Record the number of sessions and their memory at a point of the run."""
+        sample = {"seconds": round(time.perf_counter() - started, 3)}
+
+        if self.sessions_dict is not None:
+            sessions = list(self.sessions_dict.values())
+            sample["sessions"] = len(sessions)
+            sample["sessions_bytes"] = deep_sizeof(sessions)
+            sample["process_rss"] = process_rss()
+        else:
+            response = await self.client.get("/sessions")
+            sample["sessions"] = (
+                len(response.json()) if response.status_code == 200 else None
+            )
+
+        self.timeline.append(sample)
+
+    async def monitor(self, started):
+        while True:
+            await asyncio.sleep(self.args.sample_interval)
+            await self.sample_memory(started)
+
+    async def run(self):
+        """
+        Open the sessions, run the load for the configured duration, and close them.
+
+        :return: The seconds the load phase took, in-flight requests included.
+        """
+        await self.open_sessions()
+
+        started = time.perf_counter()
+        await self.sample_memory(started)
+        monitor = asyncio.create_task(self.monitor(started))
+
+        in_flight = set()
+        deadline = started + self.args.duration
+        next_arrival = started
+
+        while True:
+            next_arrival += self.rng.expovariate(self.args.rate)
+            if next_arrival >= deadline:
+                break
+
+            await asyncio.sleep(max(0.0, next_arrival - time.perf_counter()))
+
+            if len(in_flight) >= self.args.max_in_flight:
+                self.recorder.record("client", 0.0, "dropped")
+                continue
+
+            task = asyncio.create_task(self.next_request())
+            in_flight.add(task)
+            task.add_done_callback(in_flight.discard)
+
+        if in_flight:
+            await asyncio.wait(in_flight)
+
+        elapsed = time.perf_counter() - started
+
+        monitor.cancel()
+        await self.sample_memory(started)
+
+        await self.client.delete("/sessions")
+
+        return elapsed
+
+
+def print_report(results, timeline, elapsed):
+    def ms(value):
+        return f"{value * 1000:9.1f}" if value is not None else f"{'-':>9}"
+
+    print(f"\nLoad phase: {elapsed:.1f} s")
+    print(
+        f"{'endpoint':<12}{'requests':>9}{'errors':>8}{'err %':>7}{'req/s':>8}"
+        f"{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}"
+    )
+    for entry in results:
+        throughput = entry["throughput"]
+        rate = f"{throughput:>8.1f}" if throughput is not None else f"{'-':>8}"
+        print(
+            f"{entry['name'].split('.', 1)[1]:<12}{entry['requests']:>9}"
+            f"{entry['errors']:>8}{entry['error_rate'] * 100:>7.1f}{rate}"
+            f"{ms(entry['median'])}{ms(entry['p95'])}{ms(entry['p99'])}"
+        )
+
+        failures = {
+            status: count
+            for status, count in entry["statuses"].items()
+            if not status.isdigit() or int(status) >= 400
+        }
+        if failures:
+            print(f"{'':<12}failures: {failures}")
+
+    print("\nSessions over time:")
+    for sample in timeline:
+        line = f"  {sample['seconds']:8.1f} s  {sample['sessions']} sessions"
+        if sample.get("sessions_bytes") is not None:
+            line += f", {sample['sessions_bytes'] / 1024:,.0f} KiB"
+        if sample.get("process_rss") is not None:
+            line += f", process {sample['process_rss'] / 2**20:,.0f} MiB"
+        print(line)
+
+    if len(timeline) > 1 and timeline[0].get("sessions_bytes"):
+        first, last = timeline[0], timeline[-1]
+        growth = last["sessions_bytes"] - first["sessions_bytes"]
+        print(
+            f"\nSessions grew by {growth / 1024:,.0f} KiB "
+            f"({growth / max(1, last['sessions']) / 1024:,.1f} KiB per session)"
+        )
+
+
+async def run_load(args):
+    import httpx
+
+    if args.url:
+        async with httpx.AsyncClient(base_url=args.url) as client:
+            load = LoadTest(client, args)
+            elapsed = await load.run()
+
+        return load, elapsed
+
+    # In-process: the settings are read when main.py is imported.
+    os.environ.setdefault("FAKE_LLM_LATENCY", args.llm_latency)
+    install_database_standin(args.tables, args.db_round_trip_ms / 1000, args.rows)
+
+    import main
+
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://app") as client:
+        load = LoadTest(client, args, sessions_dict=main.sessions)
+        elapsed = await load.run()
+
+    return load, elapsed
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="SpatialMind API load test")
+    parser.add_argument("--url", help="Server to test (default: main.app in-process)")
+    parser.add_argument("--sessions", type=int, default=20)
+    parser.add_argument("--rate", type=float, default=20.0, help="Requests per second")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds")
+    parser.add_argument(
+        "--mix",
+        type=parse_mix,
+        default=parse_mix("text=6,vision=1,execute=3"),
+        help="Relative weights of the endpoints",
+    )
+    parser.add_argument("--text-chatbot", default="fake_text")
+    parser.add_argument("--vision-chatbot", default="fake_vision")
+    parser.add_argument("--model", default="fake-sql")
+    parser.add_argument("--timeout", type=float, default=120.0)
+    parser.add_argument("--max-in-flight", type=int, default=1000)
+    parser.add_argument("--sample-interval", type=float, default=5.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", help="Write the results to this JSON file")
+
+    database = parser.add_argument_group("database (with --url)")
+    database.add_argument("--db-name", default="loadtest")
+    database.add_argument("--db-user", default="loadtest")
+    database.add_argument("--db-password", default="loadtest")
+    database.add_argument("--db-host", default="localhost")
+    database.add_argument("--db-port", default="5432")
+
+    standin = parser.add_argument_group("in-process stand-ins")
+    standin.add_argument("--tables", type=int, default=100)
+    standin.add_argument("--rows", type=int, default=100, help="Rows per SELECT")
+    standin.add_argument("--db-round-trip-ms", type=float, default=1.0)
+    standin.add_argument(
+        "--llm-latency",
+        default="lognormal:300,0.5",
+        help="FAKE_LLM_LATENCY, unless already set in the environment",
+    )
+    args = parser.parse_args(argv)
+
+    load, elapsed = asyncio.run(run_load(args))
+
+    results = load.setup.summary(None) + load.recorder.summary(elapsed)
+    print_report(results, load.timeline, elapsed)
+
+    if args.out:
+        options = {k: v for k, v in vars(args).items() if k != "db_password"}
+        save_results(args.out, results, options, memory=load.timeline)
+        print(f"\nSaved results to {args.out}")
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
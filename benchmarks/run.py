@@ -0,0 +1,82 @@
+"""
+Run the component benchmarks and save the results as JSON.
+
+    python -m benchmarks.run --out results.json
+    python -m benchmarks.run --out new.json --compare results.json
+
+Compare two commits by running the suite on each and passing the first file to
+--compare on the second run; cases whose median slowed down by more than the
+threshold are reported as regressions and make the command exit with status 1.
+"""
+
+import sys
+import argparse
+from benchmarks import (
+    bench_schema,
+    bench_rows,
+    bench_sql,
+    bench_geometry,
+    bench_imports,
+)
+from benchmarks.harness import save_results, compare, result_key, format_seconds
+
+SUITES = {
+    "schema": bench_schema,
+    "rows": bench_rows,
+    "sql": bench_sql,
+    "geometry": bench_geometry,
+    "imports": bench_imports,
+}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="SpatialMind component benchmarks")
+    parser.add_argument("--out", default="benchmark_results.json")
+    parser.add_argument(
+        "--only", action="append", choices=sorted(SUITES), help="Run only this suite"
+    )
+    parser.add_argument(
+        "--quick", action="store_true", help="Skip the largest input sizes"
+    )
+    parser.add_argument(
+        "--round-trip-ms",
+        type=float,
+        default=0.2,
+        help="Simulated database round trip per statement",
+    )
+    parser.add_argument("--compare", help="Baseline results file to compare against")
+    parser.add_argument(
+        "--threshold",
+        type=float,
+        default=0.10,
+        help="Relative slowdown reported as a regression",
+    )
+    args = parser.parse_args(argv)
+
+    results = []
+    for name in args.only or SUITES:
+        print(f"Running {name} benchmarks...")
+
+        if name == "schema":
+            suite_results = SUITES[name].run(
+                quick=args.quick, round_trip=args.round_trip_ms / 1000
+            )
+        else:
+            suite_results = SUITES[name].run(quick=args.quick)
+
+        for entry in suite_results:
+            print(f"  {result_key(entry):<60} {format_seconds(entry['median'])}")
+
+        results.extend(suite_results)
+
+    save_results(args.out, results, vars(args))
+    print(f"\nSaved {len(results)} results to {args.out}")
+
+    if args.compare:
+        return 1 if compare(args.compare, results, args.threshold) else 0
+
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,340 @@
+import re
+import json
+import time
+import random
+from database import PostgresqlDBConnector
+
+GEOMETRY_TYPES = ["POINT", "LINESTRING", "POLYGON", "MULTIPOLYGON", "MULTILINESTRING"]
+
+COLUMN_TYPES = [
+    ("name", "character varying", "varchar"),
+    ("code", "text", "text"),
+    ("population", "integer", "int4"),
+    ("area", "double precision", "float8"),
+    ("created_at", "timestamp without time zone", "timestamp"),
+    ("active", "boolean", "bool"),
+    ("height", "numeric", "numeric"),
+    ("category", "character varying", "varchar"),
+]
+
+
+def synthetic_catalog(tables, columns_per_table=12, seed=0):
+    """
+    Build a synthetic PostGIS catalog.
+
+    About 70% of the tables have a geometry column, every tenth relation is a view,
+    and each table after the first references the previous one.
+
+    :param tables: Number of tables and views.
+    :param columns_per_table: Number of columns of each relation.
+    :param seed: Seed of the generator, so catalogs are identical across runs.
+    :return: A dict mapping each relation name to a dict with "kind", "columns" (a list of
+             (name, data_type, udt_name)), "geometry" ((column, type, srid) or None),
+             "primary_key", "foreign_keys" and "rows".
+    """
+    rng = random.Random(seed)
+    catalog = {}
+
+    for i in range(tables):
+        name = f"layer_{i:04d}"
+        kind = "view" if i % 10 == 9 else "table"
+
+        columns = [("id", "integer", "int4")]
+        foreign_keys = []
+        if i > 0 and kind == "table":
+            columns.append(("parent_id", "integer", "int4"))
+            foreign_keys.append((["parent_id"], f"layer_{i - 1:04d}", ["id"]))
+
+        while len(columns) < columns_per_table - 1:
+            column, data_type, udt = COLUMN_TYPES[len(columns) % len(COLUMN_TYPES)]
+            columns.append((f"{column}_{len(columns)}", data_type, udt))
+
+        geometry = None
+        if rng.random() < 0.7:
+            geometry = ("geom", rng.choice(GEOMETRY_TYPES), rng.choice([4326, 3857]))
+            columns.append(("geom", "USER-DEFINED", "geometry"))
+
+        catalog[name] = {
+            "kind": kind,
+            "columns": columns,
+            "geometry": geometry,
+            "primary_key": ["id"] if kind == "table" else [],
+            "foreign_keys": foreign_keys,
+            "rows": rng.randint(0, 1_000_000) if kind == "table" else None,
+        }
+
+    return catalog
+
+
+FROM_TABLE = re.compile(r"\bFROM\s+(?:public\.)?(\w+)", re.IGNORECASE)
+
+SAMPLE_ROW = re.compile(r"SELECT \* FROM (\w+) LIMIT 1;?")
+
+LIMIT = re.compile(r"\bLIMIT\s+(\d+)", re.IGNORECASE)
+
+
+class StandInCursor:
+    """
+    A psycopg2-like cursor that answers the catalog queries issued by
+    `PostgresqlDBConnector` from a synthetic catalog, plans any statement with EXPLAIN,
+    and answers other SELECT statements with generated rows.
+
+    Every statement sleeps for the configured round trip, so strategies that issue more
+    statements cost more, as they do against a real server.
+    """
+
+    def __init__(self, catalog, round_trip, result_rows=100):
+        """
+        :param catalog: A catalog from `synthetic_catalog`.
+        :param round_trip: Seconds each statement takes.
+        :param result_rows: Number of rows returned for a SELECT without a smaller LIMIT.
+        """
+        self.catalog = catalog
+        self.round_trip = round_trip
+        self.result_rows = result_rows
+        self.description = None
+        self.statements = 0
+        self._result = []
+
+    def execute(self, query, params=None):
+        self.statements += 1
+        if self.round_trip:
+            time.sleep(self.round_trip)
+
+        self.description = None
+        self._result = self._answer(" ".join(query.split()), params)
+
+    def fetchall(self):
+        result, self._result = self._result, []
+        return result
+
+    def fetchmany(self, size):
+        # Only server-side cursors fetch in batches; each batch is a round trip.
+        if self.round_trip:
+            time.sleep(self.round_trip)
+
+        result, self._result = self._result[:size], self._result[size:]
+        return result
+
+    def fetchone(self):
+        return self._result[0] if self._result else None
+
+    def close(self):
+        pass
+
+    def _answer(self, query, params):
+        catalog = self.catalog
+        names = sorted(catalog)
+
+        if (
+            "FROM information_schema.columns c JOIN information_schema.tables t"
+            in query
+        ):
+            if "t.table_type, c.column_name" in query:
+                return [
+                    (
+                        name,
+                        "VIEW" if catalog[name]["kind"] == "view" else "BASE TABLE",
+                        column,
+                        data_type,
+                        udt,
+                    )
+                    for name in names
+                    for column, data_type, udt in catalog[name]["columns"]
+                ]
+            return [
+                (name, column)
+                for name in names
+                for column, _, _ in catalog[name]["columns"]
+            ]
+
+        if "FROM information_schema.tables" in query:
+            return [(name,) for name in names]
+
+        if "FROM information_schema.columns" in query:
+            (table_name,) = params
+            return [
+                (column, data_type, "YES", None)
+                for column, data_type, _ in catalog[table_name]["columns"]
+            ]
+
+        if "FROM geometry_columns" in query:
+            return [
+                (name, *catalog[name]["geometry"])
+                for name in names
+                if catalog[name]["geometry"]
+            ]
+
+        if "FROM geography_columns" in query:
+            return []
+
+        if "FROM pg_constraint" in query:
+            rows = []
+            for name in names:
+                table = catalog[name]
+                if table["primary_key"]:
+                    rows.append(("p", name, table["primary_key"], None, [None]))
+                for columns, ref_table, ref_columns in table["foreign_keys"]:
+                    rows.append(("f", name, columns, ref_table, ref_columns))
+            return rows
+
+        if "FROM pg_class c" in query:
+            return [
+                (name, catalog[name]["rows"])
+                for name in names
+                if catalog[name]["kind"] == "table"
+            ]
+
+        if query.startswith("SET "):
+            return []
+
+        if query.startswith("EXPLAIN"):
+            self._require_table(query)
+            plan = [{"Plan": {"Total Cost": 100.0, "Plan Rows": self.result_rows}}]
+            return [(json.dumps(plan),)]
+
+        sample = SAMPLE_ROW.fullmatch(query)
+        if sample:
+            table_name = sample.group(1)
+            return [
+                tuple(
+                    (
+                        "0101000020E6100000000000000000F03F0000000000000040"
+                        if data_type == "USER-DEFINED"
+                        else f"{column}-value"
+                    )
+                    for column, data_type, _ in catalog[table_name]["columns"]
+                )
+            ]
+
+        if query.upper().startswith(("SELECT", "WITH")):
+            return self._select(query)
+
+        raise ValueError(f"The stand-in cannot answer: {query[:80]}")
+
+    def _require_table(self, query):
+        """Fail like PostgreSQL when the first relation of a query does not exist."""
+        match = FROM_TABLE.search(query)
+        if match and match.group(1) not in self.catalog:
+            raise ValueError(f'relation "{match.group(1)}" does not exist')
+
+        return match.group(1) if match else None
+
+    def _select(self, query):
+        """Generate rows for an arbitrary SELECT: one text value per selected column."""
+        self._require_table(query)
+
+        select_list = query.split(" ", 1)[1].split(" FROM ", 1)[0].rstrip(";")
+        names = []
+        for item in _split_top_level(select_list):
+            alias = re.search(r"\bAS\s+(\w+)$", item, re.IGNORECASE)
+            names.append(alias.group(1) if alias else item.split(".")[-1].strip('"'))
+
+        limit = LIMIT.search(query)
+        count = (
+            min(int(limit.group(1)), self.result_rows) if limit else self.result_rows
+        )
+
+        types = [_column_type(name) for name in names]
+        self.description = [
+            (name, type_code, None, None, None, None, None)
+            for name, type_code in zip(names, types)
+        ]
+
+        return [
+            tuple(_value(name, type_code, i) for name, type_code in zip(names, types))
+            for i in range(count)
+        ]
+
+
+def _column_type(name):
+    """Type OID of a selected column, guessed from its name: ids are int4, areas float8."""
+    if name == "id" or name.endswith("_id"):
+        return 23
+    if name.startswith("area"):
+        return 701
+    return 25
+
+
+def _value(name, type_code, i):
+    if type_code == 23:
+        return i
+    if type_code == 701:
+        return i * 1.5
+    if name.startswith("geom"):
+        return f"POINT({10 + i * 0.001:.3f} {50 + i * 0.001:.3f})"
+    return f"{name}-{i}"
+
+
+def _split_top_level(text):
+    """Split a select list on the commas outside parentheses."""
+    items, depth, current = [], 0, []
+    for char in text:
+        if char == "," and depth == 0:
+            items.append("".join(current).strip())
+            current = []
+            continue
+        depth += {"(": 1, ")": -1}.get(char, 0)
+        current.append(char)
+
+    items.append("".join(current).strip())
+
+    return [item for item in items if item]
+
+
+class StandInConnection:
+    """A psycopg2-like connection whose cursor is a `StandInCursor`."""
+
+    def __init__(self, catalog, round_trip=0.0, result_rows=100):
+        self._cursor = StandInCursor(catalog, round_trip, result_rows)
+        self.closed = 0
+
+    def cursor(self, name=None, withhold=False):
+        # A named (server-side) cursor is a separate cursor on the same catalog.
+        if name is not None:
+            return StandInCursor(
+                self._cursor.catalog, self._cursor.round_trip, self._cursor.result_rows
+            )
+
+        return self._cursor
+
+    def cancel(self):
+        pass
+
+    def commit(self):
+        pass
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        self.closed = 1
+
+
+def standin_connector(catalog, round_trip=0.0):
+    """
+    Create a real `PostgresqlDBConnector` wired to a stand-in connection.
+
+    :param catalog: A catalog from `synthetic_catalog`.
+    :param round_trip: Seconds each statement takes.
+    :return: The connector.
+    """
+    connector = PostgresqlDBConnector(
+        f"standin_{id(catalog)}_{len(catalog)}", "bench", "bench"
+    )
+    connector.connection = StandInConnection(catalog, round_trip)
+    connector.cursor = connector.connection.cursor()
+    # Planning, jobs and result cursors run on connections of their own.
+    connector.dedicated = lambda: _dedicated_connector(catalog, round_trip)
+
+    return connector
+
+
+def _dedicated_connector(catalog, round_trip):
+    """:return: An unshared connector wired to a new stand-in connection."""
+    connector = object.__new__(PostgresqlDBConnector)
+    connector.__init__("standin_dedicated", "bench", "bench")
+    connector.connection = StandInConnection(catalog, round_trip)
+    connector.cursor = connector.connection.cursor()
+
+    return connector
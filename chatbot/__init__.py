@@ -1,11 +1,31 @@
+import importlib
 from .base_chatbot import BaseChatbot
-from .gemini_text_chatbot import GeminiTextChatbot
-from .gemini_vision import GeminiVisionChatbot
-from .ollama_text import OllamaTextChatbot
-
-__all__ = [
-    "BaseChatbot",
-    "GeminiTextChatbot",
-    "GeminiVisionChatbot",
-    "OllamaTextChatbot",
-]
+
+# Chatbot classes by name and the submodule defining them. The provider modules pull in
+# their LangChain integrations and SDKs, so they are only imported on first access
+# (PEP 562); a deployment that uses one provider never loads the others.
+_LAZY_CLASSES = {
+    "GeminiTextChatbot": ".gemini_text_chatbot",
+    "GeminiVisionChatbot": ".gemini_vision",
+    "OllamaTextChatbot": ".ollama_text",
+    "HedgedTextChatbot": ".hedged_chatbot",
+    "FakeTextChatbot": ".fake_llm",
+    "FakeVisionChatbot": ".fake_llm",
+    "FakeSQLChatModel": ".fake_llm",
+}
+
+__all__ = ["BaseChatbot", *_LAZY_CLASSES]
+
+
+def __getattr__(name):
+    if name not in _LAZY_CLASSES:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    value = getattr(importlib.import_module(_LAZY_CLASSES[name], __name__), name)
+    globals()[name] = value
+
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
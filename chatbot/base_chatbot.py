@@ -1,4 +1,10 @@
 from abc import abstractmethod, ABC
+from chatbot.example_store import (
+    get_example_store,
+    database_key,
+    example_messages,
+    examples_injected,
+)
 
 
 class BaseChatbot(ABC):
@@ -8,6 +14,7 @@ class BaseChatbot(ABC):
     This class defines the required interface for all chatbot subclasses.
     Any chatbot that inherits from this class must implement the following methods:
     - `chat(input)`
+    - `achat(input)`
     - `get_history()`
     - `clear_history()`
     - `save_history(question, answer)`
@@ -23,6 +30,19 @@ class BaseChatbot(ABC):
         """
         pass
 
+    @abstractmethod
+    async def achat(self, input):
+        """
+        Asynchronously process user input and return the chatbot's response.
+
+        Implementations must not block the event loop: model calls go through `ainvoke`
+        and blocking work (database access, file I/O) runs in a worker thread.
+
+        :param input: The user's input message to the chatbot.
+        :return: The chatbot's response based on the input.
+        """
+        pass
+
     @abstractmethod
     def get_history(self):
         """
@@ -48,3 +68,74 @@ class BaseChatbot(ABC):
         :param answer: The chatbot's generated answer.
         """
         pass
+
+    def spawn(self, model_name=None, temperature=None, sample=None):
+        """
+        Create a sibling chatbot on the same database that starts from a copy of this history.
+
+        Clients and chains come from the shared registry, so spawning is cheap. This is used
+        to generate several answers to the same question with different models or temperatures.
+
+        :param model_name: Model for the sibling (defaults to this chatbot's model).
+        :param temperature: Sampling temperature for the sibling (defaults to this chatbot's).
+        :param sample: Index that keeps siblings with the same model and temperature from
+                       sharing one coalesced model call.
+        :return: A new chatbot of the same type.
+        """
+        sibling = type(self)(
+            self.database,
+            model_name or self.model_name,
+            temperature=self.temperature if temperature is None else temperature,
+        )
+        sibling.chat_history = list(self.get_history())
+        sibling.sample = sample
+
+        return sibling
+
+    def coalesce_key(self, stage, *parts):
+        """
+        Build the key under which identical concurrent model calls are shared.
+
+        :param stage: Name of the pipeline stage (e.g., "text_answer").
+        :param parts: Everything else the stage's output depends on (question, digests).
+        :return: A hashable tuple.
+        """
+        sample = getattr(self, "sample", None)
+
+        # Sessions on different databases with the same history and schema text must not
+        # share answers (and the SQL validated against one database).
+        return (
+            self.provider,
+            self.model_name,
+            self.temperature,
+            sample,
+            database_key(self.database),
+            stage,
+        ) + parts
+
+    def few_shot_messages(self, question):
+        """
+        Retrieve examples of similar questions on this database whose generated queries
+        ran successfully and fast, to place before the conversation history.
+
+        The examples go after the system prompt and schema, so the static prompt prefix
+        (and its provider-side cache) is unchanged.
+
+        :param question: The reformulated question.
+        :return: A list of alternating HumanMessage and AIMessage, empty when
+                 few-shot examples are disabled or nothing similar was recorded.
+        """
+        store = get_example_store()
+        if store is None:
+            return []
+
+        try:
+            catalog = self.database.get_catalog()
+        except Exception:
+            catalog = None
+
+        examples = store.search(database_key(self.database), question, catalog=catalog)
+        if examples:
+            examples_injected.inc(len(examples))
+
+        return example_messages(examples)
@@ -0,0 +1,126 @@
+import asyncio
+from chatbot.sql_utils import extract_sql_query, single_statement
+from config import candidate_temperatures, candidate_models, max_candidates
+
+
+def candidate_variants(chatbot, count):
+    """
+    Build the (model_name, temperature) pairs used for multi-candidate generation.
+
+    :param chatbot: The session's chatbot.
+    :param count: Number of candidates requested (capped by `max_candidates`).
+    :return: A list of (model_name, temperature) tuples.
+    """
+    count = max(1, min(count, max_candidates))
+    models = candidate_models or [chatbot.model_name]
+
+    return [
+        (
+            models[i % len(models)],
+            candidate_temperatures[i % len(candidate_temperatures)],
+        )
+        for i in range(count)
+    ]
+
+
+async def _validate(database, response):
+    """
+    Extract the SQL query from a response and plan it with EXPLAIN.
+
+    :return: A tuple (query, plan, error).
+    """
+    query = extract_sql_query(response)
+
+    if query is None:
+        return None, None, "No SQL query found in response."
+
+    try:
+        plan = await asyncio.to_thread(database.explain_query, single_statement(query))
+    except Exception as e:
+        return query, None, str(e)
+
+    return query, plan, None
+
+
+async def agenerate_candidates(chatbot, input, count):
+    """
+    Generate several answers concurrently and keep the valid SQL with the lowest estimated cost.
+
+    Every candidate comes from a sibling of `chatbot` (different temperature and/or model)
+    starting from the same history. Each candidate's SQL is planned with EXPLAIN against the
+    session database, never executed. The winner's history becomes the session history.
+    If no candidate contains valid SQL (e.g., a schema question), the first answer is kept.
+
+    :param chatbot: The session's chatbot.
+    :param input: The chat input, as accepted by `chatbot.achat`.
+    :param count: Number of candidates to generate.
+    :return: A tuple (response, candidates) where candidates is a list of dicts with
+             model_name, temperature, query, cost, rows and error, ordered by cost.
+    """
+    siblings = [
+        chatbot.spawn(model_name, temperature, sample=i)
+        for i, (model_name, temperature) in enumerate(
+            candidate_variants(chatbot, count)
+        )
+    ]
+
+    results = await asyncio.gather(
+        *(sibling.achat(input) for sibling in siblings), return_exceptions=True
+    )
+
+    answered = [
+        (sibling, result)
+        for sibling, result in zip(siblings, results)
+        if not isinstance(result, BaseException) and result is not None
+    ]
+
+    if not answered:
+        errors = [r for r in results if isinstance(r, BaseException)]
+        if errors:
+            raise errors[0]
+        return None, []
+
+    validations = await asyncio.gather(
+        *(_validate(chatbot.database, response) for _, response in answered)
+    )
+
+    candidates = []
+    best = None
+
+    for (sibling, response), (query, plan, error) in zip(answered, validations):
+        candidate = {
+            "model_name": sibling.model_name,
+            "temperature": sibling.temperature,
+            "query": query,
+            "cost": plan["cost"] if plan else None,
+            "rows": plan["rows"] if plan else None,
+            "error": error,
+        }
+        candidates.append(candidate)
+
+        if plan and (best is None or plan["cost"] < best[2]["cost"]):
+            best = (sibling, response, candidate)
+
+    for sibling, result in zip(siblings, results):
+        if isinstance(result, BaseException):
+            candidates.append(
+                {
+                    "model_name": sibling.model_name,
+                    "temperature": sibling.temperature,
+                    "query": None,
+                    "cost": None,
+                    "rows": None,
+                    "error": str(result),
+                }
+            )
+
+    if best is None:
+        sibling, response = answered[0]
+    else:
+        sibling, response, _ = best
+
+    chatbot.chat_history = sibling.get_history()
+
+    candidates.sort(key=lambda c: (c["cost"] is None, c["cost"] or 0.0))
+
+    return response, candidates
@@ -0,0 +1,75 @@
+import threading
+from metrics import TokenUsageHandler
+
+
+class ClientRegistry:
+    """
+    Process-wide registry of LLM clients and compiled prompt chains.
+
+    Clients are keyed by (provider, model_name, temperature) so every session that uses
+    the same model configuration shares one client, its HTTP keep-alive pool and the
+    chains compiled on top of it. Conversation history is not part of the shared state;
+    it stays on each chatbot instance.
+    """
+
+    _clients = {}
+    _chains = {}
+    _lock = threading.Lock()
+
+    @classmethod
+    def get_client(cls, provider, model_name, temperature, builder):
+        """
+        Return the shared client for a model configuration, creating it on first use.
+
+        :param provider: Provider name (e.g., "gemini", "ollama").
+        :param model_name: The model name passed to the provider.
+        :param temperature: Sampling temperature the client is configured with.
+        :param builder: Zero-argument callable that constructs the client.
+        :return: The shared client instance.
+        """
+        key = (provider, model_name, temperature)
+
+        with cls._lock:
+            if key not in cls._clients:
+                client = builder()
+                # Every chain built on the shared client reports its token usage.
+                client.callbacks = list(client.callbacks or []) + [
+                    TokenUsageHandler(provider, model_name)
+                ]
+                cls._clients[key] = client
+
+            return cls._clients[key]
+
+    @classmethod
+    def get_chain(cls, key, builder):
+        """
+        Return a shared compiled chain, creating it on first use.
+
+        :param key: Hashable key; by convention the client key followed by the chain name.
+        :param builder: Zero-argument callable that compiles the chain.
+        :return: The shared chain instance.
+        """
+        with cls._lock:
+            if key not in cls._chains:
+                cls._chains[key] = builder()
+
+            return cls._chains[key]
+
+    @classmethod
+    def client_count(cls):
+        """
+        :return: The number of shared clients.
+        """
+        with cls._lock:
+            return len(cls._clients)
+
+    @classmethod
+    def clear(cls):
+        """
+        Drop all shared clients and chains.
+
+        :return: None
+        """
+        with cls._lock:
+            cls._clients.clear()
+            cls._chains.clear()
@@ -0,0 +1,222 @@
+import math
+import time
+import asyncio
+import threading
+from collections import deque
+from contextlib import contextmanager, asynccontextmanager
+
+
+class QueueFull(Exception):
+    """Raised when a caller would have to wait for a gate whose queue is full."""
+
+    def __init__(self, gate, retry_after):
+        """
+        :param gate: The ConcurrencyGate (or other named queue) that rejected the caller.
+        :param retry_after: Estimated seconds until a slot is likely to be free.
+        """
+        super().__init__(
+            f"Too many requests waiting for {gate.name}; retry in {retry_after} s."
+        )
+        self.gate = gate
+        self.retry_after = retry_after
+
+
+class ConcurrencyGate:
+    """
+    A FIFO counting semaphore shared by threads and event loops, with queue statistics.
+
+    Synchronous callers block on `slot()`, coroutines await `aslot()`; both wait in the
+    same queue, so a limit holds no matter which path a request takes. Waiting coroutines
+    do not occupy a thread. With `max_queue`, a caller that finds the queue full is
+    rejected with `QueueFull` instead of waiting.
+    """
+
+    def __init__(self, name, limit, max_queue=0):
+        """
+        :param name: Name used when reporting statistics.
+        :param limit: Maximum number of concurrent holders.
+        :param max_queue: Maximum number of waiting callers (0 for no bound).
+        """
+        self.name = name
+        self.limit = max(1, int(limit))
+        self.max_queue = max(0, int(max_queue))
+
+        self.active = 0
+        self.acquired = 0
+        self.rejected = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+        self.hold_seconds_total = 0.0
+        self.held = 0
+
+        self._waiters = deque()
+        self._lock = threading.Lock()
+
+    @property
+    def queued(self):
+        """Number of callers waiting for a slot."""
+        return len(self._waiters)
+
+    def _record_wait(self, started):
+        waited = time.monotonic() - started
+        with self._lock:
+            self.acquired += 1
+            self.wait_seconds_total += waited
+            self.wait_seconds_max = max(self.wait_seconds_max, waited)
+        return waited
+
+    def _record_hold(self, acquired):
+        held = time.monotonic() - acquired
+        with self._lock:
+            self.held += 1
+            self.hold_seconds_total += held
+
+    def _reject(self):
+        """Count a rejection and build its exception; called with the lock held."""
+        self.rejected += 1
+
+        # Each queued caller and the new one need a slot; slots free up at a rate of
+        # `limit` per average hold time.
+        hold = self.hold_seconds_total / self.held if self.held else 1.0
+        retry_after = max(1, math.ceil(hold * (len(self._waiters) + 1) / self.limit))
+
+        return QueueFull(self, retry_after)
+
+    def _full(self):
+        """Whether a caller would be rejected; called with the lock held."""
+        return bool(self.max_queue) and len(self._waiters) >= self.max_queue
+
+    def acquire(self):
+        """
+        Block the calling thread until a slot is free.
+
+        :return: Seconds spent waiting.
+        :raises QueueFull: If the slots are taken and the queue is full.
+        """
+        started = time.monotonic()
+
+        with self._lock:
+            if self.active < self.limit and not self._waiters:
+                self.active += 1
+                event = None
+            elif self._full():
+                raise self._reject()
+            else:
+                event = threading.Event()
+                self._waiters.append(event)
+
+        if event is not None:
+            event.wait()
+
+        return self._record_wait(started)
+
+    async def aacquire(self):
+        """
+        Wait, without blocking the event loop, until a slot is free.
+
+        :return: Seconds spent waiting.
+        :raises QueueFull: If the slots are taken and the queue is full.
+        """
+        started = time.monotonic()
+        loop = asyncio.get_running_loop()
+
+        with self._lock:
+            if self.active < self.limit and not self._waiters:
+                self.active += 1
+                future = None
+            elif self._full():
+                raise self._reject()
+            else:
+                future = loop.create_future()
+                waiter = (loop, future)
+                self._waiters.append(waiter)
+
+        if future is None:
+            return self._record_wait(started)
+
+        try:
+            await future
+        except asyncio.CancelledError:
+            with self._lock:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                    granted = False
+                else:
+                    granted = True
+            # The slot was handed over before the cancellation landed; pass it on.
+            if granted:
+                self.release()
+            raise
+
+        return self._record_wait(started)
+
+    def release(self):
+        """
+        Free a slot, handing it directly to the oldest waiter if there is one.
+
+        :return: None
+        """
+        with self._lock:
+            if not self._waiters:
+                self.active -= 1
+                return
+
+            waiter = self._waiters.popleft()
+
+        if isinstance(waiter, threading.Event):
+            waiter.set()
+        else:
+            loop, future = waiter
+            loop.call_soon_threadsafe(_resolve, future)
+
+    @contextmanager
+    def slot(self):
+        """Context manager holding a slot for the duration of the block; yields the wait."""
+        waited = self.acquire()
+        acquired = time.monotonic()
+        try:
+            yield waited
+        finally:
+            self._record_hold(acquired)
+            self.release()
+
+    @asynccontextmanager
+    async def aslot(self):
+        """Async context manager holding a slot for the duration of the block; yields the wait."""
+        waited = await self.aacquire()
+        acquired = time.monotonic()
+        try:
+            yield waited
+        finally:
+            self._record_hold(acquired)
+            self.release()
+
+    def idle(self):
+        """:return: Whether no caller holds or waits for a slot."""
+        with self._lock:
+            return self.active == 0 and not self._waiters
+
+    def stats(self):
+        """
+        :return: A dict with the limit, active holders, queue depth and wait times.
+        """
+        with self._lock:
+            return {
+                "limit": self.limit,
+                "max_queue": self.max_queue,
+                "active": self.active,
+                "queued": len(self._waiters),
+                "acquired": self.acquired,
+                "rejected": self.rejected,
+                "wait_seconds_total": self.wait_seconds_total,
+                "wait_seconds_max": self.wait_seconds_max,
+                "wait_seconds_avg": (
+                    self.wait_seconds_total / self.acquired if self.acquired else 0.0
+                ),
+            }
+
+
+def _resolve(future):
+    """Wake a waiting coroutine unless it was cancelled in the meantime."""
+    if not future.done():
+        future.set_result(None)
@@ -0,0 +1,386 @@
+import re
+import math
+import time
+import sqlite3
+import threading
+from collections import defaultdict
+from chatbot.sql_validator import check_references
+from langchain_core.messages import HumanMessage, AIMessage
+from metrics import registry, Counter
+from config import (
+    few_shot_examples,
+    example_store_path,
+    example_max_seconds,
+    example_min_similarity,
+)
+
+WORD = re.compile(r"[a-z0-9]+")
+
+# Words that carry no meaning for matching questions against each other.
+STOPWORDS = frozenset(
+    """
+    a about all an and any are as at be by can do does each for from give have how i in
+    is it its list me my of on or please show that the their them there these this to
+    what when where which who with within would you
+    """.split()
+)
+
+# Examples held in memory per database; the most recently recorded ones are kept.
+MAX_EXAMPLES_PER_DATABASE = 10000
+
+examples_recorded = registry.register(
+    Counter(
+        "spatialmind_examples_recorded_total",
+        "Executed generated queries recorded in the example store.",
+        ["success"],
+    )
+)
+
+examples_injected = registry.register(
+    Counter(
+        "spatialmind_examples_injected_total",
+        "Few-shot examples added to answer prompts.",
+    )
+)
+
+
+def question_terms(question):
+    """
+    Split a question into the terms used for similarity.
+
+    :param question: A natural language question.
+    :return: The set of lower-cased words without stopwords and plural "s".
+    """
+    terms = set()
+    for word in WORD.findall((question or "").lower()):
+        if word in STOPWORDS:
+            continue
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        terms.add(word)
+
+    return terms
+
+
+def normalize_sql(query):
+    """:return: The query with collapsed whitespace and no trailing semicolon."""
+    return " ".join((query or "").split()).rstrip(";").strip()
+
+
+def database_key(database):
+    """
+    :param database: A database connector.
+    :return: The key examples of this database are stored under.
+    """
+    return f"{database.db_host}:{database.db_port}/{database.db_name}"
+
+
+class ExampleIndex:
+    """
+    In-memory inverted index over the questions of one database's examples.
+
+    Questions are compared by the cosine similarity of their IDF-weighted term sets, so
+    rare words (table and place names) count more than common ones. A search only visits
+    the examples that share at least one term with the question.
+    """
+
+    def __init__(self):
+        self.examples = {}
+        self.postings = defaultdict(set)
+
+    def add(self, example):
+        """
+        Add or replace an example; it becomes the most recent one.
+
+        :param example: A dict with "question", "sql", "seconds", "success" and "rows".
+        :return: None
+        """
+        key = (example["question"], example["sql"])
+        terms = question_terms(example["question"])
+
+        self.discard(key)
+        self.examples[key] = dict(example, terms=terms)
+        for term in terms:
+            self.postings[term].add(key)
+
+    def discard(self, key):
+        """
+        Remove an example if it is in the index.
+
+        :param key: The (question, sql) tuple of the example.
+        :return: None
+        """
+        example = self.examples.pop(key, None)
+        if example is None:
+            return
+
+        for term in example["terms"]:
+            keys = self.postings[term]
+            keys.discard(key)
+            if not keys:
+                del self.postings[term]
+
+    def trim(self, limit):
+        """
+        Remove the least recently added examples beyond `limit`.
+
+        :param limit: Number of examples kept.
+        :return: None
+        """
+        while len(self.examples) > limit:
+            self.discard(next(iter(self.examples)))
+
+    def search(self, question, k, accept, min_similarity=0.0):
+        """
+        Find the examples whose questions are most similar to a question.
+
+        :param question: The question to match.
+        :param k: Maximum number of examples.
+        :param accept: Callable (example) -> bool that filters the candidates.
+        :param min_similarity: Minimum cosine similarity of a returned example.
+        :return: A list of (similarity, example), most similar first; ties go to the
+                 faster query. Each SQL query appears once.
+        """
+        total = len(self.examples)
+
+        def idf(term):
+            return math.log(1 + total / len(self.postings[term]))
+
+        weights = {
+            term: idf(term)
+            for term in question_terms(question)
+            if term in self.postings
+        }
+        if not weights:
+            return []
+
+        scores = defaultdict(float)
+        for term, weight in weights.items():
+            for key in self.postings[term]:
+                scores[key] += weight * weight
+
+        query_norm = math.sqrt(sum(w * w for w in weights.values()))
+        ranked = []
+        for key, score in scores.items():
+            example = self.examples[key]
+            norm = math.sqrt(sum(idf(term) ** 2 for term in example["terms"]))
+            similarity = score / (query_norm * norm)
+
+            if similarity >= min_similarity:
+                ranked.append((similarity, example))
+
+        ranked.sort(key=lambda item: (-item[0], item[1]["seconds"]))
+
+        results, seen = [], set()
+        for similarity, example in ranked:
+            if example["sql"] in seen or not accept(example):
+                continue
+
+            seen.add(example["sql"])
+            results.append((similarity, example))
+            if len(results) >= k:
+                break
+
+        return results
+
+
+class ExampleStore:
+    """
+    Persistent store of generated questions and queries with their execution outcome.
+
+    Every executed query that a chatbot generated is recorded with its (reformulated)
+    question, execution time, success and row count in a SQLite file. Retrieval runs
+    against an `ExampleIndex` per database that is loaded on first use and kept up to
+    date as examples are recorded.
+    """
+
+    def __init__(self, path=example_store_path):
+        """
+        :param path: SQLite file, or ":memory:" for a store that is not persisted.
+        """
+        self.path = path
+
+        self._connection = None
+        self._indexes = {}
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        if self._connection is None:
+            self._connection = sqlite3.connect(self.path, check_same_thread=False)
+            self._connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS examples (
+                    database TEXT NOT NULL,
+                    question TEXT NOT NULL,
+                    sql TEXT NOT NULL,
+                    seconds REAL NOT NULL,
+                    success INTEGER NOT NULL,
+                    rows INTEGER,
+                    runs INTEGER NOT NULL DEFAULT 1,
+                    updated REAL NOT NULL,
+                    PRIMARY KEY (database, question, sql)
+                )
+                """
+            )
+            self._connection.commit()
+
+        return self._connection
+
+    def _index(self, database):
+        """Return the index of a database, loading it from SQLite on first use."""
+        if database not in self._indexes:
+            index = ExampleIndex()
+            rows = self._connect().execute(
+                "SELECT question, sql, seconds, success, rows FROM examples "
+                "WHERE database = ? ORDER BY updated DESC LIMIT ?",
+                (database, MAX_EXAMPLES_PER_DATABASE),
+            )
+            # Oldest first, so the index is in the order `trim` expects.
+            for question, sql, seconds, success, row_count in reversed(rows.fetchall()):
+                index.add(
+                    {
+                        "question": question,
+                        "sql": sql,
+                        "seconds": seconds,
+                        "success": bool(success),
+                        "rows": row_count,
+                    }
+                )
+            self._indexes[database] = index
+
+        return self._indexes[database]
+
+    def record(self, database, question, query, seconds, success, rows=None):
+        """
+        Record the outcome of executing a generated query. A query that was already
+        recorded for the same question keeps its latest outcome.
+
+        :param database: The key of the database (see `database_key`).
+        :param question: The question the query was generated for.
+        :param query: The executed SQL.
+        :param seconds: Execution time in seconds.
+        :param success: Whether the query ran without an error.
+        :param rows: Number of rows returned, if it succeeded.
+        :return: None
+        """
+        example = {
+            "question": question.strip(),
+            "sql": normalize_sql(query),
+            "seconds": seconds,
+            "success": bool(success),
+            "rows": rows,
+        }
+
+        with self._lock:
+            connection = self._connect()
+            connection.execute(
+                """
+                INSERT INTO examples (database, question, sql, seconds, success, rows, updated)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (database, question, sql) DO UPDATE SET
+                    seconds = excluded.seconds,
+                    success = excluded.success,
+                    rows = excluded.rows,
+                    runs = runs + 1,
+                    updated = excluded.updated
+                """,
+                (
+                    database,
+                    example["question"],
+                    example["sql"],
+                    seconds,
+                    int(bool(success)),
+                    rows,
+                    time.time(),
+                ),
+            )
+            connection.commit()
+
+            if database in self._indexes:
+                index = self._indexes[database]
+                index.add(example)
+                index.trim(MAX_EXAMPLES_PER_DATABASE)
+
+        examples_recorded.inc(success=str(bool(success)).lower())
+
+    def search(
+        self,
+        database,
+        question,
+        k=few_shot_examples,
+        catalog=None,
+        max_seconds=example_max_seconds,
+        min_similarity=example_min_similarity,
+    ):
+        """
+        Find the most similar successful, fast examples for a question.
+
+        :param database: The key of the database (see `database_key`).
+        :param question: The question to answer.
+        :param k: Maximum number of examples.
+        :param catalog: The database's table -> columns catalog; examples that reference
+                        tables or columns no longer in it are skipped.
+        :param max_seconds: Slowest execution time of a returned example.
+        :param min_similarity: Minimum similarity of a returned example.
+        :return: A list of example dicts, most similar first.
+        """
+        if k <= 0:
+            return []
+
+        def accept(example):
+            if not example["success"] or example["seconds"] > max_seconds:
+                return False
+
+            return not catalog or check_references(example["sql"], catalog) is None
+
+        with self._lock:
+            matches = self._index(database).search(question, k, accept, min_similarity)
+
+        return [example for _, example in matches]
+
+    def close(self):
+        """
+        Close the SQLite connection and drop the loaded indexes.
+
+        :return: None
+        """
+        with self._lock:
+            if self._connection is not None:
+                self._connection.close()
+                self._connection = None
+            self._indexes = {}
+
+
+def example_messages(examples):
+    """
+    Turn examples into question/answer message pairs in the format of the answer prompts.
+
+    :param examples: Example dicts from `ExampleStore.search`.
+    :return: A list of alternating HumanMessage and AIMessage.
+    """
+    messages = []
+    for example in examples:
+        messages.append(HumanMessage(content=f"Question: {example['question']}"))
+        messages.append(AIMessage(content=f"```sql\n{example['sql']};\n```"))
+
+    return messages
+
+
+_example_store = None
+
+
+def get_example_store():
+    """
+    Return the shared example store, or None when few-shot examples are disabled.
+
+    :return: An ExampleStore instance or None.
+    """
+    global _example_store
+
+    if few_shot_examples <= 0:
+        return None
+
+    if _example_store is None:
+        _example_store = ExampleStore()
+
+    return _example_store
@@ -0,0 +1,719 @@
+import re
+import json
+import math
+import time
+import random
+import asyncio
+import threading
+from typing import Any, List, Tuple
+from pydantic import PrivateAttr
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, HumanMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
+from chatbot.base_chatbot import BaseChatbot
+from chatbot.client_registry import ClientRegistry
+from chatbot.image_store import image_store
+from chatbot.prompt_cache import schema_fingerprint
+from chatbot.single_flight import chat_flights, history_digest
+from chatbot.sql_validator import SQLValidator, repair_answer, arepair_answer
+from database import PostgresqlDBConnector, estimate_tokens, token_budget_for
+from metrics import timed, atimed
+from config import (
+    system_prompt,
+    history_system_prompt,
+    sql_repair_prompt,
+    sql_validation_enabled,
+    max_repair_attempts,
+    fake_llm_latency,
+    fake_llm_token_delay_ms,
+    fake_llm_chunk_chars,
+    fake_llm_error_rate,
+    fake_llm_seed,
+    fake_llm_script,
+)
+
+# One line of the compact schema: "[view ]name(column type ..., ...) ~rows".
+SCHEMA_LINE = re.compile(r"^(?:view )?([A-Za-z_][\w$]*)\((.*)\)(?: ~\d+)?$")
+
+WORD = re.compile(r"[a-z0-9_]+")
+
+# The prompts of the Gemini chatbots, so the fake model sees the same messages.
+ANSWER_PROMPT = ChatPromptTemplate.from_messages(
+    [
+        ("system", system_prompt),
+        MessagesPlaceholder("chat_history"),
+        ("human", "Question: {question}"),
+    ]
+)
+
+HISTORY_PROMPT = ChatPromptTemplate.from_messages(
+    [
+        ("system", history_system_prompt),
+        MessagesPlaceholder("chat_history"),
+        ("human", "Question: {question}"),
+    ]
+)
+
+VISION_ANSWER_PROMPT = ChatPromptTemplate.from_messages(
+    [("system", system_prompt), MessagesPlaceholder("messages")]
+)
+
+VISION_HISTORY_PROMPT = ChatPromptTemplate.from_messages(
+    [
+        ("system", history_system_prompt),
+        MessagesPlaceholder("chat_history"),
+        ("human", "{question}"),
+    ]
+)
+
+
+def parse_latency(spec):
+    """
+    Parse a latency distribution.
+
+    :param spec: "fixed:MS", "uniform:MIN_MS-MAX_MS" or "lognormal:MEDIAN_MS,SIGMA".
+    :return: Callable (random.Random) -> latency in seconds.
+    :raises ValueError: If the specification is not understood.
+    """
+    kind, _, args = spec.partition(":")
+    kind = kind.strip().lower()
+
+    try:
+        if kind == "fixed":
+            value = float(args) / 1000
+            return lambda rng: value
+        if kind == "uniform":
+            low, high = (float(a) / 1000 for a in args.split("-", 1))
+            return lambda rng: rng.uniform(low, high)
+        if kind == "lognormal":
+            median, sigma = (float(a) for a in args.split(",", 1))
+            mu = math.log(median / 1000)
+            return lambda rng: rng.lognormvariate(mu, sigma)
+    except ValueError:
+        pass
+
+    raise ValueError(
+        f"Invalid latency distribution: {spec}, expected 'fixed:MS', "
+        f"'uniform:MIN-MAX' or 'lognormal:MEDIAN,SIGMA'."
+    )
+
+
+def load_script(path):
+    """
+    Load scripted answers from a JSON file.
+
+    :param path: Path to a JSON list of {"pattern": regex, "response": text} objects.
+    :return: A list of (pattern, response) tuples, or an empty list if path is None.
+    """
+    if not path:
+        return []
+
+    with open(path, "r", encoding="utf-8") as script_file:
+        return [
+            (entry["pattern"], entry["response"]) for entry in json.load(script_file)
+        ]
+
+
+def parse_schema(text):
+    """
+    Read table names and columns back from a compact schema rendering.
+
+    :param text: The schema as rendered by `SchemaRenderer`.
+    :return: A list of (table_name, [(column_name, column_type), ...]) in rendering order.
+    """
+    tables = []
+
+    for line in (text or "").splitlines():
+        match = SCHEMA_LINE.match(line.strip())
+        if not match:
+            continue
+
+        columns = []
+        for part in match.group(2).split(", "):
+            pieces = part.split(" ")
+            if len(pieces) >= 2 and not part.startswith(("+", "FK(")):
+                columns.append((pieces[0], pieces[1]))
+
+        tables.append((match.group(1), columns))
+
+    return tables
+
+
+def derive_sql(question, schema):
+    """
+    Build a plausible query for a question from the tables in the schema.
+
+    The table whose name shares the most words with the question is selected (the first
+    table on a tie); its plain columns and its geometry, as WKT, are returned.
+
+    :param question: The user's question.
+    :param schema: The schema text from the system prompt.
+    :return: A SQL query.
+    """
+    tables = parse_schema(schema)
+    if not tables:
+        return "SELECT 1 AS value;"
+
+    words = set(WORD.findall(question.lower()))
+
+    def score(table):
+        parts = set(WORD.findall(table[0].lower().replace("_", " ")))
+        return sum(
+            1
+            for part in parts
+            for word in words
+            if word == part or word.rstrip("s") == part.rstrip("s")
+        )
+
+    table_name, columns = max(tables, key=score)
+
+    plain = [name for name, data_type in columns if not data_type.startswith("geo")]
+    spatial = [name for name, data_type in columns if data_type.startswith("geo")]
+
+    select = [f"t.{name}" for name in plain[:5]]
+    if spatial:
+        select.append(f"ST_AsText(t.{spatial[0]}) AS geom")
+
+    return f"SELECT {', '.join(select) or 't.*'}\nFROM {table_name} t\nLIMIT 100;"
+
+
+def _text(content):
+    """Return the text of a message content; image parts of multimodal content are skipped."""
+    if isinstance(content, str):
+        return content
+
+    return "\n".join(
+        part if isinstance(part, str) else part.get("text", "")
+        for part in content
+        if isinstance(part, str) or part.get("type") == "text"
+    )
+
+
+class FakeLLMError(RuntimeError):
+    """Raised by the fake model to simulate a provider failure."""
+
+
+class FakeSQLChatModel(BaseChatModel):
+    """
+    Deterministic offline chat model that answers like the SQL chatbots' models.
+
+    Rephrase requests are answered with the question itself. Answer requests (those
+    whose system prompt carries a schema) get the first scripted response whose pattern
+    matches the question, or else a query derived from the schema. Answers only depend
+    on the prompt; latency and simulated failures are drawn from a generator seeded with
+    `seed` and the call number, so a run replays exactly.
+    """
+
+    model_name: str = "fake-sql"
+    latency: str = "fixed:0"
+    token_delay_ms: float = 0.0
+    chunk_chars: int = 8
+    error_rate: float = 0.0
+    seed: int = 0
+    script: List[Tuple[str, str]] = []
+
+    _calls: int = PrivateAttr(default=0)
+    _lock: Any = PrivateAttr(default_factory=threading.Lock)
+    _latency: Any = PrivateAttr(default=None)
+
+    def model_post_init(self, __context):
+        self._latency = parse_latency(self.latency)
+
+    @property
+    def _llm_type(self):
+        return "fake-sql"
+
+    @property
+    def _identifying_params(self):
+        return {"model_name": self.model_name, "latency": self.latency}
+
+    def _plan(self, messages):
+        """
+        Decide the answer and timing of a call.
+
+        :return: A tuple (text, first_token_delay_seconds, fails).
+        """
+        with self._lock:
+            call = self._calls
+            self._calls += 1
+
+        rng = random.Random(f"{self.seed}:{call}")
+        delay = self._latency(rng)
+        fails = rng.random() < self.error_rate
+
+        system = "\n".join(_text(m.content) for m in messages if m.type == "system")
+        question = _text(messages[-1].content) if messages else ""
+        question = question.removeprefix("Question:").strip()
+
+        if "Schema:" not in system:
+            return question, delay, fails
+
+        for pattern, response in self.script:
+            if re.search(pattern, question, re.IGNORECASE):
+                return response, delay, fails
+
+        return f"```sql\n{derive_sql(question, system)}\n```", delay, fails
+
+    def _message(self, messages, text):
+        prompt = "\n".join(_text(m.content) for m in messages)
+        input_tokens, output_tokens = estimate_tokens(prompt), estimate_tokens(text)
+
+        return AIMessage(
+            content=text,
+            usage_metadata={
+                "input_tokens": input_tokens,
+                "output_tokens": output_tokens,
+                "total_tokens": input_tokens + output_tokens,
+            },
+        )
+
+    def _chunks(self, text):
+        size = max(1, self.chunk_chars)
+        return [text[i : i + size] for i in range(0, len(text), size)]
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs):
+        text, delay, fails = self._plan(messages)
+        time.sleep(delay + len(self._chunks(text)) * self.token_delay_ms / 1000)
+
+        if fails:
+            raise FakeLLMError("Simulated model failure.")
+
+        return ChatResult(
+            generations=[ChatGeneration(message=self._message(messages, text))]
+        )
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        text, delay, fails = self._plan(messages)
+        await asyncio.sleep(
+            delay + len(self._chunks(text)) * self.token_delay_ms / 1000
+        )
+
+        if fails:
+            raise FakeLLMError("Simulated model failure.")
+
+        return ChatResult(
+            generations=[ChatGeneration(message=self._message(messages, text))]
+        )
+
+    def _stream(self, messages, stop=None, run_manager=None, **kwargs):
+        text, delay, fails = self._plan(messages)
+        time.sleep(delay)
+
+        if fails:
+            raise FakeLLMError("Simulated model failure.")
+
+        for chunk in self._chunks(text):
+            if run_manager:
+                run_manager.on_llm_new_token(chunk)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=chunk))
+            time.sleep(self.token_delay_ms / 1000)
+
+    async def _astream(self, messages, stop=None, run_manager=None, **kwargs):
+        text, delay, fails = self._plan(messages)
+        await asyncio.sleep(delay)
+
+        if fails:
+            raise FakeLLMError("Simulated model failure.")
+
+        for chunk in self._chunks(text):
+            if run_manager:
+                await run_manager.on_llm_new_token(chunk)
+            yield ChatGenerationChunk(message=AIMessageChunk(content=chunk))
+            await asyncio.sleep(self.token_delay_ms / 1000)
+
+
+class FakeTextChatbot(BaseChatbot):
+    """
+    The text chatbot pipeline (rephrase, answer, SQL validation and repair, coalescing,
+    metrics) on top of `FakeSQLChatModel`, so the server can be exercised and
+    benchmarked without Gemini or Ollama (or their SDKs installed).
+    """
+
+    provider = "fake"
+
+    def __init__(
+        self, database: PostgresqlDBConnector, model_name="fake-sql", temperature=0.8
+    ):
+        """
+        :param database: The session's database connector.
+        :param model_name: Name reported for the fake model (default is "fake-sql").
+        :param temperature: Only used to key shared clients; the fake model is deterministic.
+        """
+        self.database = database
+        self.model_name = model_name
+        self.temperature = temperature
+        self.schema_budget = token_budget_for(self.model_name)
+
+        self.model = ClientRegistry.get_client(
+            self.provider,
+            self.model_name,
+            self.temperature,
+            lambda: build_fake_model(self.model_name),
+        )
+
+        self.chat_history = []
+
+        self.validator = SQLValidator(database) if sql_validation_enabled else None
+
+        client_key = (self.provider, self.model_name, self.temperature)
+
+        self.rephrase_chain = ClientRegistry.get_chain(
+            client_key + ("text_rephrase",),
+            lambda: HISTORY_PROMPT | self.model | StrOutputParser(),
+        )
+        self.answer_chain = ClientRegistry.get_chain(
+            client_key + ("text_answer",),
+            lambda: ANSWER_PROMPT | self.model | StrOutputParser(),
+        )
+
+    def _repair_input(self, question, history, schema, previous_answer, error):
+        """Build the answer chain input that asks the model to fix an invalid query."""
+        return {
+            "question": sql_repair_prompt.format(error=error),
+            "chat_history": history
+            + [HumanMessage(content=question), AIMessage(content=previous_answer)],
+            "schema": schema,
+        }
+
+    def _answer(self, question, history, schema):
+        """
+        Generate the answer to a reformulated question and repair its SQL if it is invalid.
+
+        :param question: The reformulated question.
+        :param history: The conversation history.
+        :param schema: The rendered database schema.
+        :return: The final answer.
+        """
+        history = self.few_shot_messages(question) + history
+
+        answer = timed(
+            "answer_chain",
+            self.answer_chain.invoke,
+            {"question": question, "chat_history": history, "schema": schema},
+        )
+
+        return repair_answer(
+            self.validator,
+            answer,
+            lambda previous, error: timed(
+                "repair_chain",
+                self.answer_chain.invoke,
+                self._repair_input(question, history, schema, previous, error),
+            ),
+            max_repair_attempts,
+        )
+
+    async def _aanswer(self, question, history, schema):
+        """Asynchronous counterpart of `_answer`."""
+        history = await asyncio.to_thread(self.few_shot_messages, question) + history
+
+        answer = await atimed(
+            "answer_chain",
+            self.answer_chain.ainvoke,
+            {"question": question, "chat_history": history, "schema": schema},
+        )
+
+        return await arepair_answer(
+            self.validator,
+            answer,
+            lambda previous, error: atimed(
+                "repair_chain",
+                self.answer_chain.ainvoke,
+                self._repair_input(question, history, schema, previous, error),
+            ),
+            max_repair_attempts,
+        )
+
+    def chat(self, input):
+        """
+        Reformulate the question with the conversation history and answer it.
+
+        :param input: The raw question or message from the user.
+        :return: The fake model's answer.
+        """
+        schema = self.database.get_compact_schema(self.schema_budget)
+
+        history = list(self.get_history())
+        digest = history_digest(history)
+
+        reformulated_question = chat_flights.do(
+            self.coalesce_key("text_rephrase", input, digest),
+            lambda: timed(
+                "rephrase_chain",
+                self.rephrase_chain.invoke,
+                {"question": input, "chat_history": history},
+            ),
+        )
+
+        answer = chat_flights.do(
+            self.coalesce_key(
+                "text_answer", schema_fingerprint(schema), reformulated_question, digest
+            ),
+            lambda: self._answer(reformulated_question, history, schema),
+        )
+
+        self.save_history(reformulated_question, answer)
+
+        return answer
+
+    async def achat(self, input):
+        """
+        Asynchronous counterpart of `chat`.
+
+        :param input: The raw question or message from the user.
+        :return: The fake model's answer.
+        """
+        schema = await asyncio.to_thread(
+            self.database.get_compact_schema, self.schema_budget
+        )
+
+        # A snapshot: the chains must not see turns saved (or trimmed by the session
+        # manager) while they are still running.
+        history = list(self.get_history())
+        digest = history_digest(history)
+
+        reformulated_question = await chat_flights.ado(
+            self.coalesce_key("text_rephrase", input, digest),
+            lambda: atimed(
+                "rephrase_chain",
+                self.rephrase_chain.ainvoke,
+                {"question": input, "chat_history": history},
+            ),
+        )
+
+        answer = await chat_flights.ado(
+            self.coalesce_key(
+                "text_answer", schema_fingerprint(schema), reformulated_question, digest
+            ),
+            lambda: self._aanswer(reformulated_question, history, schema),
+        )
+
+        self.save_history(reformulated_question, answer)
+
+        return answer
+
+    def get_history(self):
+        """
+        :return: A list of LangChain message objects (HumanMessage and AIMessage).
+        """
+        return self.chat_history
+
+    def clear_history(self):
+        """
+        Clear all stored conversation history.
+
+        :return: None
+        """
+        self.chat_history = []
+
+    def save_history(self, question, answer):
+        """
+        Save a pair of user question and chatbot answer to the conversation history.
+
+        :param question: The user's question (possibly reformulated).
+        :param answer: The chatbot's generated response.
+        :return: None
+        """
+        self.chat_history.append(HumanMessage(content=question))
+        self.chat_history.append(AIMessage(content=answer))
+
+
+class FakeVisionChatbot(FakeTextChatbot):
+    """
+    The vision chatbot pipeline on top of `FakeSQLChatModel`. Images are stored and
+    normalized as usual; the fake model answers from the text of the question.
+    """
+
+    def __init__(
+        self, database: PostgresqlDBConnector, model_name="fake-sql", temperature=0.2
+    ):
+        """
+        :param database: The session's database connector.
+        :param model_name: Name reported for the fake model (default is "fake-sql").
+        :param temperature: Only used to key shared clients; the fake model is deterministic.
+        """
+        super().__init__(database, model_name, temperature=temperature)
+
+        client_key = (self.provider, self.model_name, self.temperature)
+
+        self.rephrase_chain = ClientRegistry.get_chain(
+            client_key + ("vision_rephrase",),
+            lambda: VISION_HISTORY_PROMPT | self.model | StrOutputParser(),
+        )
+        self.answer_chain = ClientRegistry.get_chain(
+            client_key + ("vision_answer",),
+            lambda: VISION_ANSWER_PROMPT | self.model | StrOutputParser(),
+        )
+
+    @staticmethod
+    def _messages(question, image_b64, mime_type, examples, history):
+        """:return: The answer chain's messages: examples, history and the question with its image."""
+        content = []
+        if image_b64:
+            content.append({"inlineData": {"mimeType": mime_type, "data": image_b64}})
+        content.append(f"Question: {question}")
+
+        return examples + history + [HumanMessage(content=content)]
+
+    def _vision_repair_input(self, messages, schema, previous_answer, error):
+        """Build the answer chain input that asks the model to fix an invalid query."""
+        return {
+            "messages": messages
+            + [
+                AIMessage(content=previous_answer),
+                HumanMessage(content=sql_repair_prompt.format(error=error)),
+            ],
+            "schema": schema,
+        }
+
+    def _vision_answer(self, messages, schema):
+        """Generate the answer for the multimodal messages and repair its SQL."""
+        answer = timed(
+            "answer_chain",
+            self.answer_chain.invoke,
+            {"messages": messages, "schema": schema},
+        )
+
+        return repair_answer(
+            self.validator,
+            answer,
+            lambda previous, error: timed(
+                "repair_chain",
+                self.answer_chain.invoke,
+                self._vision_repair_input(messages, schema, previous, error),
+            ),
+            max_repair_attempts,
+        )
+
+    async def _avision_answer(self, messages, schema):
+        """Asynchronous counterpart of `_vision_answer`."""
+        answer = await atimed(
+            "answer_chain",
+            self.answer_chain.ainvoke,
+            {"messages": messages, "schema": schema},
+        )
+
+        return await arepair_answer(
+            self.validator,
+            answer,
+            lambda previous, error: atimed(
+                "repair_chain",
+                self.answer_chain.ainvoke,
+                self._vision_repair_input(messages, schema, previous, error),
+            ),
+            max_repair_attempts,
+        )
+
+    def chat(self, input):
+        """
+        Answer a multimodal input like `GeminiVisionChatbot.chat`.
+
+        :param input: A dict containing 'query' (str) and either 'image' (base64 str or
+                      bytes) or 'image_id' (str, id of an image in the image store).
+        :return: The fake model's answer.
+        """
+        if input.get("image_id"):
+            image_b64, mime_type = image_store.prepare(input["image_id"])
+        elif input.get("image"):
+            image_b64, mime_type = image_store.prepare_input(input["image"])
+        else:
+            image_b64, mime_type = "", None
+
+        question = input.get("query", "")
+        history = list(self.get_history())
+        schema = self.database.get_compact_schema(self.schema_budget)
+
+        reformulated_question = chat_flights.do(
+            self.coalesce_key("vision_rephrase", question, history_digest(history)),
+            lambda: timed(
+                "rephrase_chain",
+                self.rephrase_chain.invoke,
+                {"question": question, "chat_history": history},
+            ),
+        )
+
+        messages = self._messages(
+            reformulated_question,
+            image_b64,
+            mime_type,
+            self.few_shot_messages(reformulated_question),
+            history,
+        )
+
+        answer = chat_flights.do(
+            self.coalesce_key(
+                "vision_answer", schema_fingerprint(schema), history_digest(messages)
+            ),
+            lambda: self._vision_answer(messages, schema),
+        )
+
+        self.save_history(reformulated_question, answer)
+
+        return answer
+
+    async def achat(self, input):
+        """
+        Asynchronous counterpart of `chat`.
+
+        :param input: A dict as for `chat`.
+        :return: The fake model's answer.
+        """
+        if input.get("image_id"):
+            image_b64, mime_type = await image_store.aprepare(input["image_id"])
+        elif input.get("image"):
+            image_b64, mime_type = await image_store.aprepare_input(input["image"])
+        else:
+            image_b64, mime_type = "", None
+
+        question = input.get("query", "")
+        # A snapshot: the chains must not see turns saved (or trimmed by the session
+        # manager) while they are still running.
+        history = list(self.get_history())
+        schema = await asyncio.to_thread(
+            self.database.get_compact_schema, self.schema_budget
+        )
+
+        reformulated_question = await chat_flights.ado(
+            self.coalesce_key("vision_rephrase", question, history_digest(history)),
+            lambda: atimed(
+                "rephrase_chain",
+                self.rephrase_chain.ainvoke,
+                {"question": question, "chat_history": history},
+            ),
+        )
+
+        examples = await asyncio.to_thread(
+            self.few_shot_messages, reformulated_question
+        )
+        messages = self._messages(
+            reformulated_question, image_b64, mime_type, examples, history
+        )
+
+        answer = await chat_flights.ado(
+            self.coalesce_key(
+                "vision_answer", schema_fingerprint(schema), history_digest(messages)
+            ),
+            lambda: self._avision_answer(messages, schema),
+        )
+
+        self.save_history(reformulated_question, answer)
+
+        return answer
+
+
+def build_fake_model(model_name):
+    """
+    :param model_name: Name reported by the model.
+    :return: A FakeSQLChatModel configured from the FAKE_LLM_* settings.
+    """
+    return FakeSQLChatModel(
+        model_name=model_name,
+        latency=fake_llm_latency,
+        token_delay_ms=fake_llm_token_delay_ms,
+        chunk_chars=fake_llm_chunk_chars,
+        error_rate=fake_llm_error_rate,
+        seed=fake_llm_seed,
+        script=load_script(fake_llm_script),
+    )
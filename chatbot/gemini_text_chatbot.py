@@ -1,11 +1,46 @@
+import asyncio
 from chatbot import BaseChatbot
-from database import PostgresqlDBConnector
-from config import system_prompt, history_system_prompt
+from database import PostgresqlDBConnector, token_budget_for
+from chatbot.client_registry import ClientRegistry
+from chatbot.sql_validator import SQLValidator, repair_answer, arepair_answer
+from chatbot.prompt_cache import get_gemini_prefix_cache, schema_fingerprint
+from chatbot.single_flight import chat_flights, history_digest
+from metrics import timed, atimed
+from config import (
+    system_prompt,
+    history_system_prompt,
+    sql_repair_prompt,
+    sql_validation_enabled,
+    max_repair_attempts,
+)
 from langchain_core.output_parsers import StrOutputParser
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.messages import HumanMessage, AIMessage
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 
+ANSWER_PROMPT = ChatPromptTemplate.from_messages(
+    [
+        ("system", system_prompt),
+        MessagesPlaceholder("chat_history"),
+        ("human", "Question: {question}"),
+    ]
+)
+
+CACHED_ANSWER_PROMPT = ChatPromptTemplate.from_messages(
+    [
+        MessagesPlaceholder("chat_history"),
+        ("human", "Question: {question}"),
+    ]
+)
+
+HISTORY_PROMPT = ChatPromptTemplate.from_messages(
+    [
+        ("system", history_system_prompt),
+        MessagesPlaceholder("chat_history"),
+        ("human", "Question: {question}"),
+    ]
+)
+
 
 class GeminiTextChatbot(BaseChatbot):
     """
@@ -16,67 +51,246 @@ class GeminiTextChatbot(BaseChatbot):
     This class handles natural language input, reformulates questions for
     better context understanding, and generates appropriate answers using
     the Gemini LLM.
+
+    The model client and the compiled chains are shared across sessions through
+    `ClientRegistry`; only the conversation history belongs to the instance.
     """
 
-    def __init__(self, database: PostgresqlDBConnector, model_name="gemini-2.5-pro"):
+    provider = "gemini"
+
+    def __init__(
+        self,
+        database: PostgresqlDBConnector,
+        model_name="gemini-2.5-pro",
+        prefix_cache=None,
+        temperature=0.8,
+    ):
         self.database = database
         self.model_name = model_name
+        self.temperature = temperature
+        self.schema_budget = token_budget_for(self.model_name)
+        self.prefix_cache = (
+            prefix_cache if prefix_cache is not None else get_gemini_prefix_cache()
+        )
+
+        self.model = ClientRegistry.get_client(
+            self.provider,
+            self.model_name,
+            self.temperature,
+            self._build_model,
+        )
+
+        self.chat_history = []
+
+        self.validator = SQLValidator(database) if sql_validation_enabled else None
+
+        self.answer_prompt = ANSWER_PROMPT
+        self.cached_answer_prompt = CACHED_ANSWER_PROMPT
+        self.history_prompt = HISTORY_PROMPT
+
+        client_key = (self.provider, self.model_name, self.temperature)
+
+        self.rephrase_chain = ClientRegistry.get_chain(
+            client_key + ("text_rephrase",),
+            lambda: self.history_prompt | self.model | StrOutputParser(),
+        )
+        self.answer_chain = ClientRegistry.get_chain(
+            client_key + ("text_answer",),
+            lambda: self.answer_prompt | self.model | StrOutputParser(),
+        )
+
+    def _build_model(self):
+        """
+        Construct the chat model client; called once per model configuration by `ClientRegistry`.
 
-        self.model = ChatGoogleGenerativeAI(
+        :return: A LangChain chat model.
+        """
+        return ChatGoogleGenerativeAI(
             model=self.model_name,
-            temperature=0.8,
+            temperature=self.temperature,
             max_tokens=None,
             timeout=None,
             max_retries=2,
         )
 
-        self.chat_history = []
+    def _get_answer_chain(self, schema):
+        """
+        Select the answer chain for the given schema.
 
-        self.answer_prompt = ChatPromptTemplate.from_messages(
-            [
-                ("system", system_prompt),
-                MessagesPlaceholder("chat_history"),
-                ("human", "Question: {question}"),
-            ]
+        When a provider-side context cache is available, the static prefix (system prompt + schema)
+        is referenced by its cache handle instead of being re-sent with every request.
+
+        :param schema: The rendered database schema.
+        :return: A runnable chain that produces the answer.
+        """
+        if self.prefix_cache is None:
+            return self.answer_chain
+
+        handle = self.prefix_cache.get_handle(
+            self.model_name, system_prompt.format(schema=schema)
         )
 
-        self.history_prompt = ChatPromptTemplate.from_messages(
-            [
-                ("system", history_system_prompt),
-                MessagesPlaceholder("chat_history"),
-                ("human", "Question: {question}"),
-            ]
+        if handle is None:
+            return self.answer_chain
+
+        return (
+            self.cached_answer_prompt
+            | self.model.bind(cached_content=handle)
+            | StrOutputParser()
         )
 
-        self.rephrase_chain = self.history_prompt | self.model | StrOutputParser()
-        self.answer_chain = self.answer_prompt | self.model | StrOutputParser()
+    def _repair_input(self, question, history, schema, previous_answer, error):
+        """
+        Build the answer chain input that asks the model to fix an invalid query.
 
-    def chat(self, input):
+        :param question: The reformulated question being answered.
+        :param history: The conversation history used for the original answer.
+        :param schema: The rendered database schema.
+        :param previous_answer: The answer whose SQL failed validation.
+        :param error: The validation or EXPLAIN error message.
+        :return: A dict of inputs for the answer chain.
         """
-        Process a user query, reformulate it for clarity and context,
-        query the database schema, and generate an intelligent answer.
+        return {
+            "question": sql_repair_prompt.format(error=error),
+            "chat_history": history
+            + [HumanMessage(content=question), AIMessage(content=previous_answer)],
+            "schema": schema,
+        }
 
-        :param input: The raw question or message from the user.
-        :return: The chatbot's final response after reasoning over the database schema and conversation context.
+    def _answer(self, question, history, schema):
         """
+        Generate the answer to a reformulated question and repair its SQL if it is invalid.
 
-        schema = self.database.get_schema()
+        :param question: The reformulated question.
+        :param history: The conversation history.
+        :param schema: The rendered database schema.
+        :return: The final answer.
+        """
+        # Recorded examples of similar questions go before the conversation.
+        history = self.few_shot_messages(question) + history
 
-        history = self.get_history()
+        answer_chain = self._get_answer_chain(schema)
 
-        reformulated_question = self.rephrase_chain.invoke(
+        answer = timed(
+            "answer_chain",
+            answer_chain.invoke,
             {
-                "question": input,
+                "question": question,
                 "chat_history": history,
-            }
+                "schema": schema,
+            },
+        )
+
+        return repair_answer(
+            self.validator,
+            answer,
+            lambda previous, error: timed(
+                "repair_chain",
+                answer_chain.invoke,
+                self._repair_input(question, history, schema, previous, error),
+            ),
+            max_repair_attempts,
         )
 
-        answer = self.answer_chain.invoke(
+    async def _aanswer(self, question, history, schema):
+        """Asynchronous counterpart of `_answer`."""
+        history = await asyncio.to_thread(self.few_shot_messages, question) + history
+
+        answer_chain = await asyncio.to_thread(self._get_answer_chain, schema)
+
+        answer = await atimed(
+            "answer_chain",
+            answer_chain.ainvoke,
             {
-                "question": reformulated_question,
+                "question": question,
                 "chat_history": history,
                 "schema": schema,
-            }
+            },
+        )
+
+        return await arepair_answer(
+            self.validator,
+            answer,
+            lambda previous, error: atimed(
+                "repair_chain",
+                answer_chain.ainvoke,
+                self._repair_input(question, history, schema, previous, error),
+            ),
+            max_repair_attempts,
+        )
+
+    def chat(self, input):
+        """
+        Process a user query, reformulate it for clarity and context,
+        query the database schema, and generate an intelligent answer.
+
+        :param input: The raw question or message from the user.
+        :return: The chatbot's final response after reasoning over the database schema and conversation context.
+        """
+
+        schema = self.database.get_compact_schema(self.schema_budget)
+
+        history = list(self.get_history())
+        digest = history_digest(history)
+
+        reformulated_question = chat_flights.do(
+            self.coalesce_key("text_rephrase", input, digest),
+            lambda: timed(
+                "rephrase_chain",
+                self.rephrase_chain.invoke,
+                {
+                    "question": input,
+                    "chat_history": history,
+                },
+            ),
+        )
+
+        answer = chat_flights.do(
+            self.coalesce_key(
+                "text_answer", schema_fingerprint(schema), reformulated_question, digest
+            ),
+            lambda: self._answer(reformulated_question, history, schema),
+        )
+
+        self.save_history(reformulated_question, answer)
+
+        return answer
+
+    async def achat(self, input):
+        """
+        Asynchronous counterpart of `chat` that awaits the model through `ainvoke`
+        and reads the schema in a worker thread, so the event loop stays free.
+
+        :param input: The raw question or message from the user.
+        :return: The chatbot's final response after reasoning over the database schema and conversation context.
+        """
+
+        schema = await asyncio.to_thread(
+            self.database.get_compact_schema, self.schema_budget
+        )
+
+        # A snapshot: the chains must not see turns saved (or trimmed by the session
+        # manager) while they are still running.
+        history = list(self.get_history())
+        digest = history_digest(history)
+
+        reformulated_question = await chat_flights.ado(
+            self.coalesce_key("text_rephrase", input, digest),
+            lambda: atimed(
+                "rephrase_chain",
+                self.rephrase_chain.ainvoke,
+                {
+                    "question": input,
+                    "chat_history": history,
+                },
+            ),
+        )
+
+        answer = await chat_flights.ado(
+            self.coalesce_key(
+                "text_answer", schema_fingerprint(schema), reformulated_question, digest
+            ),
+            lambda: self._aanswer(reformulated_question, history, schema),
         )
 
         self.save_history(reformulated_question, answer)
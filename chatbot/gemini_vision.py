@@ -1,18 +1,53 @@
 # from chatbot import BaseChatbot
 from chatbot.base_chatbot import BaseChatbot
-from database import PostgresqlDBConnector
+from database import PostgresqlDBConnector, token_budget_for
+from chatbot.client_registry import ClientRegistry
+from chatbot.sql_validator import SQLValidator, repair_answer, arepair_answer
+from chatbot.prompt_cache import get_gemini_prefix_cache, schema_fingerprint
+from chatbot.single_flight import chat_flights, history_digest
+from metrics import timed, atimed
+from chatbot.image_store import image_store
 from langchain_core.output_parsers import StrOutputParser
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_core.messages import HumanMessage, AIMessage, BaseMessage
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from config import history_system_prompt, system_prompt
-import base64
-import os
+from config import (
+    history_system_prompt,
+    system_prompt,
+    sql_repair_prompt,
+    sql_validation_enabled,
+    max_repair_attempts,
+)
+import asyncio
+
+HISTORY_PROMPT = ChatPromptTemplate.from_messages(
+    [
+        ("system", history_system_prompt),
+        MessagesPlaceholder("chat_history"),
+        ("human", "{question}"),
+    ]
+)
+
+ANSWER_PROMPT = ChatPromptTemplate.from_messages(
+    [("system", system_prompt), MessagesPlaceholder("messages")]
+)
+
+CACHED_ANSWER_PROMPT = ChatPromptTemplate.from_messages(
+    [MessagesPlaceholder("messages")]
+)
 
 
 class GeminiVisionChatbot(BaseChatbot):
 
-    def __init__(self, database: PostgresqlDBConnector, model_name="gemini-2.5-pro"):
+    provider = "gemini"
+
+    def __init__(
+        self,
+        database: PostgresqlDBConnector,
+        model_name="gemini-2.5-pro",
+        prefix_cache=None,
+        temperature=0.2,
+    ):
         """
         A self-contained class to handle multimodal input (image + text),
         generate SQL queries, and manage conversation history using LangChain.
@@ -20,32 +55,76 @@ class GeminiVisionChatbot(BaseChatbot):
         """
         self.database = database
         self.model_name = model_name
+        self.temperature = temperature
+        self.schema_budget = token_budget_for(self.model_name)
+        self.prefix_cache = (
+            prefix_cache if prefix_cache is not None else get_gemini_prefix_cache()
+        )
 
-        self.model = ChatGoogleGenerativeAI(model=self.model_name, temperature=0.2)
+        self.model = ClientRegistry.get_client(
+            self.provider,
+            self.model_name,
+            self.temperature,
+            self._build_model,
+        )
         self.chat_history: list[BaseMessage] = []
 
+        self.validator = SQLValidator(database) if sql_validation_enabled else None
+
         self._initialize_chains()
 
+    def _build_model(self):
+        """
+        Construct the chat model client; called once per model configuration by `ClientRegistry`.
+
+        :return: A LangChain chat model.
+        """
+        return ChatGoogleGenerativeAI(
+            model=self.model_name, temperature=self.temperature
+        )
+
     def _initialize_chains(self):
-        """Sets up the two-stage LangChain pipelines (rephrase and answer)."""
+        """Sets up the two-stage LangChain pipelines (rephrase and answer), shared across sessions."""
 
-        self.history_prompt = ChatPromptTemplate.from_messages(
-            [
-                ("system", history_system_prompt),
-                MessagesPlaceholder("chat_history"),
-                ("human", "{question}"),
-            ]
+        self.history_prompt = HISTORY_PROMPT
+        self.answer_prompt = ANSWER_PROMPT
+        self.cached_answer_prompt = CACHED_ANSWER_PROMPT
+
+        client_key = (self.provider, self.model_name, self.temperature)
+
+        self.rephrase_chain = ClientRegistry.get_chain(
+            client_key + ("vision_rephrase",),
+            lambda: self.history_prompt | self.model | StrOutputParser(),
         )
-        self.rephrase_chain = self.history_prompt | self.model | StrOutputParser()
 
-        self.answer_prompt = ChatPromptTemplate.from_messages(
-            [("system", system_prompt), MessagesPlaceholder("messages")]
+        self.answer_chain = ClientRegistry.get_chain(
+            client_key + ("vision_answer",),
+            lambda: self.answer_prompt | self.model | StrOutputParser(),
         )
 
-        self.answer_chain = self.answer_prompt | self.model | StrOutputParser()
+    def _get_answer_chain(self, schema):
+        """
+        Select the answer chain for the given schema, referencing the provider-side
+        context cache for the static prefix (system prompt + schema) when available.
+        """
+        if self.prefix_cache is None:
+            return self.answer_chain
+
+        handle = self.prefix_cache.get_handle(
+            self.model_name, system_prompt.format(schema=schema)
+        )
+
+        if handle is None:
+            return self.answer_chain
+
+        return (
+            self.cached_answer_prompt
+            | self.model.bind(cached_content=handle)
+            | StrOutputParser()
+        )
 
     def _create_multimodal_content(
-        self, text_query: str, image_b64: str
+        self, text_query: str, image_b64: str, mime_type: str = "image/png"
     ):  # Changed List[Union[str, Dict[str, Any]]]
         """Creates the list of content parts for a multimodal HumanMessage."""
         content = []
@@ -54,7 +133,7 @@ class GeminiVisionChatbot(BaseChatbot):
             content.append(
                 {
                     "inlineData": {
-                        "mimeType": "image/png",
+                        "mimeType": mime_type,
                         "data": image_b64,
                     }
                 }
@@ -64,57 +143,189 @@ class GeminiVisionChatbot(BaseChatbot):
 
         return content
 
-    def __image_to_base64(self, image_path: str) -> str:
+    def _answer(self, messages, schema):
         """
-        Reads an image file from a given path and returns its Base64 encoded string.
+        Generate the answer for the multimodal messages and repair its SQL if it is invalid.
+
+        :param messages: The history followed by the multimodal question.
+        :param schema: The rendered database schema.
+        :return: The final answer.
         """
-        if not os.path.exists(image_path):
-            print(f"Error: File not found at path: {image_path}")
-            return ""
+        answer_chain = self._get_answer_chain(schema)
 
-        with open(image_path, "rb") as image_file:
-            binary_data = image_file.read()
-            base64_encoded_data = base64.b64encode(binary_data)
-            base64_string = base64_encoded_data.decode("utf-8")
+        answer = timed(
+            "answer_chain",
+            answer_chain.invoke,
+            {"messages": messages, "schema": schema},
+        )
 
-            return base64_string
+        return repair_answer(
+            self.validator,
+            answer,
+            lambda previous, error: timed(
+                "repair_chain",
+                answer_chain.invoke,
+                self._repair_input(messages, schema, previous, error),
+            ),
+            max_repair_attempts,
+        )
+
+    async def _aanswer(self, messages, schema):
+        """Asynchronous counterpart of `_answer`."""
+        answer_chain = await asyncio.to_thread(self._get_answer_chain, schema)
+
+        answer = await atimed(
+            "answer_chain",
+            answer_chain.ainvoke,
+            {"messages": messages, "schema": schema},
+        )
+
+        return await arepair_answer(
+            self.validator,
+            answer,
+            lambda previous, error: atimed(
+                "repair_chain",
+                answer_chain.ainvoke,
+                self._repair_input(messages, schema, previous, error),
+            ),
+            max_repair_attempts,
+        )
+
+    def _repair_input(self, messages, schema, previous_answer, error):
+        """Build the answer chain input that asks the model to fix an invalid query."""
+        return {
+            "messages": messages
+            + [
+                AIMessage(content=previous_answer),
+                HumanMessage(content=sql_repair_prompt.format(error=error)),
+            ],
+            "schema": schema,
+        }
 
     def chat(self, input) -> str:
         """
         Process a multimodal user input (text + image), reformulate the question,
         query the database schema, and generate an intelligent answer.
 
-        :param input: A dict containing 'query' (str) and 'image' (str, path).
+        :param input: A dict containing 'query' (str) and either 'image' (base64 str or bytes)
+                      or 'image_id' (str, id of an image in the image store).
+        :return: The chatbot's final response after reasoning over the database schema and conversation context.
+        """
+        input_query = input.get("query", "")
+        image = input.get("image", "")
+        image_id = input.get("image_id")
+
+        if image_id:
+            uploaded_image_b64, mime_type = image_store.prepare(image_id)
+        elif image:
+            uploaded_image_b64, mime_type = image_store.prepare_input(image)
+        else:
+            uploaded_image_b64, mime_type = "", None
+
+        history = list(self.get_history())
+        schema = self.database.get_compact_schema(self.schema_budget)
+
+        reformulated_question = chat_flights.do(
+            self.coalesce_key("vision_rephrase", input_query, history_digest(history)),
+            lambda: timed(
+                "rephrase_chain",
+                self.rephrase_chain.invoke,
+                {
+                    "question": input_query,
+                    "chat_history": history,
+                },
+            ),
+        )
+
+        multimodal_content_parts = self._create_multimodal_content(
+            text_query=f"Question: {reformulated_question}",
+            image_b64=uploaded_image_b64,
+            mime_type=mime_type,
+        )
+
+        current_human_message = HumanMessage(content=multimodal_content_parts)
+
+        # Recorded examples of similar questions go before the conversation.
+        examples = self.few_shot_messages(reformulated_question)
+
+        final_messages_for_model = examples + history + [current_human_message]
+
+        # The digest covers the history, the reformulated question and the image.
+        answer = chat_flights.do(
+            self.coalesce_key(
+                "vision_answer",
+                schema_fingerprint(schema),
+                history_digest(final_messages_for_model),
+            ),
+            lambda: self._answer(final_messages_for_model, schema),
+        )
+
+        self.save_history(reformulated_question, answer)
+
+        return answer
+
+    async def achat(self, input) -> str:
+        """
+        Asynchronous counterpart of `chat`. The model is awaited through `ainvoke`;
+        the image is normalized in the image preprocessing pool and the schema is
+        read in a worker thread.
+
+        :param input: A dict containing 'query' (str) and either 'image' (base64 str or bytes)
+                      or 'image_id' (str, id of an image in the image store).
         :return: The chatbot's final response after reasoning over the database schema and conversation context.
         """
         input_query = input.get("query", "")
         image = input.get("image", "")
-        uploaded_image_b64 = self.__image_to_base64(image) if image else ""
+        image_id = input.get("image_id")
 
-        history = self.get_history()
-        schema = self.database.get_schema()
+        if image_id:
+            uploaded_image_b64, mime_type = await image_store.aprepare(image_id)
+        elif image:
+            uploaded_image_b64, mime_type = await image_store.aprepare_input(image)
+        else:
+            uploaded_image_b64, mime_type = "", None
 
-        reformulated_question = self.rephrase_chain.invoke(
-            {
-                "question": input_query,
-                "chat_history": history,
-            }
+        # A snapshot: the chains must not see turns saved (or trimmed by the session
+        # manager) while they are still running.
+        history = list(self.get_history())
+        schema = await asyncio.to_thread(
+            self.database.get_compact_schema, self.schema_budget
+        )
+
+        reformulated_question = await chat_flights.ado(
+            self.coalesce_key("vision_rephrase", input_query, history_digest(history)),
+            lambda: atimed(
+                "rephrase_chain",
+                self.rephrase_chain.ainvoke,
+                {
+                    "question": input_query,
+                    "chat_history": history,
+                },
+            ),
         )
 
         multimodal_content_parts = self._create_multimodal_content(
             text_query=f"Question: {reformulated_question}",
             image_b64=uploaded_image_b64,
+            mime_type=mime_type,
         )
 
         current_human_message = HumanMessage(content=multimodal_content_parts)
 
-        final_messages_for_model = history + [current_human_message]
+        examples = await asyncio.to_thread(
+            self.few_shot_messages, reformulated_question
+        )
+
+        final_messages_for_model = examples + history + [current_human_message]
 
-        answer = self.answer_chain.invoke(
-            {
-                "messages": final_messages_for_model,
-                "schema": schema,
-            }
+        # The digest covers the history, the reformulated question and the image.
+        answer = await chat_flights.ado(
+            self.coalesce_key(
+                "vision_answer",
+                schema_fingerprint(schema),
+                history_digest(final_messages_for_model),
+            ),
+            lambda: self._aanswer(final_messages_for_model, schema),
         )
 
         self.save_history(reformulated_question, answer)
@@ -0,0 +1,281 @@
+import time
+import asyncio
+import threading
+from collections import deque
+from chatbot.base_chatbot import BaseChatbot
+from chatbot.gemini_text_chatbot import GeminiTextChatbot
+from chatbot.ollama_text import OllamaTextChatbot
+from chatbot.sql_utils import extract_sql_query
+from database import PostgresqlDBConnector
+from langchain_core.messages import HumanMessage, AIMessage
+from metrics import registry, Counter
+from config import (
+    hedge_primary,
+    hedge_secondary_model,
+    hedge_percentile,
+    hedge_initial_delay,
+    hedge_min_delay,
+    hedge_window_size,
+    hedge_min_samples,
+)
+
+# Chatbot class and default model of each provider that can take part in a hedge.
+PROVIDERS = {
+    "gemini": (GeminiTextChatbot, "gemini-2.5-pro"),
+    "ollama": (OllamaTextChatbot, "llama3.1:8b"),
+}
+
+hedge_outcomes = registry.register(
+    Counter(
+        "spatialmind_hedged_chats_total",
+        "Hedged chat turns by the provider whose answer was used.",
+        ["winner", "hedged"],
+    )
+)
+
+
+class LatencyWindow:
+    """
+    Rolling window of the most recent chat latencies of one provider and model.
+    """
+
+    def __init__(self, size=hedge_window_size, min_samples=hedge_min_samples):
+        """
+        :param size: Number of latencies kept.
+        :param min_samples: Number of latencies needed before percentiles are reported.
+        """
+        self.min_samples = min_samples
+
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        """
+        Add a latency to the window.
+
+        :param seconds: The latency in seconds.
+        :return: None
+        """
+        with self._lock:
+            self._samples.append(seconds)
+
+    def percentile(self, q):
+        """
+        :param q: The percentile as a fraction (e.g., 0.95).
+        :return: The latency at that percentile, or None if the window has too few samples.
+        """
+        with self._lock:
+            if len(self._samples) < self.min_samples:
+                return None
+
+            samples = sorted(self._samples)
+
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+
+_windows = {}
+_windows_lock = threading.Lock()
+
+
+def get_latency_window(provider, model_name):
+    """
+    Return the latency window shared by every hedged session using a provider and model.
+
+    :param provider: Provider name.
+    :param model_name: Model name.
+    :return: A LatencyWindow.
+    """
+    with _windows_lock:
+        key = (provider, model_name)
+        if key not in _windows:
+            _windows[key] = LatencyWindow()
+
+        return _windows[key]
+
+
+def _has_sql(task):
+    """Return True if a finished chat task produced an answer containing a SQL block."""
+    if task.cancelled() or task.exception() is not None:
+        return False
+
+    answer = task.result()
+
+    return answer is not None and extract_sql_query(answer) is not None
+
+
+class HedgedTextChatbot(BaseChatbot):
+    """
+    A text chatbot that hedges a slow provider with a second one.
+
+    Each turn is sent to the primary provider (Gemini by default). If the primary has
+    not produced an answer with a SQL block by the configured percentile of its recent
+    latencies (or has failed), the same question is also sent to the secondary provider
+    (a local Ollama model by default). The first answer containing a SQL block is returned and the other
+    request is cancelled. Both providers continue from the winning history.
+    """
+
+    provider = "hedged"
+
+    def __init__(
+        self,
+        database: PostgresqlDBConnector,
+        model_name=None,
+        temperature=0.8,
+        primary=hedge_primary,
+        secondary_model_name=hedge_secondary_model,
+    ):
+        """
+        :param database: The session's database connector.
+        :param model_name: Model of the primary provider (defaults to the provider's default).
+        :param temperature: Sampling temperature for both providers.
+        :param primary: "gemini" or "ollama"; the other provider is the secondary.
+        :param secondary_model_name: Model of the secondary provider.
+        """
+        if primary not in PROVIDERS:
+            raise ValueError(
+                f"Unknown hedge primary: {primary}, the supported values are 'gemini', 'ollama'."
+            )
+
+        (secondary,) = [provider for provider in PROVIDERS if provider != primary]
+        primary_class, primary_default = PROVIDERS[primary]
+        secondary_class, secondary_default = PROVIDERS[secondary]
+
+        self.database = database
+        self.model_name = model_name or primary_default
+        self.temperature = temperature
+
+        self.primary = primary_class(database, self.model_name, temperature=temperature)
+        self.secondary = secondary_class(
+            database, secondary_model_name or secondary_default, temperature=temperature
+        )
+
+        self.latencies = get_latency_window(self.primary.provider, self.model_name)
+
+        self.chat_history = []
+
+    def hedge_delay(self):
+        """
+        :return: Seconds to wait for the primary before asking the secondary as well.
+        """
+        latency = self.latencies.percentile(hedge_percentile)
+
+        if latency is None:
+            return hedge_initial_delay
+
+        return max(hedge_min_delay, latency)
+
+    def chat(self, input):
+        """
+        Process a user query with hedging. Runs `achat` in a private event loop, so it
+        must not be called from a running event loop.
+
+        :param input: The raw question or message from the user.
+        :return: The first answer containing a SQL block.
+        """
+        return asyncio.run(self.achat(input))
+
+    async def achat(self, input):
+        """
+        Process a user query with the primary provider, hedging with the secondary
+        when the primary is slower than usual.
+
+        :param input: The raw question or message from the user.
+        :return: The first answer containing a SQL block, or the primary's answer if
+                 neither provider produced one.
+        """
+        for chatbot in (self.primary, self.secondary):
+            chatbot.chat_history = list(self.chat_history)
+            # A candidate spawned from this chatbot keeps its own coalesced model calls.
+            chatbot.sample = getattr(self, "sample", None)
+
+        started = time.monotonic()
+        primary_task = asyncio.create_task(self.primary.achat(input))
+        primary_task.add_done_callback(lambda task: self._record_latency(task, started))
+
+        tasks = {primary_task: self.primary}
+
+        try:
+            await asyncio.wait({primary_task}, timeout=self.hedge_delay())
+
+            # A primary that answered in time without SQL (e.g., a schema question) is kept.
+            if not primary_task.done() or primary_task.exception() is not None:
+                tasks[asyncio.create_task(self.secondary.achat(input))] = self.secondary
+
+            winner = await self._first_with_sql(list(tasks))
+        finally:
+            for task in tasks:
+                if not task.done():
+                    task.cancel()
+
+        chatbot = tasks[winner]
+        self.chat_history = list(chatbot.get_history())
+
+        hedge_outcomes.inc(winner=chatbot.provider, hedged=str(len(tasks) > 1).lower())
+
+        return winner.result()
+
+    async def _first_with_sql(self, tasks):
+        """
+        Wait until one of the chat tasks answers with a SQL block.
+
+        :param tasks: The running chat tasks, primary first.
+        :return: The first task that answered with a SQL block; if none did, the first
+                 task (in the given order) that finished without an error.
+        :raises Exception: The primary's error if every task failed.
+        """
+        pending = set(tasks)
+
+        while pending:
+            done, pending = await asyncio.wait(
+                pending, return_when=asyncio.FIRST_COMPLETED
+            )
+
+            for task in tasks:
+                if task in done and _has_sql(task):
+                    return task
+
+        for task in tasks:
+            if not task.cancelled() and task.exception() is None:
+                return task
+
+        return tasks[0].result()
+
+    def _record_latency(self, task, started):
+        """
+        Record how long the primary took. A cancelled primary is recorded with the time
+        it ran so far, a lower bound that keeps the window from only seeing fast turns.
+        """
+        if not task.cancelled() and task.exception() is not None:
+            return
+
+        self.latencies.record(time.monotonic() - started)
+
+    def get_history(self):
+        """
+        Retrieve the current conversation history between the user and the chatbot.
+
+        :return: A list of LangChain message objects (HumanMessage and AIMessage).
+        """
+
+        return self.chat_history
+
+    def clear_history(self):
+        """
+        Clear all stored conversation history.
+
+        :return: None
+        """
+
+        self.chat_history = []
+
+    def save_history(self, question, answer):
+        """
+        Save a pair of user question and chatbot answer to the conversation history.
+
+        :param question: The user's question (possibly reformulated).
+        :param answer: The chatbot's generated response.
+        :return: None
+        """
+
+        self.chat_history.append(HumanMessage(content=question))
+        self.chat_history.append(AIMessage(content=answer))
@@ -0,0 +1,165 @@
+import io
+import base64
+import asyncio
+import binascii
+from concurrent.futures import ThreadPoolExecutor
+from config import (
+    vision_max_image_side,
+    vision_jpeg_quality,
+    vision_preprocess_workers,
+)
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow is optional; images are then forwarded unchanged.
+    Image = None
+    ImageOps = None
+
+IMAGE_SIGNATURES = [
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+    (b"BM", "image/bmp"),
+    (b"II*\x00", "image/tiff"),
+    (b"MM\x00*", "image/tiff"),
+]
+
+# Formats the vision model accepts as-is; anything else is always re-encoded.
+MODEL_MIME_TYPES = {"image/png", "image/jpeg", "image/webp"}
+
+_executor = ThreadPoolExecutor(
+    max_workers=vision_preprocess_workers, thread_name_prefix="image-preprocess"
+)
+
+
+def sniff_mime_type(data):
+    """
+    Detect an image's format from its leading bytes.
+
+    :param data: Raw image bytes.
+    :return: The MIME type (e.g., "image/jpeg"), or None if the format is not recognized.
+    """
+    for signature, mime_type in IMAGE_SIGNATURES:
+        if data.startswith(signature):
+            return mime_type
+
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+
+    return None
+
+
+def decode_image_input(image):
+    """
+    Turn an image received by the API into raw bytes.
+
+    :param image: Raw bytes or a base64 string (optionally a data: URL). File paths are
+                  not accepted: the API must not read files from the server's disk.
+    :return: The raw image bytes.
+    :raises ValueError: If the input is not valid base64.
+    """
+    if isinstance(image, (bytes, bytearray)):
+        return bytes(image)
+
+    image = image.strip()
+
+    if image.startswith("data:") and "," in image:
+        image = image.split(",", 1)[1]
+
+    try:
+        return base64.b64decode(image, validate=True)
+    except (binascii.Error, ValueError):
+        raise ValueError("Image must be base64-encoded data.")
+
+
+def normalize_image(data, max_side=None, jpeg_quality=None):
+    """
+    Downsample and re-encode an image so it is no larger than the model needs.
+
+    Large images are shrunk to `max_side` pixels on their longest edge. Images with few
+    colors or transparency (diagrams, screenshots) are encoded as PNG, photos as JPEG.
+    The original bytes are kept when they are already small enough and smaller than the
+    re-encoded result.
+
+    :param data: Raw image bytes.
+    :param max_side: Longest edge in pixels (defaults to `vision_max_image_side`).
+    :param jpeg_quality: JPEG quality (defaults to `vision_jpeg_quality`).
+    :return: A tuple (image_bytes, mime_type).
+    """
+    max_side = max_side or vision_max_image_side
+    jpeg_quality = jpeg_quality or vision_jpeg_quality
+    mime_type = sniff_mime_type(data) or "image/png"
+
+    if Image is None:
+        return data, mime_type
+
+    image = Image.open(io.BytesIO(data))
+    resized = max(image.size) > max_side
+
+    # Let the JPEG decoder scale by powers of two while decoding, which is far cheaper
+    # than decoding a full-resolution photo and resizing it afterwards.
+    image.draft("RGB", (max_side, max_side))
+    image = ImageOps.exif_transpose(image)
+
+    if max(image.size) > max_side:
+        image.thumbnail((max_side, max_side), Image.LANCZOS)
+
+    has_alpha = image.mode in ("RGBA", "LA", "PA") or (
+        image.mode == "P" and "transparency" in image.info
+    )
+    few_colors = image.mode == "1" or image.getcolors(64) is not None
+
+    output = io.BytesIO()
+    if has_alpha or few_colors:
+        if image.mode not in ("1", "L", "P", "RGB", "RGBA"):
+            image = image.convert("RGBA" if has_alpha else "RGB")
+        image.save(output, format="PNG", optimize=True)
+        encoded_type = "image/png"
+    else:
+        if image.mode not in ("L", "RGB"):
+            image = image.convert("RGB")
+        image.save(output, format="JPEG", quality=jpeg_quality, optimize=True)
+        encoded_type = "image/jpeg"
+
+    encoded = output.getvalue()
+
+    if not resized and mime_type in MODEL_MIME_TYPES and len(data) <= len(encoded):
+        return data, mime_type
+
+    return encoded, encoded_type
+
+
+def prepare_image(image):
+    """
+    Decode, normalize and base64-encode an image for a multimodal message.
+
+    :param image: Raw bytes or a base64 string (see `decode_image_input`).
+    :return: A tuple (base64_string, mime_type).
+    """
+    data, mime_type = normalize_image(decode_image_input(image))
+
+    return base64.b64encode(data).decode("utf-8"), mime_type
+
+
+async def run_in_image_pool(func, *args):
+    """
+    Run a blocking image function in the image preprocessing worker pool.
+
+    :param func: The function to call.
+    :param args: Positional arguments for the function.
+    :return: The function's result.
+    """
+    loop = asyncio.get_running_loop()
+
+    return await loop.run_in_executor(_executor, func, *args)
+
+
+async def aprepare_image(image):
+    """
+    Run `prepare_image` in the image preprocessing worker pool, off the event loop.
+
+    :param image: Raw bytes or a base64 string.
+    :return: A tuple (base64_string, mime_type).
+    """
+    return await run_in_image_pool(prepare_image, image)
@@ -0,0 +1,171 @@
+import base64
+import hashlib
+import threading
+from collections import OrderedDict
+from config import image_store_max_bytes
+from chatbot.image_preprocessing import (
+    decode_image_input,
+    normalize_image,
+    run_in_image_pool,
+)
+
+
+class ImageStore:
+    """
+    Content-addressed, size-bounded in-memory store for uploaded images.
+
+    Images are keyed by the SHA-256 of their bytes, so uploading the same image twice
+    stores it once. Derived variants (e.g., the normalized image sent to the model) are
+    cached next to the original and evicted with it. When the total size exceeds
+    `max_bytes`, the least recently used images are evicted first.
+    """
+
+    def __init__(self, max_bytes=image_store_max_bytes):
+        """
+        :param max_bytes: Upper bound for the bytes held by originals and variants together.
+        """
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def image_id(data):
+        """
+        Compute the content address of an image.
+
+        :param data: Raw image bytes.
+        :return: The hex SHA-256 digest of the bytes.
+        """
+        return hashlib.sha256(data).hexdigest()
+
+    def put(self, data):
+        """
+        Store an image, or refresh its recency if it is already stored.
+
+        :param data: Raw image bytes.
+        :return: The image id.
+        """
+        image_id = self.image_id(data)
+
+        with self._lock:
+            if image_id in self._entries:
+                self._entries.move_to_end(image_id)
+                return image_id
+
+            self._entries[image_id] = {"data": data, "variants": {}, "size": len(data)}
+            self.total_bytes += len(data)
+            self._evict(keep=image_id)
+
+        return image_id
+
+    def get(self, image_id):
+        """
+        Return the original bytes of a stored image.
+
+        :param image_id: The image id returned by `put`.
+        :return: The image bytes, or None if the image is unknown or was evicted.
+        """
+        with self._lock:
+            entry = self._entries.get(image_id)
+            if entry is None:
+                return None
+
+            self._entries.move_to_end(image_id)
+            return entry["data"]
+
+    def __contains__(self, image_id):
+        with self._lock:
+            return image_id in self._entries
+
+    def get_variant(self, image_id, name, builder):
+        """
+        Return a derived variant of a stored image, building and caching it on first use.
+
+        :param image_id: The image id.
+        :param name: Name of the variant (e.g., "model").
+        :param builder: Callable (image_bytes) -> (variant, size_in_bytes).
+        :return: The cached variant.
+        :raises KeyError: If the image is unknown or was evicted.
+        """
+        data = self.get(image_id)
+        if data is None:
+            raise KeyError(image_id)
+
+        with self._lock:
+            entry = self._entries.get(image_id)
+            if entry is not None and name in entry["variants"]:
+                return entry["variants"][name]
+
+        variant, size = builder(data)
+
+        with self._lock:
+            entry = self._entries.get(image_id)
+            if entry is not None and name not in entry["variants"]:
+                entry["variants"][name] = variant
+                entry["size"] += size
+                self.total_bytes += size
+                self._evict(keep=image_id)
+
+        return variant
+
+    def prepare(self, image_id):
+        """
+        Return the normalized, base64-encoded version of a stored image for the model.
+
+        :param image_id: The image id.
+        :return: A tuple (base64_string, mime_type).
+        :raises KeyError: If the image is unknown or was evicted.
+        """
+        return self.get_variant(image_id, "model", _build_model_variant)
+
+    def prepare_input(self, image):
+        """
+        Store an image received inline and return its normalized model variant.
+
+        :param image: Raw bytes or a base64 string (see `decode_image_input`).
+        :return: A tuple (base64_string, mime_type).
+        """
+        return self.prepare(self.put(decode_image_input(image)))
+
+    async def aprepare(self, image_id):
+        """Run `prepare` in the image preprocessing worker pool."""
+        return await run_in_image_pool(self.prepare, image_id)
+
+    async def aprepare_input(self, image):
+        """Run `prepare_input` in the image preprocessing worker pool."""
+        return await run_in_image_pool(self.prepare_input, image)
+
+    def stats(self):
+        """
+        :return: A dict with the number of stored images and the bytes they use.
+        """
+        with self._lock:
+            return {
+                "images": len(self._entries),
+                "bytes": self.total_bytes,
+                "max_bytes": self.max_bytes,
+            }
+
+    def _evict(self, keep=None):
+        """Evict least recently used images until the store fits in `max_bytes`."""
+        while self.total_bytes > self.max_bytes and len(self._entries) > 1:
+            image_id, entry = next(iter(self._entries.items()))
+            if image_id == keep:
+                self._entries.move_to_end(image_id)
+                continue
+
+            del self._entries[image_id]
+            self.total_bytes -= entry["size"]
+
+
+def _build_model_variant(data):
+    """Normalize an image for the model and return it with its size in bytes."""
+    normalized, mime_type = normalize_image(data)
+    encoded = base64.b64encode(normalized).decode("utf-8")
+
+    return (encoded, mime_type), len(encoded)
+
+
+image_store = ImageStore()
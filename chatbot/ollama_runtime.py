@@ -0,0 +1,94 @@
+import os
+import asyncio
+import threading
+from chatbot.concurrency import ConcurrencyGate
+from config import ollama_host, ollama_keep_alive, ollama_max_concurrency
+
+_gates = {}
+_gates_lock = threading.Lock()
+
+
+def default_concurrency():
+    """
+    Size the per-model concurrency limit to the host.
+
+    Every parallel request on a local model costs roughly a few CPU cores and a context
+    worth of KV cache, so the limit follows the smaller of cores / 4 and RAM / 16 GB,
+    between 1 and 4. `OLLAMA_MAX_CONCURRENCY` overrides it.
+
+    :return: The number of concurrent requests allowed per model.
+    """
+    if ollama_max_concurrency:
+        return ollama_max_concurrency
+
+    cpus = os.cpu_count() or 1
+
+    try:
+        ram_gb = os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES") / 1024**3
+    except (ValueError, OSError, AttributeError):
+        ram_gb = 16
+
+    return max(1, min(4, cpus // 4, int(ram_gb // 16)))
+
+
+def get_model_gate(model_name):
+    """
+    Return the concurrency gate for a local Ollama model.
+
+    :param model_name: The Ollama model name.
+    :return: The shared ConcurrencyGate for the model.
+    """
+    with _gates_lock:
+        if model_name not in _gates:
+            _gates[model_name] = ConcurrencyGate(
+                f"ollama:{model_name}", default_concurrency()
+            )
+
+        return _gates[model_name]
+
+
+def gate_stats():
+    """
+    :return: A dict mapping each Ollama model to its queue depth and wait statistics.
+    """
+    with _gates_lock:
+        gates = dict(_gates)
+
+    return {model_name: gate.stats() for model_name, gate in gates.items()}
+
+
+async def awarm_up_models(model_names):
+    """
+    Load Ollama models into memory and keep them resident.
+
+    An empty generate request makes the daemon load the model without producing tokens;
+    `keep_alive` then keeps it loaded between requests.
+
+    :param model_names: The models to preload.
+    :return: A dict mapping each model name to True if it was loaded, False otherwise.
+    """
+    if not model_names:
+        return {}
+
+    from ollama import AsyncClient
+
+    client = AsyncClient(host=ollama_host)
+    loaded = {}
+
+    for model_name in model_names:
+        try:
+            await client.generate(
+                model=model_name, prompt="", keep_alive=ollama_keep_alive
+            )
+            loaded[model_name] = True
+            print(f"Ollama model {model_name} loaded (keep_alive={ollama_keep_alive}).")
+        except Exception as e:
+            loaded[model_name] = False
+            print(f"Failed to preload Ollama model {model_name}: {e}")
+
+    return loaded
+
+
+def warm_up_models(model_names):
+    """Synchronous wrapper around `awarm_up_models`."""
+    return asyncio.run(awarm_up_models(model_names))
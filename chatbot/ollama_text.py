@@ -1,11 +1,43 @@
+import asyncio
 from chatbot import BaseChatbot
 from langchain_ollama import ChatOllama
-from database import PostgresqlDBConnector
-from config import ollama_system_prompt, history_system_prompt
+from database import PostgresqlDBConnector, token_budget_for
+from chatbot.client_registry import ClientRegistry
+from chatbot.ollama_runtime import get_model_gate
+from chatbot.prompt_cache import schema_fingerprint
+from chatbot.single_flight import chat_flights, history_digest
+from metrics import timed, atimed
+from chatbot.sql_validator import SQLValidator, repair_answer, arepair_answer
+from config import (
+    ollama_system_prompt,
+    history_system_prompt,
+    sql_repair_prompt,
+    sql_validation_enabled,
+    max_repair_attempts,
+    ollama_host,
+    ollama_keep_alive,
+    ollama_schema_token_budget,
+)
 from langchain_core.output_parsers import StrOutputParser
 from langchain_core.messages import HumanMessage, AIMessage
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
 
+ANSWER_PROMPT = ChatPromptTemplate.from_messages(
+    [
+        ("system", ollama_system_prompt),
+        MessagesPlaceholder("chat_history"),
+        ("human", "Question: {question}"),
+    ]
+)
+
+HISTORY_PROMPT = ChatPromptTemplate.from_messages(
+    [
+        ("system", history_system_prompt),
+        MessagesPlaceholder("chat_history"),
+        ("human", "Question: {question}"),
+    ]
+)
+
 
 class OllamaTextChatbot(BaseChatbot):
     """
@@ -17,41 +49,144 @@ class OllamaTextChatbot(BaseChatbot):
     the Ollama LLM.
     """
 
-    def __init__(self, database: PostgresqlDBConnector, model_name="llama3.1:8b"):
+    provider = "ollama"
+
+    def __init__(
+        self, database: PostgresqlDBConnector, model_name="llama3.1:8b", temperature=0.8
+    ):
         """
         Initialize the OllamaTextChatbot with a database connector and model name.
+        The Ollama client and compiled chains are shared across sessions through `ClientRegistry`.
         :param database: An instance of PostgresqlDBConnector for database interactions.
         :param model_name: The name of the Ollama model to use (default is "llama3.1:8b").
+        :param temperature: Sampling temperature for the model (default is 0.8).
         """
 
         self.database = database
         self.model_name = model_name
+        self.temperature = temperature
+        self.schema_budget = token_budget_for(
+            self.model_name, default=ollama_schema_token_budget
+        )
 
-        self.model = ChatOllama(
-            model=self.model_name,
-            temperature=0.8,
+        self.model = ClientRegistry.get_client(
+            self.provider,
+            self.model_name,
+            self.temperature,
+            lambda: ChatOllama(
+                model=self.model_name,
+                temperature=self.temperature,
+                base_url=ollama_host,
+                keep_alive=ollama_keep_alive,
+            ),
         )
 
+        # One local daemon serves every session, so calls to a model are queued per model.
+        self.gate = get_model_gate(self.model_name)
+
         self.chat_history = []
 
-        self.answer_prompt = ChatPromptTemplate.from_messages(
-            [
-                ("system", ollama_system_prompt),
-                MessagesPlaceholder("chat_history"),
-                ("human", "Question: {question}"),
-            ]
+        self.validator = SQLValidator(database) if sql_validation_enabled else None
+
+        self.answer_prompt = ANSWER_PROMPT
+        self.history_prompt = HISTORY_PROMPT
+
+        client_key = (self.provider, self.model_name, self.temperature)
+
+        self.rephrase_chain = ClientRegistry.get_chain(
+            client_key + ("text_rephrase",),
+            lambda: self.history_prompt | self.model | StrOutputParser(),
+        )
+        self.answer_chain = ClientRegistry.get_chain(
+            client_key + ("text_answer",),
+            lambda: self.answer_prompt | self.model | StrOutputParser(),
         )
 
-        self.history_prompt = ChatPromptTemplate.from_messages(
-            [
-                ("system", history_system_prompt),
-                MessagesPlaceholder("chat_history"),
-                ("human", "Question: {question}"),
-            ]
+    def _invoke(self, stage, chain, inputs):
+        """Invoke a chain while holding a slot of the model's concurrency gate."""
+        with self.gate.slot():
+            return timed(stage, chain.invoke, inputs)
+
+    async def _ainvoke(self, stage, chain, inputs):
+        """Await a chain while holding a slot of the model's concurrency gate."""
+        async with self.gate.aslot():
+            return await atimed(stage, chain.ainvoke, inputs)
+
+    def _repair_input(self, question, history, schema, previous_answer, error):
+        """
+        Build the answer chain input that asks the model to fix an invalid query.
+
+        :param question: The reformulated question being answered.
+        :param history: The conversation history used for the original answer.
+        :param schema: The rendered database schema.
+        :param previous_answer: The answer whose SQL failed validation.
+        :param error: The validation or EXPLAIN error message.
+        :return: A dict of inputs for the answer chain.
+        """
+        return {
+            "question": sql_repair_prompt.format(error=error),
+            "chat_history": history
+            + [HumanMessage(content=question), AIMessage(content=previous_answer)],
+            "schema": schema,
+        }
+
+    def _answer(self, question, history, schema):
+        """
+        Generate the answer to a reformulated question and repair its SQL if it is invalid.
+
+        :param question: The reformulated question.
+        :param history: The conversation history.
+        :param schema: The rendered database schema.
+        :return: The final answer.
+        """
+        # Recorded examples of similar questions go before the conversation.
+        history = self.few_shot_messages(question) + history
+
+        answer = self._invoke(
+            "answer_chain",
+            self.answer_chain,
+            {
+                "question": question,
+                "chat_history": history,
+                "schema": schema,
+            },
+        )
+
+        return repair_answer(
+            self.validator,
+            answer,
+            lambda previous, error: self._invoke(
+                "repair_chain",
+                self.answer_chain,
+                self._repair_input(question, history, schema, previous, error),
+            ),
+            max_repair_attempts,
         )
 
-        self.rephrase_chain = self.history_prompt | self.model | StrOutputParser()
-        self.answer_chain = self.answer_prompt | self.model | StrOutputParser()
+    async def _aanswer(self, question, history, schema):
+        """Asynchronous counterpart of `_answer`."""
+        history = await asyncio.to_thread(self.few_shot_messages, question) + history
+
+        answer = await self._ainvoke(
+            "answer_chain",
+            self.answer_chain,
+            {
+                "question": question,
+                "chat_history": history,
+                "schema": schema,
+            },
+        )
+
+        return await arepair_answer(
+            self.validator,
+            answer,
+            lambda previous, error: self._ainvoke(
+                "repair_chain",
+                self.answer_chain,
+                self._repair_input(question, history, schema, previous, error),
+            ),
+            max_repair_attempts,
+        )
 
     def chat(self, input):
         """
@@ -62,23 +197,69 @@ class OllamaTextChatbot(BaseChatbot):
         :return: The chatbot's final response after reasoning over the database schema and conversation context.
         """
 
-        schema = self.database.get_schema(short=True)
+        schema = self.database.get_compact_schema(self.schema_budget)
 
-        history = self.get_history()
+        history = list(self.get_history())
+        digest = history_digest(history)
 
-        reformulated_question = self.rephrase_chain.invoke(
-            {
-                "question": input,
-                "chat_history": history,
-            }
+        reformulated_question = chat_flights.do(
+            self.coalesce_key("text_rephrase", input, digest),
+            lambda: self._invoke(
+                "rephrase_chain",
+                self.rephrase_chain,
+                {
+                    "question": input,
+                    "chat_history": history,
+                },
+            ),
         )
 
-        answer = self.answer_chain.invoke(
-            {
-                "question": reformulated_question,
-                "chat_history": history,
-                "schema": schema,
-            }
+        answer = chat_flights.do(
+            self.coalesce_key(
+                "text_answer", schema_fingerprint(schema), reformulated_question, digest
+            ),
+            lambda: self._answer(reformulated_question, history, schema),
+        )
+
+        self.save_history(reformulated_question, answer)
+
+        return answer
+
+    async def achat(self, input):
+        """
+        Asynchronous counterpart of `chat` that awaits the model through `ainvoke`
+        and reads the schema in a worker thread, so the event loop stays free.
+
+        :param input: The raw question or message from the user.
+        :return: The chatbot's final response after reasoning over the database schema and conversation context.
+        """
+
+        schema = await asyncio.to_thread(
+            self.database.get_compact_schema, self.schema_budget
+        )
+
+        # A snapshot: the chains must not see turns saved (or trimmed by the session
+        # manager) while they are still running.
+        history = list(self.get_history())
+        digest = history_digest(history)
+
+        reformulated_question = await chat_flights.ado(
+            self.coalesce_key("text_rephrase", input, digest),
+            lambda: self._ainvoke(
+                "rephrase_chain",
+                self.rephrase_chain,
+                {
+                    "question": input,
+                    "chat_history": history,
+                },
+            ),
+        )
+
+        answer = await chat_flights.ado(
+            self.coalesce_key(
+                "text_answer", schema_fingerprint(schema), reformulated_question, digest
+            ),
+            lambda: self._aanswer(reformulated_question, history, schema),
         )
 
         self.save_history(reformulated_question, answer)
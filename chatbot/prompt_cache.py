@@ -0,0 +1,183 @@
+import time
+import hashlib
+import threading
+from concurrent.futures import Future
+from abc import ABC, abstractmethod
+from config import gemini_context_cache_enabled, gemini_context_cache_ttl
+
+
+def schema_fingerprint(schema):
+    """
+    Compute a stable fingerprint of a rendered schema or prompt prefix.
+
+    :param schema: The rendered schema (or full static prompt prefix) as a string.
+    :return: A hex digest that only changes when the content changes.
+    """
+    return hashlib.sha256((schema or "").encode("utf-8")).hexdigest()
+
+
+class BaseContextCacheProvider(ABC):
+    """
+    Abstract interface for provider-side context caches.
+
+    A provider stores a static prompt prefix on the model provider's side and
+    returns a handle that later requests can reference instead of re-sending the prefix.
+    """
+
+    @abstractmethod
+    def create(self, model_name, system_instruction, ttl_seconds):
+        """
+        Store a system instruction in the provider's context cache.
+
+        :param model_name: The model the cached content is bound to.
+        :param system_instruction: The static prompt prefix to cache.
+        :param ttl_seconds: How long the provider should keep the cached content.
+        :return: An opaque handle that identifies the cached content.
+        """
+        pass
+
+
+class GeminiContextCacheProvider(BaseContextCacheProvider):
+    """
+    Context cache provider backed by the Gemini explicit caching API.
+    """
+
+    def __init__(self):
+        self._client = None
+
+    def _get_client(self):
+        if self._client is None:
+            from google import genai
+
+            self._client = genai.Client()
+
+        return self._client
+
+    def create(self, model_name, system_instruction, ttl_seconds):
+        """
+        Create a Gemini cached content entry for the given system instruction.
+
+        :param model_name: The Gemini model name (e.g., "gemini-2.5-pro").
+        :param system_instruction: The static prompt prefix to cache.
+        :param ttl_seconds: Lifetime of the cached content in seconds.
+        :return: The cached content name (e.g., "cachedContents/...").
+        """
+        from google.genai import types
+
+        cache = self._get_client().caches.create(
+            model=model_name,
+            config=types.CreateCachedContentConfig(
+                display_name=f"spatialmind-{schema_fingerprint(system_instruction)[:16]}",
+                system_instruction=system_instruction,
+                ttl=f"{int(ttl_seconds)}s",
+            ),
+        )
+
+        return cache.name
+
+
+class PromptPrefixCache:
+    """
+    Process-wide registry of provider cache handles keyed by model and prefix fingerprint.
+
+    Sessions on the same database render the same schema, so they share one handle.
+    Handles are renewed shortly before the provider-side TTL expires, and a failed
+    creation (unsupported model, prefix below the provider's minimum size, missing SDK)
+    is remembered for `retry_after` seconds so the chat path falls back to sending the
+    prefix inline without paying for a failing call on every turn.
+
+    Handles are created outside the registry lock, one creation per key at a time:
+    concurrent callers for the same prefix wait for that creation (single flight), and
+    callers for other prefixes are not held up by it.
+    """
+
+    def __init__(
+        self, provider: BaseContextCacheProvider, ttl_seconds=3600, retry_after=300
+    ):
+        """
+        :param provider: The context cache provider used to create handles.
+        :param ttl_seconds: Lifetime requested for each cached content entry.
+        :param retry_after: Seconds to wait before retrying after a failed creation.
+        """
+        self.provider = provider
+        self.ttl_seconds = ttl_seconds
+        self.retry_after = retry_after
+
+        self.hits = 0
+        self.misses = 0
+
+        self._entries = {}
+        self._flights = {}
+        self._lock = threading.Lock()
+
+    def get_handle(self, model_name, prefix):
+        """
+        Return the cached content handle for a prompt prefix, creating it if needed.
+
+        :param model_name: The model the prefix will be sent to.
+        :param prefix: The fully rendered static prompt prefix (system prompt + schema).
+        :return: The provider handle, or None if the prefix must be sent inline.
+        """
+        key = (model_name, schema_fingerprint(prefix))
+
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is not None and entry[1] > time.monotonic():
+                if entry[0] is not None:
+                    self.hits += 1
+                return entry[0]
+
+            flight = self._flights.get(key)
+            if flight is None:
+                flight = self._flights[key] = Future()
+                self.misses += 1
+                leader = True
+            else:
+                leader = False
+
+        if not leader:
+            handle = flight.result()
+            if handle is not None:
+                with self._lock:
+                    self.hits += 1
+            return handle
+
+        handle = None
+        expires_at = time.monotonic() + self.retry_after
+        try:
+            handle = self.provider.create(model_name, prefix, self.ttl_seconds)
+            expires_at = time.monotonic() + max(
+                self.ttl_seconds - 60, self.ttl_seconds / 2
+            )
+        except Exception as e:
+            print(f"Context cache unavailable for {model_name}: {e}")
+        finally:
+            with self._lock:
+                self._entries[key] = (handle, expires_at)
+                del self._flights[key]
+            flight.set_result(handle)
+
+        return handle
+
+
+_gemini_prefix_cache = None
+
+
+def get_gemini_prefix_cache():
+    """
+    Return the shared Gemini prompt prefix cache, or None when context caching is disabled.
+
+    :return: A PromptPrefixCache instance or None.
+    """
+    global _gemini_prefix_cache
+
+    if not gemini_context_cache_enabled:
+        return None
+
+    if _gemini_prefix_cache is None:
+        _gemini_prefix_cache = PromptPrefixCache(
+            GeminiContextCacheProvider(), ttl_seconds=gemini_context_cache_ttl
+        )
+
+    return _gemini_prefix_cache
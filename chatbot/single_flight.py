@@ -0,0 +1,151 @@
+import asyncio
+import hashlib
+import threading
+from concurrent.futures import Future
+from config import request_coalescing_enabled
+
+
+def history_digest(messages):
+    """
+    Compute a digest of a list of chat messages.
+
+    :param messages: LangChain messages; multimodal content lists are included as well.
+    :return: A hex digest that changes whenever a message type or content changes.
+    """
+    digest = hashlib.sha256()
+
+    for message in messages:
+        digest.update(message.type.encode("utf-8"))
+        digest.update(b"\x00")
+        digest.update(repr(message.content).encode("utf-8"))
+        digest.update(b"\x00")
+
+    return digest.hexdigest()
+
+
+class SingleFlight:
+    """
+    Deduplicates identical calls that are in flight at the same time.
+
+    The first caller for a key runs the call; callers that arrive with the same key
+    while it is still running wait for that call and receive the same result (or
+    exception). Nothing is cached once the call has finished, so a later request with
+    the same key makes a fresh call.
+
+    Threads share calls through `do`, coroutines through `ado`. A coroutine that is
+    cancelled while waiting does not cancel the shared call for the other waiters; the
+    call is only cancelled once every waiter has been cancelled.
+    """
+
+    def __init__(self, enabled=True):
+        """
+        :param enabled: When False, every call runs on its own.
+        """
+        self.enabled = enabled
+
+        self.calls = 0
+        self.shared = 0
+
+        self._calls = {}
+        self._acalls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, func):
+        """
+        Run `func`, or wait for the identical call already in flight.
+
+        :param key: Hashable key identifying the call.
+        :param func: Zero-argument callable that makes the call.
+        :return: The result of the shared call.
+        """
+        if not self.enabled:
+            return func()
+
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+
+            if leader:
+                future = Future()
+                self._calls[key] = future
+                self.calls += 1
+            else:
+                self.shared += 1
+
+        if not leader:
+            return future.result()
+
+        try:
+            result = func()
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._lock:
+                self._calls.pop(key, None)
+
+    async def ado(self, key, func):
+        """
+        Await `func()`, or wait for the identical call already in flight on this event loop.
+
+        :param key: Hashable key identifying the call.
+        :param func: Zero-argument coroutine function that makes the call.
+        :return: The result of the shared call.
+        """
+        if not self.enabled:
+            return await func()
+
+        loop = asyncio.get_running_loop()
+        flight_key = (loop, key)
+
+        with self._lock:
+            entry = self._acalls.get(flight_key)
+
+            if entry is None:
+                task = loop.create_task(func())
+                entry = self._acalls[flight_key] = {"task": task, "waiters": 0}
+                task.add_done_callback(lambda t: self._forget(flight_key, t))
+                self.calls += 1
+            else:
+                self.shared += 1
+
+            entry["waiters"] += 1
+
+        try:
+            return await asyncio.shield(entry["task"])
+        except asyncio.CancelledError:
+            with self._lock:
+                entry["waiters"] -= 1
+                abandoned = entry["waiters"] == 0
+
+            # Nobody is left waiting for the shared call, so stop it as well.
+            if abandoned:
+                entry["task"].cancel()
+            raise
+
+    def _forget(self, flight_key, task):
+        with self._lock:
+            entry = self._acalls.get(flight_key)
+            if entry is not None and entry["task"] is task:
+                del self._acalls[flight_key]
+
+        # Mark the exception as retrieved in case every waiter was cancelled.
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self):
+        """
+        :return: A dict with the number of calls made, calls shared and calls in flight.
+        """
+        with self._lock:
+            return {
+                "calls": self.calls,
+                "shared": self.shared,
+                "in_flight": len(self._calls) + len(self._acalls),
+            }
+
+
+chat_flights = SingleFlight(enabled=request_coalescing_enabled)
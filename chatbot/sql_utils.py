@@ -0,0 +1,130 @@
+import re
+
+
+def extract_sql_query(response):
+    """
+    Extract the SQL query from a chatbot response.
+
+    Mirrors the extraction done by the QGIS plugin: a ```sql fenced block first,
+    then the first `SELECT ...;` statement as a fallback.
+
+    :param response: The raw chatbot response.
+    :return: The SQL query string, or None if no query was found.
+    """
+    if not response:
+        return None
+
+    sql_pattern = r"```sql\s*(.*?)\s*```"
+    match = re.search(sql_pattern, response, re.DOTALL | re.IGNORECASE)
+
+    if match:
+        return match.group(1).strip()
+
+    select_pattern = r"(SELECT\s+.*?;)"
+    match = re.search(select_pattern, response, re.DOTALL | re.IGNORECASE)
+
+    if match:
+        return match.group(1).strip()
+
+    return None
+
+
+# Tokens that can start a literal, a quoted identifier or a comment, or end a statement.
+SPECIAL = re.compile(r"""[;'"$]|--|/\*""")
+
+# The rest of a literal or quoted identifier after its opening quote, closing quote included.
+STRING_END = re.compile(r"[^']*(?:''[^']*)*'")
+ESCAPE_STRING_END = re.compile(r"[^'\\]*(?:(?:\\.|'')[^'\\]*)*'", re.DOTALL)
+IDENTIFIER_END = re.compile(r'[^"]*(?:""[^"]*)*"')
+
+# A dollar-quote delimiter: `$$` or `$tag$`, where the tag is an unquoted identifier.
+DOLLAR_QUOTE = re.compile(r"\$(?:[A-Za-z_\x80-\uffff][A-Za-z0-9_\x80-\uffff]*)?\$")
+
+COMMENT_DELIMITER = re.compile(r"/\*|\*/")
+
+
+def _is_identifier_char(char):
+    return char.isalnum() or char in "_$" or ord(char) >= 0x80
+
+
+def single_statement(query):
+    """
+    Normalize a query to a single statement without its trailing semicolons.
+
+    The query is lexed the way PostgreSQL (with standard_conforming_strings on) splits
+    statements: semicolons inside string literals (including E'...' escape strings and
+    $tag$ dollar quotes), quoted identifiers and (nested) comments are ignored. Anything
+    the lexer cannot prove to be one statement, such as an unterminated literal or
+    comment, is rejected.
+
+    :param query: The SQL query string.
+    :return: The query without trailing semicolons and whitespace.
+    :raises ValueError: If the query is empty, not a single statement, or cannot be lexed.
+    """
+    statement = (query or "").strip()
+    end = None
+
+    i = 0
+    while True:
+        match = SPECIAL.search(statement, i)
+        if match is None:
+            break
+
+        i = match.start()
+        token = match.group()
+
+        if token == ";":
+            if statement[i:].strip("; \t\r\n\f\v"):
+                raise ValueError("Only a single SQL statement is allowed.")
+            end = i
+            break
+
+        if token == "'":
+            escapes = (
+                i > 0
+                and statement[i - 1] in ("E", "e")
+                and (i < 2 or not _is_identifier_char(statement[i - 2]))
+            )
+            literal = (ESCAPE_STRING_END if escapes else STRING_END).match(
+                statement, i + 1
+            )
+            if literal is None:
+                raise ValueError("Unterminated string literal in SQL query.")
+            i = literal.end()
+        elif token == '"':
+            identifier = IDENTIFIER_END.match(statement, i + 1)
+            if identifier is None:
+                raise ValueError("Unterminated quoted identifier in SQL query.")
+            i = identifier.end()
+        elif token == "$":
+            delimiter = None
+            if i == 0 or not _is_identifier_char(statement[i - 1]):
+                delimiter = DOLLAR_QUOTE.match(statement, i)
+            if delimiter is None:
+                i += 1
+                continue
+            close = statement.find(delimiter.group(), delimiter.end())
+            if close == -1:
+                raise ValueError("Unterminated dollar-quoted string in SQL query.")
+            i = close + len(delimiter.group())
+        elif token == "--":
+            close = statement.find("\n", i)
+            if close == -1:
+                break
+            i = close + 1
+        else:
+            depth = 0
+            for delimiter in COMMENT_DELIMITER.finditer(statement, i):
+                depth += 1 if delimiter.group() == "/*" else -1
+                if depth == 0:
+                    i = delimiter.end()
+                    break
+            else:
+                raise ValueError("Unterminated comment in SQL query.")
+
+    statement = statement[:end].rstrip()
+
+    if not statement:
+        raise ValueError("Empty SQL query.")
+
+    return statement
@@ -0,0 +1,320 @@
+import re
+import asyncio
+from chatbot.sql_utils import extract_sql_query, single_statement
+from metrics import timed
+
+TOKEN_PATTERN = re.compile(
+    r'"(?:[^"]|"")*"|[A-Za-z_][A-Za-z0-9_$]*|\d+(?:\.\d+)?|::|[(),.;*]|\S'
+)
+
+# Functions whose argument list uses FROM as a keyword (EXTRACT(YEAR FROM ts), ...).
+FROM_FUNCTIONS = {"extract", "substring", "trim", "overlay", "position"}
+
+# Words that may follow a table reference but are never an alias.
+NON_ALIAS_WORDS = {
+    "where",
+    "join",
+    "inner",
+    "left",
+    "right",
+    "full",
+    "cross",
+    "natural",
+    "on",
+    "using",
+    "group",
+    "order",
+    "limit",
+    "offset",
+    "having",
+    "union",
+    "intersect",
+    "except",
+    "window",
+    "fetch",
+    "for",
+    "lateral",
+    "tablesample",
+    "returning",
+}
+
+
+def _strip_literals(query):
+    """Replace string literals and comments with neutral placeholders."""
+    query = re.sub(r"--[^\n]*", " ", query)
+    query = re.sub(r"/\*.*?\*/", " ", query, flags=re.DOTALL)
+    return re.sub(r"'(?:[^']|'')*'", "''", query)
+
+
+def _identifier(token):
+    """Normalize an identifier token, or return None if the token is not an identifier."""
+    if token.startswith('"'):
+        return token[1:-1].replace('""', '"')
+    if re.match(r"[A-Za-z_]", token):
+        return token.lower()
+    return None
+
+
+def check_references(query, catalog):
+    """
+    Check the table and column names used in a query against the schema catalog.
+
+    The check is deliberately conservative: only plain `FROM`/`JOIN` table references in the
+    public schema and `alias.column` references to those tables are verified. CTEs, subqueries,
+    set-returning functions and other schemas are skipped and left to EXPLAIN.
+
+    :param query: A single SQL statement.
+    :param catalog: Dict mapping table names to their column names (see `get_catalog`).
+    :return: A description of the first unknown reference, or None if nothing is wrong.
+    """
+    tables = {
+        name.lower(): {c.lower() for c in columns} for name, columns in catalog.items()
+    }
+    tokens = TOKEN_PATTERN.findall(_strip_literals(query))
+    lowered = [t.lower() for t in tokens]
+
+    cte_names = set()
+    for i, token in enumerate(lowered):
+        if token == "as" and i > 0 and i + 1 < len(tokens) and tokens[i + 1] == "(":
+            name = _identifier(tokens[i - 1])
+            if name:
+                cte_names.add(name.lower())
+
+    aliases = {}
+    table_positions = set()
+    contexts = []
+
+    i = 0
+    while i < len(tokens):
+        token = lowered[i]
+
+        if token == "(":
+            contexts.append(lowered[i - 1] if i > 0 else "")
+        elif token == ")":
+            if contexts:
+                contexts.pop()
+        elif (
+            token in ("from", "join")
+            and not (contexts and contexts[-1] in FROM_FUNCTIONS)
+            and not (i > 0 and lowered[i - 1] == "distinct")
+        ):
+            j = i + 1
+            while j < len(tokens):
+                if tokens[j] == "(" or lowered[j] in ("lateral", "only"):
+                    break
+
+                name = _identifier(tokens[j])
+                if name is None:
+                    break
+
+                schema = None
+                table_positions.add(j)
+                if (
+                    j + 2 < len(tokens)
+                    and tokens[j + 1] == "."
+                    and _identifier(tokens[j + 2])
+                ):
+                    schema, name = name, _identifier(tokens[j + 2])
+                    table_positions.add(j + 2)
+                    j += 2
+
+                if j + 1 < len(tokens) and tokens[j + 1] == "(":
+                    break
+
+                key = name.lower()
+                checked = schema in (None, "public") and key not in cte_names
+                checked = (
+                    checked
+                    and not key.startswith("pg_")
+                    and schema != "information_schema"
+                )
+
+                if checked and key not in tables:
+                    available = ", ".join(sorted(catalog)) or "none"
+                    return f'Unknown table "{name}". Available tables: {available}.'
+
+                alias = key
+                j += 1
+                if j < len(tokens) and lowered[j] == "as":
+                    j += 1
+                if j < len(tokens):
+                    candidate = _identifier(tokens[j])
+                    if candidate and lowered[j] not in NON_ALIAS_WORDS:
+                        alias = candidate.lower()
+                        j += 1
+
+                if checked:
+                    aliases[alias] = key
+                    aliases.setdefault(key, key)
+
+                if j < len(tokens) and tokens[j] == "," and token == "from":
+                    j += 1
+                    continue
+                break
+
+        i += 1
+
+    for i in range(len(tokens) - 2):
+        if i in table_positions or tokens[i + 1] != ".":
+            continue
+
+        qualifier = _identifier(tokens[i])
+        column = _identifier(tokens[i + 2])
+
+        if not qualifier or not column or qualifier.lower() not in aliases:
+            continue
+        if i + 3 < len(tokens) and tokens[i + 3] == "(":
+            continue
+
+        table = aliases[qualifier.lower()]
+        if column.lower() not in tables[table]:
+            available = ", ".join(_catalog_columns(catalog, table))
+            return (
+                f'Unknown column "{column}" on "{qualifier}" (table "{table}"). '
+                f"Available columns: {available}."
+            )
+
+    return None
+
+
+def _catalog_columns(catalog, table):
+    """Return the column names of a table from the catalog, matched case-insensitively."""
+    for name, columns in catalog.items():
+        if name.lower() == table:
+            return columns
+    return []
+
+
+class SQLValidator:
+    """
+    Validates generated SQL before it is returned to the user.
+
+    A query passes when it is a single statement, every table and column it references
+    exists in the cached catalog, and PostgreSQL can plan it with EXPLAIN (nothing is executed).
+    Validation runs on every chat answer, so a query is only planned once single_statement
+    has proven it is one statement, and then on the connector's read-only planning
+    connection, never the shared one.
+    """
+
+    def __init__(self, database):
+        """
+        :param database: The session's database connector.
+        """
+        self.database = database
+
+    def validate(self, query):
+        """
+        Validate a SQL query.
+
+        :param query: The SQL query extracted from the model's answer.
+        :return: An error message describing the problem, or None if the query is valid.
+        """
+        try:
+            statement = single_statement(query)
+        except ValueError as e:
+            return str(e)
+
+        try:
+            catalog = self.database.get_catalog()
+        except Exception:
+            catalog = None
+
+        if catalog:
+            error = check_references(statement, catalog)
+            if error:
+                return error
+
+        try:
+            self.database.explain_query(statement)
+        except Exception as e:
+            return str(e).strip()
+
+        return None
+
+
+# Appended to an answer whose SQL still fails validation after the last repair attempt.
+INVALID_SQL_NOTE = "\n\nNote: this query failed validation and may not run: {error}"
+
+
+def flag_invalid(answer, error):
+    """
+    Mark an answer whose SQL is known to be invalid.
+
+    :param answer: The model's answer.
+    :param error: The last validation error.
+    :return: The answer followed by a note with the error.
+    """
+    return answer + INVALID_SQL_NOTE.format(error=error)
+
+
+def repair_answer(validator, answer, regenerate, max_attempts):
+    """
+    Validate the SQL in an answer and ask the model to fix it a bounded number of times.
+
+    Every answer is validated, including the last regenerated one, so an answer whose
+    SQL is still invalid is never passed on as if it were fine.
+
+    :param validator: A SQLValidator, or None to skip validation.
+    :param answer: The model's answer.
+    :param regenerate: Callable (previous_answer, error) -> new answer.
+    :param max_attempts: Maximum number of repair requests (0 only validates).
+    :return: The first valid answer (or an answer without SQL); otherwise the last
+             answer, flagged with its validation error (see `flag_invalid`).
+    """
+    if validator is None:
+        return answer
+
+    for attempt in range(max_attempts + 1):
+        query = extract_sql_query(answer)
+        if query is None:
+            return answer
+
+        error = timed("validate_sql", validator.validate, query)
+        if error is None:
+            return answer
+
+        if attempt == max_attempts:
+            break
+
+        print(f"Generated SQL failed validation, asking for a repair: {error}")
+        answer = regenerate(answer, error)
+
+    print(f"Generated SQL is still invalid after {max_attempts} repairs: {error}")
+
+    return flag_invalid(answer, error)
+
+
+async def arepair_answer(validator, answer, regenerate, max_attempts):
+    """
+    Asynchronous counterpart of `repair_answer`; validation runs in a worker thread.
+
+    :param validator: A SQLValidator, or None to skip validation.
+    :param answer: The model's answer.
+    :param regenerate: Coroutine function (previous_answer, error) -> new answer.
+    :param max_attempts: Maximum number of repair requests (0 only validates).
+    :return: The first valid answer (or an answer without SQL); otherwise the last
+             answer, flagged with its validation error (see `flag_invalid`).
+    """
+    if validator is None:
+        return answer
+
+    for attempt in range(max_attempts + 1):
+        query = extract_sql_query(answer)
+        if query is None:
+            return answer
+
+        error = await asyncio.to_thread(
+            timed, "validate_sql", validator.validate, query
+        )
+        if error is None:
+            return answer
+
+        if attempt == max_attempts:
+            break
+
+        print(f"Generated SQL failed validation, asking for a repair: {error}")
+        answer = await regenerate(answer, error)
+
+    print(f"Generated SQL is still invalid after {max_attempts} repairs: {error}")
+
+    return flag_invalid(answer, error)
@@ -0,0 +1,59 @@
+from contextvars import ContextVar
+from contextlib import contextmanager
+from langchain_core.callbacks import AsyncCallbackHandler
+from langchain_core.tracers.context import register_configure_hook
+
+# Handler receiving the tokens of every model call made in the current context.
+_token_stream = ContextVar("spatialmind_token_stream", default=None)
+
+register_configure_hook(_token_stream, inheritable=True)
+
+
+class TokenStreamHandler(AsyncCallbackHandler):
+    """
+    LangChain callback that forwards the tokens of chat model calls as they are generated.
+
+    Having `tap_output_aiter`/`tap_output_iter` makes LangChain treat the handler as a
+    streaming consumer, so `ainvoke` uses the model's streaming API while it is attached
+    and still returns the complete answer; chains do not change.
+    """
+
+    def __init__(self, on_token):
+        """
+        :param on_token: Coroutine function (call, token) awaited for every token; call
+                         numbers the model calls (rephrase, answer, repairs) from 1.
+        """
+        self.on_token = on_token
+        self.calls = {}
+
+    async def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self.calls[run_id] = len(self.calls) + 1
+
+    async def on_llm_new_token(self, token, *, run_id, **kwargs):
+        if token:
+            await self.on_token(self.calls.get(run_id, 0), token)
+
+    def tap_output_aiter(self, run_id, output):
+        return output
+
+    def tap_output_iter(self, run_id, output):
+        return output
+
+
+@contextmanager
+def stream_tokens(on_token):
+    """
+    Stream the tokens of the model calls made inside the block (including tasks and
+    worker threads started from it) to a callback.
+
+    Calls shared with an identical concurrent request (see `single_flight`) only stream
+    to the request that started them.
+
+    :param on_token: Coroutine function (call, token).
+    :return: A context manager.
+    """
+    token = _token_stream.set(TokenStreamHandler(on_token))
+    try:
+        yield
+    finally:
+        _token_stream.reset(token)
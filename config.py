@@ -1,3 +1,175 @@
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+
+def _env_bool(name, default=False):
+    """Read a boolean flag from the environment."""
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+# Provider-side context caching of the static prompt prefix (system prompt + schema).
+gemini_context_cache_enabled = _env_bool("GEMINI_CONTEXT_CACHE", False)
+gemini_context_cache_ttl = int(os.getenv("GEMINI_CONTEXT_CACHE_TTL", "3600"))
+
+# Multi-candidate SQL generation: candidate i uses temperature i and model i (cycled).
+candidate_temperatures = [
+    float(t) for t in os.getenv("CANDIDATE_TEMPERATURES", "0.2,0.6,1.0").split(",")
+]
+candidate_models = [
+    m.strip() for m in os.getenv("CANDIDATE_MODELS", "").split(",") if m.strip()
+]
+max_candidates = int(os.getenv("MAX_CANDIDATES", "5"))
+
+# Local validation of generated SQL and bounded repair attempts before answering.
+sql_validation_enabled = _env_bool("SQL_VALIDATION", True)
+max_repair_attempts = int(os.getenv("MAX_REPAIR_ATTEMPTS", "2"))
+
+# Server-side normalization of images sent to the vision chatbot.
+vision_max_image_side = int(os.getenv("VISION_MAX_IMAGE_SIDE", "1536"))
+vision_jpeg_quality = int(os.getenv("VISION_JPEG_QUALITY", "85"))
+vision_preprocess_workers = int(
+    os.getenv("VISION_PREPROCESS_WORKERS", str(min(4, os.cpu_count() or 1)))
+)
+
+# Content-addressed store for uploaded images (originals plus normalized variants).
+image_store_max_bytes = int(os.getenv("IMAGE_STORE_MAX_BYTES", str(256 * 1024 * 1024)))
+max_image_upload_bytes = int(os.getenv("MAX_IMAGE_UPLOAD_BYTES", str(50 * 1024 * 1024)))
+
+# Local Ollama daemon: preloaded models, how long they stay resident, per-model concurrency.
+ollama_host = os.getenv("OLLAMA_HOST") or None
+ollama_preload_models = [
+    m.strip() for m in os.getenv("OLLAMA_PRELOAD_MODELS", "").split(",") if m.strip()
+]
+ollama_keep_alive = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+if ollama_keep_alive.lstrip("-").isdigit():
+    ollama_keep_alive = int(ollama_keep_alive)
+ollama_max_concurrency = int(os.getenv("OLLAMA_MAX_CONCURRENCY", "0"))
+
+# Identical chat requests in flight at the same time share one model call.
+request_coalescing_enabled = _env_bool("REQUEST_COALESCING", True)
+
+# Hedged chatbot: the primary provider answers; if it has not answered by the given
+# percentile of its recent latencies, the same question also goes to the secondary.
+hedge_primary = os.getenv("HEDGE_PRIMARY", "gemini").strip().lower()
+hedge_secondary_model = os.getenv("HEDGE_SECONDARY_MODEL") or None
+hedge_percentile = float(os.getenv("HEDGE_PERCENTILE", "0.95"))
+hedge_initial_delay = float(os.getenv("HEDGE_INITIAL_DELAY", "8.0"))
+hedge_min_delay = float(os.getenv("HEDGE_MIN_DELAY", "0.5"))
+hedge_window_size = int(os.getenv("HEDGE_WINDOW_SIZE", "200"))
+hedge_min_samples = int(os.getenv("HEDGE_MIN_SAMPLES", "20"))
+
+# Token budget of the rendered schema: a default, a smaller one for local Ollama models,
+# and per-model overrides given as "model=tokens,..." (a model name prefix also matches).
+schema_token_budget = int(os.getenv("SCHEMA_TOKEN_BUDGET", "8000"))
+ollama_schema_token_budget = int(os.getenv("OLLAMA_SCHEMA_TOKEN_BUDGET", "2000"))
+schema_token_budgets = {
+    name.strip(): int(tokens)
+    for name, tokens in (
+        item.split("=", 1)
+        for item in os.getenv("SCHEMA_TOKEN_BUDGETS", "").split(",")
+        if "=" in item
+    )
+}
+
+# Offline fake model ("fake_text" and "fake_vision" chatbot types) used for load tests and benchmarks.
+# Latency: "fixed:MS", "uniform:MIN_MS-MAX_MS" or "lognormal:MEDIAN_MS,SIGMA".
+fake_llm_latency = os.getenv("FAKE_LLM_LATENCY", "lognormal:800,0.4")
+fake_llm_token_delay_ms = float(os.getenv("FAKE_LLM_TOKEN_DELAY_MS", "5"))
+fake_llm_chunk_chars = int(os.getenv("FAKE_LLM_CHUNK_CHARS", "8"))
+fake_llm_error_rate = float(os.getenv("FAKE_LLM_ERROR_RATE", "0"))
+fake_llm_seed = int(os.getenv("FAKE_LLM_SEED", "0"))
+fake_llm_script = os.getenv("FAKE_LLM_SCRIPT") or None
+
+# Session limits: idle sessions are closed after SESSION_IDLE_TTL seconds; beyond
+# SESSION_MAX_COUNT sessions or SESSION_MAX_TOTAL_BYTES of history the least recently
+# used session is closed. A session above SESSION_MAX_BYTES loses its oldest turns.
+# 0 disables a limit.
+session_idle_ttl = float(os.getenv("SESSION_IDLE_TTL", "3600"))
+session_max_count = int(os.getenv("SESSION_MAX_COUNT", "500"))
+session_max_bytes = int(os.getenv("SESSION_MAX_BYTES", str(4 * 1024 * 1024)))
+session_max_total_bytes = int(
+    os.getenv("SESSION_MAX_TOTAL_BYTES", str(512 * 1024 * 1024))
+)
+session_reap_interval = float(os.getenv("SESSION_REAP_INTERVAL", "60"))
+# Shared session state for several workers: "sqlite:///path/to/sessions.sqlite3" or
+# "redis://host:6379/0". Empty keeps sessions in the worker's memory only. Only the
+# session configuration and history are shared: query jobs, result cursors, uploaded
+# images and WebSocket channels stay in the worker that created them, so several workers
+# require sticky routing (every request of a session to the same worker, e.g. hashed on
+# session_id); another worker answers 404 for them.
+session_store_url = os.getenv("SESSION_STORE", "")
+
+# Admission control: chat turns (LLM) and query executions (DB) allowed to run at once
+# globally, per LLM provider or per database, and per session, and how many more may
+# wait for each limit before a request is rejected with 429. Provider limits are given
+# as "provider=limit,...". A limit of 0 disables the gate; a queue of 0 is unbounded.
+# The chat turns of one session always run one at a time, so SESSION_MAX_CONCURRENCY
+# only applies to query executions.
+llm_max_concurrency = int(os.getenv("LLM_MAX_CONCURRENCY", "32"))
+llm_max_queue = int(os.getenv("LLM_MAX_QUEUE", "128"))
+llm_provider_max_concurrency = {
+    name.strip(): int(limit)
+    for name, limit in (
+        item.split("=", 1)
+        for item in os.getenv("LLM_PROVIDER_MAX_CONCURRENCY", "").split(",")
+        if "=" in item
+    )
+}
+llm_provider_max_queue = int(os.getenv("LLM_PROVIDER_MAX_QUEUE", "64"))
+db_max_concurrency = int(os.getenv("DB_MAX_CONCURRENCY", "16"))
+db_max_queue = int(os.getenv("DB_MAX_QUEUE", "128"))
+# A connector runs one statement at a time on its cursor.
+db_database_max_concurrency = int(os.getenv("DB_DATABASE_MAX_CONCURRENCY", "1"))
+db_database_max_queue = int(os.getenv("DB_DATABASE_MAX_QUEUE", "32"))
+session_max_concurrency = int(os.getenv("SESSION_MAX_CONCURRENCY", "2"))
+session_max_queue = int(os.getenv("SESSION_MAX_QUEUE", "4"))
+
+# Background query jobs (/jobs): worker threads, jobs allowed to wait for a worker,
+# rows fetched per round trip, rows kept per job and how long finished jobs are kept.
+job_workers = int(os.getenv("JOB_WORKERS", "4"))
+job_max_queue = int(os.getenv("JOB_MAX_QUEUE", "64"))
+job_batch_size = int(os.getenv("JOB_BATCH_SIZE", "1000"))
+job_max_rows = int(os.getenv("JOB_MAX_ROWS", "1000000"))
+job_result_ttl = float(os.getenv("JOB_RESULT_TTL", "3600"))
+# Jobs run on their own connections, so they are admitted by their own per-database gate
+# (and queue) rather than DB_DATABASE_MAX_CONCURRENCY, which guards the shared connector.
+job_database_max_concurrency = int(os.getenv("JOB_DATABASE_MAX_CONCURRENCY", "2"))
+job_database_max_queue = int(os.getenv("JOB_DATABASE_MAX_QUEUE", "32"))
+
+# Paginated /execute results: largest page, open result cursors per session (each holds
+# a database connection of its own), and how long an unused cursor is kept before it is
+# closed on the database server.
+max_page_size = int(os.getenv("MAX_PAGE_SIZE", "50000"))
+cursor_max_per_session = int(os.getenv("CURSOR_MAX_PER_SESSION", "4"))
+cursor_idle_ttl = float(os.getenv("CURSOR_IDLE_TTL", "600"))
+
+# WebSocket channel (/ws/{session_id}): requests one connection may run at once, and
+# outgoing messages buffered before request handlers wait for a slow client.
+ws_max_inflight = int(os.getenv("WS_MAX_INFLIGHT", "8"))
+ws_send_queue = int(os.getenv("WS_SEND_QUEUE", "64"))
+
+# Compression of large query results (/execute, /jobs rows), negotiated by Accept-Encoding.
+response_compression_min_bytes = int(
+    os.getenv("RESPONSE_COMPRESSION_MIN_BYTES", "1024")
+)
+response_gzip_level = int(os.getenv("RESPONSE_GZIP_LEVEL", "5"))
+response_zstd_level = int(os.getenv("RESPONSE_ZSTD_LEVEL", "3"))
+# Results with at least this many values (rows x columns) are converted, serialized and
+# compressed in a worker thread instead of on the event loop.
+response_offload_min_values = int(os.getenv("RESPONSE_OFFLOAD_MIN_VALUES", "50000"))
+
+# Few-shot examples: successful (question, SQL) pairs recorded from executed answers.
+# FEW_SHOT_EXAMPLES is the number injected per question (0 disables recording and retrieval).
+few_shot_examples = int(os.getenv("FEW_SHOT_EXAMPLES", "3"))
+example_store_path = os.getenv("EXAMPLE_STORE_PATH", "spatialmind_examples.sqlite3")
+example_max_seconds = float(os.getenv("EXAMPLE_MAX_SECONDS", "5.0"))
+example_min_similarity = float(os.getenv("EXAMPLE_MIN_SIMILARITY", "0.2"))
+
 system_prompt = """
 You are an expert data engineer specializing in spatial SQL for QGIS integration.
 
@@ -65,3 +237,11 @@ Output:
 - EXACTLY one SQL code block.
 - No extra text.
 """
+
+sql_repair_prompt = """
+The SQL query in your previous answer is invalid:
+{error}
+
+Fix the query. Use only tables and columns from the provided schema.
+Output EXACTLY one SQL code block and nothing else.
+"""
@@ -0,0 +1,218 @@
+import time
+import asyncio
+import secrets
+import threading
+from collections import OrderedDict
+from config import cursor_max_per_session, cursor_idle_ttl, session_reap_interval
+
+
+class CursorManager:
+    """
+    Open result cursors of paginated /execute requests, keyed by continuation token.
+
+    A token is opaque to clients and only valid for the session that opened it. Each
+    session keeps at most `max_per_session` cursors (opening another closes its oldest),
+    and a cursor that has not been read for `idle_ttl` seconds is closed by the reaper.
+
+    Each cursor runs on a database connection of its own, which is closed with it: the
+    cursor keeps its transaction open between pages, and the server produces the rows as
+    they are read instead of materializing the whole result under the shared connector's
+    lock. Cursors live in the worker's memory, so with several API workers a client must
+    continue on the worker that opened the cursor.
+    """
+
+    def __init__(
+        self,
+        max_per_session=cursor_max_per_session,
+        idle_ttl=cursor_idle_ttl,
+        clock=time.time,
+    ):
+        """
+        :param max_per_session: Maximum number of open cursors per session (0 for no limit).
+        :param idle_ttl: Seconds after which an unused cursor is closed (0 for never).
+        :param clock: Time source.
+        """
+        self.max_per_session = max_per_session
+        self.idle_ttl = idle_ttl
+        self.clock = clock
+
+        self._cursors = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __contains__(self, token):
+        with self._lock:
+            return token in self._cursors
+
+    def owner(self, token):
+        """
+        :param token: A continuation token.
+        :return: The id of the session that opened the cursor, or None if it is unknown.
+        """
+        with self._lock:
+            entry = self._cursors.get(token)
+            return entry["session_id"] if entry else None
+
+    def open(self, session_id, database, query, page_size):
+        """
+        Execute a query and return its first page.
+
+        :param session_id: The session executing the query.
+        :param database: The session's database connector.
+        :param query: A SQL query that returns rows.
+        :param page_size: Number of rows per page.
+        :return: A tuple (rows, description, token); token is None when there are no
+                 further pages.
+        """
+        connector = database.dedicated()
+        if connector is None:
+            raise ConnectionError("Failed to connect to the database.")
+
+        try:
+            cursor, description, rows = connector.open_cursor(query, page_size)
+        except Exception:
+            connector.close()
+            raise
+
+        if cursor is None:
+            connector.close()
+            return rows, description, None
+
+        token = secrets.token_urlsafe(24)
+        evicted = []
+
+        with self._lock:
+            self._cursors[token] = {
+                "session_id": session_id,
+                "database": connector,
+                "cursor": cursor,
+                "description": description,
+                "last_used": self.clock(),
+            }
+
+            if self.max_per_session:
+                tokens = [
+                    other
+                    for other, entry in self._cursors.items()
+                    if entry["session_id"] == session_id
+                ]
+                for other in tokens[: -self.max_per_session]:
+                    evicted.append(self._cursors.pop(other))
+
+        self._close_entries(evicted)
+
+        return rows, description, token
+
+    def fetch(self, token, page_size):
+        """
+        Return the next page of an open cursor; the cursor is closed after its last page.
+
+        :param token: The continuation token returned with the previous page.
+        :param page_size: Number of rows per page.
+        :return: A tuple (rows, description, token) as for `open`.
+        :raises KeyError: If the token is unknown or its cursor was closed.
+        """
+        with self._lock:
+            entry = self._cursors[token]
+            entry["last_used"] = self.clock()
+            self._cursors.move_to_end(token)
+
+        try:
+            rows = entry["database"].fetch_cursor(entry["cursor"], page_size)
+        except Exception:
+            self.close(token)
+            raise
+
+        if len(rows) < page_size:
+            self.close(token)
+            token = None
+
+        return rows, entry["description"], token
+
+    def close(self, token):
+        """
+        Close a cursor before its last page was read.
+
+        :param token: The continuation token.
+        :return: True if the cursor was open, False otherwise.
+        """
+        with self._lock:
+            entry = self._cursors.pop(token, None)
+
+        self._close_entries([entry] if entry else [])
+
+        return entry is not None
+
+    def close_session(self, session_id):
+        """
+        Close every cursor of a session.
+
+        :param session_id: The session id.
+        :return: None
+        """
+        with self._lock:
+            tokens = [
+                token
+                for token, entry in self._cursors.items()
+                if entry["session_id"] == session_id
+            ]
+            entries = [self._cursors.pop(token) for token in tokens]
+
+        self._close_entries(entries)
+
+    def _close_entries(self, entries):
+        for entry in entries:
+            try:
+                entry["database"].close_cursor(entry["cursor"])
+            except Exception as e:
+                print(f"Failed to close result cursor: {e}")
+            finally:
+                entry["database"].close()
+
+    def reap(self):
+        """
+        Close the cursors that have not been read for longer than the TTL.
+
+        :return: The number of closed cursors.
+        """
+        if not self.idle_ttl:
+            return 0
+
+        deadline = self.clock() - self.idle_ttl
+
+        with self._lock:
+            tokens = [
+                token
+                for token, entry in self._cursors.items()
+                if entry["last_used"] < deadline
+            ]
+            entries = [self._cursors.pop(token) for token in tokens]
+
+        self._close_entries(entries)
+
+        return len(entries)
+
+    async def run_reaper(self, interval=session_reap_interval):
+        """
+        Periodically close idle cursors; runs until cancelled.
+
+        :param interval: Seconds between two checks.
+        :return: None
+        """
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await asyncio.to_thread(self.reap)
+            except Exception as e:
+                print(f"Cursor reaper failed: {e}")
+
+    def close_all(self):
+        """
+        Close every open cursor.
+
+        :return: None
+        """
+        with self._lock:
+            entries = list(self._cursors.values())
+            self._cursors.clear()
+
+        self._close_entries(entries)
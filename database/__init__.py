@@ -1,4 +1,15 @@
 from .base_database import BaseDBConnector
-from .postgres import PostgresqlDBConnector
+from .postgres import PostgresqlDBConnector, returns_rows
+from .schema_renderer import SchemaRenderer, estimate_tokens, token_budget_for
+from .result_types import column_types, rows_to_json
 
-__all__ = ["PostgresqlDBConnector", "BaseDBConnector"]
+__all__ = [
+    "PostgresqlDBConnector",
+    "BaseDBConnector",
+    "SchemaRenderer",
+    "estimate_tokens",
+    "token_budget_for",
+    "column_types",
+    "rows_to_json",
+    "returns_rows",
+]
@@ -23,6 +23,15 @@ class BaseDBConnector(ABC):
         """
         pass
 
+    @abstractmethod
+    def explain_query(self, query):
+        """
+        Plan a SQL query without executing it.
+        :param query: SQL query string to be planned.
+        :return: The planner's estimates for the query.
+        """
+        pass
+
     @abstractmethod
     def get_schema(self, *args, **kwargs):
         """
@@ -30,3 +39,13 @@ class BaseDBConnector(ABC):
         :return: Database schema information.
         """
         pass
+
+    @abstractmethod
+    def get_compact_schema(self, token_budget=None, refresh=False):
+        """
+        Retrieve the database schema in the compact prompt format.
+        :param token_budget: Maximum number of tokens of the rendering, or None for no limit.
+        :param refresh: If True, read the catalog again.
+        :return: The rendered schema.
+        """
+        pass
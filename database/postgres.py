@@ -1,5 +1,19 @@
+import json
+import uuid
+import threading
 import psycopg2
 from database.base_database import BaseDBConnector
+from database.schema_renderer import SchemaRenderer
+from metrics import stage_timer
+
+# Statements that return rows and can therefore run on a server-side cursor.
+ROW_STATEMENTS = ("SELECT", "WITH", "VALUES", "TABLE")
+
+
+def returns_rows(query):
+    """:return: Whether a statement can run on a server-side cursor (a query)."""
+    words = query.lstrip().split(None, 1)
+    return bool(words) and words[0].upper() in ROW_STATEMENTS
 
 
 class PostgresqlDBConnector(BaseDBConnector):
@@ -45,6 +59,9 @@ class PostgresqlDBConnector(BaseDBConnector):
         :param db_host: Database host address (default is "localhost").
         :param db_port: Database port number (default is 5432).
         """
+        if getattr(self, "_initialized", False):
+            return
+
         self.db_name = db_name
         self.db_user = db_user
         self.db_password = db_password
@@ -54,6 +71,24 @@ class PostgresqlDBConnector(BaseDBConnector):
         self.connection = None
         self.cursor = None
 
+        self._schema_cache = {}
+        self._catalog = None
+        self._schema_catalog = None
+        self._compact_schema_cache = {}
+
+        # Token count of each compact rendering, keyed by token budget.
+        self.schema_tokens = {}
+
+        # The connector is shared by every session on the same database and used from
+        # worker threads, so statements and their cursor state are serialized.
+        self.lock = threading.RLock()
+
+        # Read-only connection for planning model-generated queries, opened on first use.
+        self._planner = None
+        self._planner_lock = threading.Lock()
+
+        self._initialized = True
+
     def connect(self):
         """
         Establish a connection to the PostgreSQL database.
@@ -79,6 +114,23 @@ class PostgresqlDBConnector(BaseDBConnector):
             print("Failed to connect to the database.")
             return None
 
+    def dedicated(self):
+        """
+        Open a separate connection to the same database, not shared with other sessions.
+
+        Long-running work such as query jobs runs on one, so it never holds the shared
+        connector's lock while other sessions read the schema or run statements. The
+        caller closes it.
+
+        :return: A new connected PostgresqlDBConnector, or None if the connection failed.
+        """
+        connector = super(PostgresqlDBConnector, type(self)).__new__(type(self))
+        connector.__init__(
+            self.db_name, self.db_user, self.db_password, self.db_host, self.db_port
+        )
+
+        return connector if connector.connect() else None
+
     def execute_query(self, query, params=None):
         """
         Execute an SQL query and return the fetched results.
@@ -87,21 +139,268 @@ class PostgresqlDBConnector(BaseDBConnector):
         :param params: Optional parameters for parameterized queries.
         :return: List of query results.
         """
-        self.cursor.execute(query, params)
-        self.connection.commit()
-        return self.cursor.fetchall()
+        with self.lock:
+            try:
+                self.cursor.execute(query, params)
+                self.connection.commit()
+                return self.cursor.fetchall()
+            except Exception:
+                # Leave the shared connection usable instead of in an aborted transaction.
+                if self.connection:
+                    self.connection.rollback()
+                raise
+
+    def iterate_query(self, query, batch_size=1000):
+        """
+        Execute a query and yield its rows in batches as the server produces them.
+
+        Row-returning statements run on a server-side (named) cursor, so rows are read
+        from the server batch by batch instead of all at once. Other statements run on
+        the shared cursor and yield their result as a single batch. The connector lock
+        is held until the generator is exhausted or closed, so it must be consumed (and
+        closed) in one thread.
+
+        :param query: SQL query to execute.
+        :param batch_size: Number of rows fetched per round trip.
+        :return: A generator of (description, rows) tuples, where description is the
+                 cursor's column description (name and type OID first).
+        """
+        with self.lock:
+            streamed = returns_rows(query)
+            cursor = (
+                self.connection.cursor(name=f"spatialmind_{uuid.uuid4().hex}")
+                if streamed
+                else self.cursor
+            )
+
+            try:
+                cursor.execute(query)
+
+                if not streamed:
+                    rows = cursor.fetchall() if cursor.description else []
+                    self.connection.commit()
+                    yield list(cursor.description or []), rows
+                    return
+
+                while True:
+                    rows = cursor.fetchmany(batch_size)
+                    # A named cursor describes its columns after the first fetch.
+                    yield list(cursor.description or []), rows
+                    if len(rows) < batch_size:
+                        break
+
+                cursor.close()
+                self.connection.commit()
+            except BaseException:
+                # Also reached when the consumer closes the generator early (cancellation).
+                if self.connection:
+                    self.connection.rollback()
+                raise
+
+    def open_cursor(self, query, page_size):
+        """
+        Execute a query on a server-side cursor and fetch its first page.
+
+        The cursor lives in the connection's open transaction, and the server produces
+        the remaining rows as they are fetched, so the first page does not wait for the
+        full result. The connection stays busy until the cursor is closed: call this on
+        a connection of its own (see `dedicated`), never on the shared one.
+
+        :param query: A SQL query (a statement that returns rows).
+        :param page_size: Number of rows of the first page.
+        :return: A tuple (cursor, description, rows); cursor is None when the first page
+                 holds every row.
+        """
+        with self.lock:
+            cursor = self.connection.cursor(name=f"spatialmind_{uuid.uuid4().hex}")
+
+            try:
+                cursor.execute(query)
+                rows = cursor.fetchmany(page_size)
+                description = list(cursor.description or [])
+            except Exception:
+                if self.connection:
+                    self.connection.rollback()
+                raise
+
+        if len(rows) < page_size:
+            self.close_cursor(cursor)
+            cursor = None
+
+        return cursor, description, rows
+
+    def fetch_cursor(self, cursor, page_size):
+        """
+        Fetch the next page of a cursor opened with `open_cursor`.
+
+        :param cursor: The open cursor.
+        :param page_size: Maximum number of rows.
+        :return: The rows.
+        """
+        with self.lock:
+            try:
+                return cursor.fetchmany(page_size)
+            except Exception:
+                if self.connection:
+                    self.connection.rollback()
+                raise
+
+    def close_cursor(self, cursor):
+        """
+        Close a cursor opened with `open_cursor` and end its transaction, which frees its
+        rows on the server.
+
+        :param cursor: The open cursor.
+        :return: None
+        """
+        with self.lock:
+            if not self.connection:
+                return
+
+            try:
+                cursor.close()
+            finally:
+                self.connection.rollback()
+
+    def cancel(self):
+        """
+        Ask the server to cancel the statement running on the connection; the thread
+        executing it gets a QueryCanceledError. Safe to call from any thread.
+
+        :return: None
+        """
+        if self.connection:
+            self.connection.cancel()
 
-    def get_schema(self, short=False):
+    def _open_planner(self):
+        """
+        Open the connection EXPLAIN runs on.
+
+        Every transaction on it is read-only, even one started after a COMMIT smuggled
+        into the query, and standard_conforming_strings is forced on so backslashes in
+        plain string literals cannot end them, matching how single_statement lexes.
+
+        :return: A new connected PostgresqlDBConnector.
+        :raises psycopg2.OperationalError: If the connection could not be opened.
+        """
+        planner = self.dedicated()
+        if planner is None:
+            raise psycopg2.OperationalError("Could not open a planning connection.")
+
+        planner.cursor.execute("SET SESSION CHARACTERISTICS AS TRANSACTION READ ONLY")
+        planner.cursor.execute("SET standard_conforming_strings = on")
+        planner.connection.commit()
+
+        return planner
+
+    def explain_query(self, query):
+        """
+        Plan a query with EXPLAIN (without executing it) and return the planner's estimates.
+
+        The query is usually model-generated, so it is planned on a dedicated read-only
+        connection (see _open_planner) and never on the shared one, and the transaction
+        is always rolled back. Callers must still pass it through single_statement first.
+
+        :param query: A single SQL statement.
+        :return: A dict with the estimated total cost and the estimated number of rows.
+        :raises Exception: If the statement cannot be planned (syntax error, unknown relation, ...).
+        """
+        with self._planner_lock:
+            if self._planner is None:
+                self._planner = self._open_planner()
+            planner = self._planner
+
+            try:
+                planner.cursor.execute(f"EXPLAIN (FORMAT JSON) {query}")
+                (plan,) = planner.cursor.fetchone()
+            finally:
+                if planner.connection.closed:
+                    # Lost the connection; reopen it on the next call.
+                    self._planner = None
+                else:
+                    planner.connection.rollback()
+
+        if isinstance(plan, str):
+            plan = json.loads(plan)
+
+        root = plan[0]["Plan"]
+
+        return {"cost": root["Total Cost"], "rows": root["Plan Rows"]}
+
+    def get_catalog(self, refresh=False):
+        """
+        Retrieve the column names of every public table and view.
+
+        The result is cached like the rendered schema and is used to check generated SQL locally.
+
+        :param refresh: If True, ignore the cached catalog and read it again.
+        :return: A dict mapping each table/view name to the list of its column names.
+        """
+        # A cached catalog is read without the lock, so it never waits for a statement.
+        if self._catalog is not None and not refresh:
+            return self._catalog
+
+        with self.lock:
+            if self._catalog is not None and not refresh:
+                return self._catalog
+
+            rows = self.execute_query(
+                """
+                SELECT c.table_name, c.column_name
+                FROM information_schema.columns c
+                JOIN information_schema.tables t
+                  ON t.table_schema = c.table_schema AND t.table_name = c.table_name
+                WHERE c.table_schema = 'public'
+                AND t.table_type IN ('BASE TABLE', 'VIEW')
+                ORDER BY c.table_name, c.ordinal_position;
+                """
+            )
+
+            catalog = {}
+            for table_name, column_name in rows:
+                catalog.setdefault(table_name, []).append(column_name)
+
+            self._catalog = catalog
+
+            return catalog
+
+    def get_schema(self, short=False, refresh=False):
         """
         Retrieve and format the database schema for all public tables and views.
 
         This includes table names, column details (name, data type, nullability, default value),
         and one sample row from each table.
 
+        The rendered schema is cached per connector so that every prompt built from it is
+        byte-identical across turns and sessions, which lets providers reuse the prompt prefix.
+
         :param short: If True, returns a compact representation of the schema.
+        :param refresh: If True, ignore the cached rendering and read the catalog again.
 
         :return: Formatted string representation of the database schema, or None if no tables/views are found.
         """
+        with stage_timer("get_schema"):
+            if not refresh and short in self._schema_cache:
+                return self._schema_cache[short]
+
+            with self.lock:
+                if not refresh and short in self._schema_cache:
+                    return self._schema_cache[short]
+
+                schema = self._render_schema(short)
+
+                if schema is not None:
+                    self._schema_cache[short] = schema
+
+                return schema
+
+    def _render_schema(self, short):
+        """
+        Read the catalog and render the schema string used by `get_schema`.
+
+        :param short: If True, returns a compact representation of the schema.
+        :return: Formatted schema string, or None if no tables/views are found.
+        """
         schema = ""
 
         table_names = self.execute_query(
@@ -148,19 +447,213 @@ class PostgresqlDBConnector(BaseDBConnector):
 
         return schema
 
+    def get_compact_schema(self, token_budget=None, refresh=False):
+        """
+        Retrieve the schema of all public tables and views in the compact prompt format.
+
+        One line per table with abbreviated types, primary and foreign keys, geometry type
+        and SRID of spatial columns, and estimated row counts, trimmed to fit the token
+        budget (see `SchemaRenderer`). Renderings are cached per budget, and their token
+        counts are kept in `schema_tokens`.
+
+        :param token_budget: Maximum number of tokens of the rendering, or None for no limit.
+        :param refresh: If True, ignore the cached catalog and read it again.
+        :return: The rendered schema, or None if no tables/views are found.
+        """
+        with stage_timer("get_schema"):
+            if not refresh and token_budget in self._compact_schema_cache:
+                return self._compact_schema_cache[token_budget]
+
+            with self.lock:
+                if not refresh and token_budget in self._compact_schema_cache:
+                    return self._compact_schema_cache[token_budget]
+
+                if refresh:
+                    self._compact_schema_cache = {}
+
+                catalog = self.get_schema_catalog(refresh=refresh)
+
+                if not catalog:
+                    print("No tables or views found in the 'public' schema.")
+                    return None
+
+                schema, tokens = SchemaRenderer().render(catalog, token_budget)
+                print(
+                    f"Rendered schema of {self.db_name}: {len(catalog)} tables, "
+                    f"{tokens} tokens (budget {token_budget})."
+                )
+
+                self._compact_schema_cache[token_budget] = schema
+                self.schema_tokens[token_budget] = tokens
+
+                return schema
+
+    def get_schema_catalog(self, refresh=False):
+        """
+        Read the structure of every public table and view in a few catalog queries.
+
+        :param refresh: If True, ignore the cached catalog and read it again.
+        :return: A dict mapping each table/view name to its kind, columns (with geometry
+                 type and SRID for spatial columns), primary key, foreign keys and estimated
+                 row count, as expected by `SchemaRenderer`.
+        """
+        if self._schema_catalog is not None and not refresh:
+            return self._schema_catalog
+
+        with self.lock:
+            if self._schema_catalog is not None and not refresh:
+                return self._schema_catalog
+
+            columns = self.execute_query(
+                """
+                SELECT c.table_name, t.table_type, c.column_name, c.data_type, c.udt_name
+                FROM information_schema.columns c
+                JOIN information_schema.tables t
+                  ON t.table_schema = c.table_schema AND t.table_name = c.table_name
+                WHERE c.table_schema = 'public'
+                AND t.table_type IN ('BASE TABLE', 'VIEW')
+                ORDER BY c.table_name, c.ordinal_position;
+                """
+            )
+
+            spatial_types = self._read_spatial_types()
+
+            catalog = {}
+            for table_name, table_type, column_name, data_type, udt_name in columns:
+                table = catalog.setdefault(
+                    table_name,
+                    {
+                        "kind": "view" if table_type == "VIEW" else "table",
+                        "columns": [],
+                        "primary_key": [],
+                        "foreign_keys": [],
+                        "rows": None,
+                    },
+                )
+
+                if data_type == "USER-DEFINED":
+                    data_type = spatial_types.get((table_name, column_name), udt_name)
+                elif data_type == "ARRAY":
+                    data_type = f"{udt_name.lstrip('_')}[]"
+
+                table["columns"].append((column_name, data_type))
+
+            constraints = self.execute_query(
+                """
+                SELECT con.contype, rel.relname,
+                       array_agg(att.attname::text ORDER BY k.ord),
+                       frel.relname,
+                       array_agg(fatt.attname::text ORDER BY k.ord)
+                FROM pg_constraint con
+                JOIN pg_class rel ON rel.oid = con.conrelid
+                JOIN pg_namespace n ON n.oid = rel.relnamespace
+                CROSS JOIN LATERAL unnest(con.conkey) WITH ORDINALITY AS k(attnum, ord)
+                JOIN pg_attribute att
+                  ON att.attrelid = con.conrelid AND att.attnum = k.attnum
+                LEFT JOIN pg_class frel ON frel.oid = con.confrelid
+                LEFT JOIN pg_attribute fatt
+                  ON fatt.attrelid = con.confrelid AND fatt.attnum = con.confkey[k.ord::int]
+                WHERE n.nspname = 'public' AND con.contype IN ('p', 'f')
+                GROUP BY con.oid, con.contype, con.conname, rel.relname, frel.relname
+                ORDER BY rel.relname, con.contype DESC, con.conname;
+                """
+            )
+
+            for kind, table_name, key_columns, ref_table, ref_columns in constraints:
+                if table_name not in catalog:
+                    continue
+                if kind == "p":
+                    catalog[table_name]["primary_key"] = list(key_columns)
+                else:
+                    catalog[table_name]["foreign_keys"].append(
+                        (list(key_columns), ref_table, list(ref_columns))
+                    )
+
+            row_estimates = self.execute_query(
+                """
+                SELECT c.relname, c.reltuples::bigint
+                FROM pg_class c
+                JOIN pg_namespace n ON n.oid = c.relnamespace
+                WHERE n.nspname = 'public' AND c.relkind IN ('r', 'p', 'm');
+                """
+            )
+
+            for table_name, rows in row_estimates:
+                # reltuples is -1 for tables that were never vacuumed or analyzed.
+                if table_name in catalog and rows >= 0:
+                    catalog[table_name]["rows"] = rows
+
+            self._schema_catalog = catalog
+
+            return catalog
+
+    def _read_spatial_types(self):
+        """
+        Read the geometry/geography type and SRID of every spatial column.
+
+        :return: A dict mapping (table_name, column_name) to a type such as
+                 "geometry(MULTIPOLYGON,4326)"; empty if PostGIS is not installed.
+        """
+        spatial_types = {}
+
+        for kind, view in (
+            ("geometry", "geometry_columns"),
+            ("geography", "geography_columns"),
+        ):
+            try:
+                rows = self.execute_query(
+                    f"""
+                    SELECT f_table_name, f_{kind}_column, type, srid
+                    FROM {view}
+                    WHERE f_table_schema = 'public';
+                    """
+                )
+            except Exception:
+                continue
+
+            for table_name, column_name, spatial_type, srid in rows:
+                if spatial_type.upper() in ("GEOMETRY", "GEOGRAPHY") and not srid:
+                    spatial_types[(table_name, column_name)] = kind
+                else:
+                    spatial_types[(table_name, column_name)] = (
+                        f"{kind}({spatial_type},{srid})"
+                    )
+
+        return spatial_types
+
+    @classmethod
+    def open_connections(cls):
+        """
+        :return: The number of connectors with an open database connection.
+        """
+        return sum(
+            1 for instance in list(cls._instance.values()) if instance.connection
+        )
+
     def close(self):
         """
         Close the database connection and cursor if they are active.
 
         :return: True if the connection was successfully closed, False otherwise.
         """
-        if self.connection:
-            self.cursor.close()
-            self.connection.close()
-            self.connection = None
-            self.cursor = None
-            print("Database connection closed.")
-            return True
-        else:
-            print("No active database connection to close.")
-            return False
+        with self._planner_lock:
+            if self._planner is not None:
+                self._planner.close()
+                self._planner = None
+
+        with self.lock:
+            if self.connection:
+                self.cursor.close()
+                self.connection.close()
+                self.connection = None
+                self.cursor = None
+                self._schema_cache = {}
+                self._catalog = None
+                self._schema_catalog = None
+                self._compact_schema_cache = {}
+                self.schema_tokens = {}
+                print("Database connection closed.")
+                return True
+            else:
+                print("No active database connection to close.")
+                return False
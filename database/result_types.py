@@ -0,0 +1,129 @@
+import math
+
+# Result column type of each built-in PostgreSQL type OID (pg_type.oid). Other types,
+# including PostGIS geometry and geography, are sent as text.
+TYPE_NAMES = {
+    16: "boolean",
+    21: "integer",
+    23: "integer",
+    26: "integer",
+    20: "bigint",
+    700: "double",
+    701: "double",
+    1700: "numeric",
+    25: "string",
+    19: "string",
+    1042: "string",
+    1043: "string",
+    1082: "date",
+    1083: "time",
+    1266: "time",
+    1114: "datetime",
+    1184: "datetime",
+    1186: "interval",
+    114: "json",
+    3802: "json",
+    17: "binary",
+}
+
+# Types whose values psycopg2 returns as str already.
+TEXT_OIDS = frozenset((25, 19, 1042, 1043))
+
+
+def column_types(description):
+    """
+    Map the columns of a result to the types used in query responses.
+
+    :param description: The cursor's description (a sequence of column descriptions whose
+                        second item is the type OID), or None for a statement without rows.
+    :return: A list with one of "boolean", "integer", "bigint", "double", "numeric",
+             "string", "date", "time", "datetime", "interval", "json" or "binary" per column.
+             Values of "numeric" columns are decimal strings.
+    """
+    return [TYPE_NAMES.get(column[1], "string") for column in description or []]
+
+
+def _finite(value):
+    """JSON has no NaN or infinity; they become null."""
+    if value is None:
+        return None
+
+    value = float(value)
+
+    return value if math.isfinite(value) else None
+
+
+def _decimal(value):
+    """
+    NUMERIC values are sent as their exact decimal text (without exponent), since a JSON
+    number would be read back as a double and lose digits. NaN and infinities become null.
+    """
+    if value is None or not value.is_finite():
+        return None
+
+    return format(value, "f")
+
+
+def _isoformat(value):
+    return None if value is None else value.isoformat()
+
+
+def _seconds(value):
+    return None if value is None else value.total_seconds()
+
+
+def _hex(value):
+    return None if value is None else "\\x" + bytes(value).hex()
+
+
+def _text(value):
+    return None if value is None else str(value)
+
+
+# Conversion of each type's Python values (as psycopg2 returns them) to JSON values.
+# Booleans, integers and parsed JSON are JSON values already.
+CONVERTERS = {
+    "double": _finite,
+    "numeric": _decimal,
+    "date": _isoformat,
+    "time": _isoformat,
+    "datetime": _isoformat,
+    "interval": _seconds,
+    "binary": _hex,
+}
+
+
+def _converter(type_code):
+    """:return: The conversion function of a column type OID, or None if none is needed."""
+    if type_code in TEXT_OIDS:
+        return None
+
+    if type_code not in TYPE_NAMES:
+        return _text
+
+    return CONVERTERS.get(TYPE_NAMES[type_code])
+
+
+def rows_to_json(rows, description):
+    """
+    Convert fetched rows to lists of JSON values, column by column.
+
+    Each column is converted with one function chosen by its type, and columns that are
+    JSON values already are not touched at all: dates and times become ISO 8601 strings,
+    intervals seconds, numerics exact decimal strings, binary data "\\x"-prefixed hex and other types
+    their text representation.
+
+    :param rows: Rows as returned by the cursor.
+    :param description: The cursor's description of the rows.
+    :return: A list of lists, one per row.
+    """
+    if not rows:
+        return []
+
+    columns = list(zip(*rows))
+    for i, column in enumerate(description):
+        converter = _converter(column[1])
+        if converter is not None:
+            columns[i] = map(converter, columns[i])
+
+    return list(map(list, zip(*columns)))
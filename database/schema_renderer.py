@@ -0,0 +1,234 @@
+import re
+import math
+from config import schema_token_budget, schema_token_budgets
+
+# Short spellings of the PostgreSQL type names reported by information_schema.
+TYPE_ABBREVIATIONS = {
+    "character varying": "varchar",
+    "character": "char",
+    "integer": "int",
+    "smallint": "int2",
+    "bigint": "int8",
+    "double precision": "float8",
+    "real": "float4",
+    "boolean": "bool",
+    "timestamp without time zone": "timestamp",
+    "timestamp with time zone": "timestamptz",
+    "time without time zone": "time",
+    "time with time zone": "timetz",
+}
+
+LEGEND = "# table(column type [PK] [FK>table.column]) ~rows; '+N' = N columns omitted"
+
+TOKEN_PATTERN = re.compile(r"[A-Za-z0-9_]+|[^\sA-Za-z0-9_]")
+
+
+def estimate_tokens(text):
+    """
+    Estimate the number of tokens a text costs.
+
+    Counts identifiers and punctuation separately, with long identifiers costing one token
+    per four characters, which tracks the tokenizers of the supported models closely
+    enough for budgeting without calling the provider.
+
+    :param text: The text to measure.
+    :return: The estimated token count.
+    """
+    return sum(
+        max(1, math.ceil(len(piece) / 4)) for piece in TOKEN_PATTERN.findall(text or "")
+    )
+
+
+def token_budget_for(model_name, default=None):
+    """
+    Return the schema token budget for a model.
+
+    :param model_name: The model name; `SCHEMA_TOKEN_BUDGETS` entries match it exactly or as a prefix.
+    :param default: Budget used when no entry matches (defaults to `SCHEMA_TOKEN_BUDGET`).
+    :return: The token budget.
+    """
+    if model_name in schema_token_budgets:
+        return schema_token_budgets[model_name]
+
+    for prefix, budget in sorted(
+        schema_token_budgets.items(), key=lambda i: -len(i[0])
+    ):
+        if model_name and model_name.startswith(prefix):
+            return budget
+
+    return default if default is not None else schema_token_budget
+
+
+def abbreviate_type(data_type):
+    """
+    :param data_type: A PostgreSQL type name as reported by information_schema.
+    :return: Its short spelling.
+    """
+    return TYPE_ABBREVIATIONS.get(data_type, data_type)
+
+
+class SchemaRenderer:
+    """
+    Renders a schema catalog into a dense, deterministic text for prompts.
+
+    The catalog maps each table or view name to a dict with:
+    - "kind": "table" or "view"
+    - "columns": list of (column_name, type) in ordinal order; spatial columns carry
+      their full type, e.g. "geometry(MULTIPOLYGON,4326)"
+    - "primary_key": list of column names
+    - "foreign_keys": list of (columns, referenced_table, referenced_columns)
+    - "rows": estimated row count, or None
+
+    When the rendering exceeds the token budget, details are dropped from the least
+    to the most relevant: row estimates, types of plain columns, plain columns of views,
+    plain columns of tables, and finally whole tables (views and tables without a
+    spatial column first), whose names are still listed while they fit.
+    """
+
+    def __init__(self, token_counter=estimate_tokens):
+        """
+        :param token_counter: Callable (text) -> token count used to enforce the budget.
+        """
+        self.token_counter = token_counter
+
+    def render(self, catalog, token_budget=None):
+        """
+        Render a catalog within a token budget.
+
+        :param catalog: The schema catalog (see the class docstring).
+        :param token_budget: Maximum number of tokens, or None for no limit.
+        :return: A tuple (schema_text, token_count).
+        """
+        names = sorted(catalog)
+
+        for level in range(5):
+            text = self._render_tables(catalog, names, level)
+            tokens = self.token_counter(text)
+
+            if token_budget is None or tokens <= token_budget:
+                return text, tokens
+
+        return self._render_truncated(catalog, token_budget)
+
+    def _render_tables(self, catalog, names, level):
+        lines = [LEGEND]
+        lines.extend(self._render_table(name, catalog[name], level) for name in names)
+
+        return "\n".join(lines)
+
+    def _render_truncated(self, catalog, token_budget):
+        """Keep the most relevant tables at the lowest detail level and list the rest by name."""
+        ranked = sorted(catalog, key=lambda name: (-_relevance(catalog[name]), name))
+
+        # Under a tight budget the legend is the first thing to go.
+        legend_tokens = self.token_counter(LEGEND)
+        if legend_tokens * 4 <= token_budget:
+            lines, tokens = [LEGEND], legend_tokens
+        else:
+            lines, tokens = [], 0
+
+        # Room for the "# N more tables omitted" footer.
+        reserve = self.token_counter(f"# {len(ranked)} more tables omitted")
+        omitted = []
+
+        for name in ranked:
+            line = self._render_table(name, catalog[name], 4)
+            line_tokens = self.token_counter(line)
+
+            if not omitted and tokens + line_tokens + reserve <= token_budget:
+                lines.append(line)
+                tokens += line_tokens
+            else:
+                omitted.append(name)
+
+        if omitted:
+            # List as many omitted names as still fit; each costs its tokens plus a comma.
+            available = token_budget - tokens
+            available -= self.token_counter(f"# {len(omitted)} more: , ...")
+            listed = []
+            for name in omitted:
+                available -= self.token_counter(name) + 1
+                if available < 0:
+                    break
+                listed.append(name)
+
+            if not listed:
+                lines.append(f"# {len(omitted)} more tables omitted")
+            else:
+                more = ", ..." if len(listed) < len(omitted) else ""
+                lines.append(f"# {len(omitted)} more: {', '.join(listed)}{more}")
+
+        text = "\n".join(lines)
+
+        return text, self.token_counter(text)
+
+    def _render_table(self, name, table, level):
+        """
+        Render one table on one line.
+
+        :param level: 0 = everything, 1 = no row estimate, 2 = plain columns without types,
+                      3 = views reduced to key and spatial columns, 4 = every table reduced.
+        """
+        primary_key = set(table.get("primary_key") or [])
+        foreign_keys = table.get("foreign_keys") or []
+
+        single_fks = {
+            columns[0]: f"{ref_table}.{ref_columns[0]}"
+            for columns, ref_table, ref_columns in foreign_keys
+            if len(columns) == 1
+        }
+        keys = primary_key | set(single_fks)
+        for columns, _, _ in foreign_keys:
+            keys.update(columns)
+
+        reduced = level >= 4 or (level >= 3 and table.get("kind") == "view")
+
+        parts = []
+        omitted = 0
+
+        for column_name, data_type in table.get("columns") or []:
+            spatial = _is_spatial(data_type)
+            key = column_name in keys
+
+            if reduced and not (key or spatial):
+                omitted += 1
+                continue
+
+            part = column_name
+            if level < 2 or key or spatial:
+                part += f" {abbreviate_type(data_type)}"
+            if column_name in primary_key:
+                part += " PK"
+            if column_name in single_fks:
+                part += f" FK>{single_fks[column_name]}"
+
+            parts.append(part)
+
+        if omitted:
+            parts.append(f"+{omitted}")
+
+        for columns, ref_table, ref_columns in foreign_keys:
+            if len(columns) > 1:
+                parts.append(
+                    f"FK({','.join(columns)})>{ref_table}({','.join(ref_columns)})"
+                )
+
+        prefix = "view " if table.get("kind") == "view" else ""
+        line = f"{prefix}{name}({', '.join(parts)})"
+
+        rows = table.get("rows")
+        if level < 1 and rows is not None and rows >= 0:
+            line += f" ~{rows}"
+
+        return line
+
+
+def _is_spatial(data_type):
+    return data_type.startswith(("geometry", "geography", "raster"))
+
+
+def _relevance(table):
+    """Rank tables for truncation: spatial tables first, then tables before views."""
+    spatial = any(_is_spatial(data_type) for _, data_type in table.get("columns") or [])
+
+    return (2 if spatial else 0) + (1 if table.get("kind") != "view" else 0)
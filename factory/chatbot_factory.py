@@ -1,10 +1,5 @@
+import importlib
 from enum import Enum
-from chatbot import (
-    BaseChatbot,
-    GeminiTextChatbot,
-    GeminiVisionChatbot,
-    OllamaTextChatbot,
-)
 
 
 class ChatbotType(Enum):
@@ -13,6 +8,21 @@ class ChatbotType(Enum):
     GEMINI_TEXT = "gemini_text"
     GEMINI_VISION = "gemini_vision"
     OLLAMA_TEXT = "ollama_text"
+    HEDGED_TEXT = "hedged_text"
+    FAKE_TEXT = "fake_text"
+    FAKE_VISION = "fake_vision"
+
+
+# Module and class implementing each chatbot type. Modules are imported when a chatbot of
+# their type is first created, so only the providers a deployment uses are loaded.
+CHATBOT_CLASSES = {
+    ChatbotType.GEMINI_TEXT: ("chatbot.gemini_text_chatbot", "GeminiTextChatbot"),
+    ChatbotType.GEMINI_VISION: ("chatbot.gemini_vision", "GeminiVisionChatbot"),
+    ChatbotType.OLLAMA_TEXT: ("chatbot.ollama_text", "OllamaTextChatbot"),
+    ChatbotType.HEDGED_TEXT: ("chatbot.hedged_chatbot", "HedgedTextChatbot"),
+    ChatbotType.FAKE_TEXT: ("chatbot.fake_llm", "FakeTextChatbot"),
+    ChatbotType.FAKE_VISION: ("chatbot.fake_llm", "FakeVisionChatbot"),
+}
 
 
 class ChatbotFactory:
@@ -20,6 +30,22 @@ class ChatbotFactory:
     Factory class to create chatbot instances based on type.
     """
 
+    @staticmethod
+    def chatbot_class(chatbot_type: ChatbotType):
+        """
+        Resolve the class implementing a chatbot type, importing its module on first use.
+        :param chatbot_type: Type of chatbot (e.g., ChatbotType.GEMINI_TEXT).
+        :return: The chatbot class.
+        """
+        if chatbot_type not in CHATBOT_CLASSES:
+            raise ValueError(
+                f"Unknown chatbot type: {chatbot_type}, the supported type is 'gemini_text', 'gemini_vision', 'ollama_text', 'hedged_text', 'fake_text', 'fake_vision'."
+            )
+
+        module_name, class_name = CHATBOT_CLASSES[chatbot_type]
+
+        return getattr(importlib.import_module(module_name), class_name)
+
     @staticmethod
     def create_chatbot(chatbot_type: ChatbotType, database_connector, model_name):
         """
@@ -28,14 +54,6 @@ class ChatbotFactory:
         :param database_connector: An instance of the database connector.
         :return: An instance of a chatbot.
         """
+        chatbot_class = ChatbotFactory.chatbot_class(chatbot_type)
 
-        if chatbot_type == chatbot_type.GEMINI_TEXT:
-            return GeminiTextChatbot(database_connector, model_name)
-        elif chatbot_type == chatbot_type.GEMINI_VISION:
-            return GeminiVisionChatbot(database_connector, model_name)
-        elif chatbot_type == chatbot_type.OLLAMA_TEXT:
-            return OllamaTextChatbot(database_connector, model_name)
-        else:
-            raise ValueError(
-                f"Unknown chatbot type: {chatbot_type}, the supported type is 'gemini_text', 'gemini_vision', 'ollama_text'."
-            )
+        return chatbot_class(database_connector, model_name)
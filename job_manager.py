@@ -0,0 +1,463 @@
+import sys
+import math
+import time
+import uuid
+import asyncio
+import threading
+from contextlib import closing, nullcontext
+from concurrent.futures import ThreadPoolExecutor
+from chatbot.concurrency import QueueFull
+from database import column_types
+from metrics import registry, Counter, Histogram
+from config import (
+    job_workers,
+    job_max_queue,
+    job_batch_size,
+    job_max_rows,
+    job_result_ttl,
+    session_reap_interval,
+)
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+jobs_finished = registry.register(
+    Counter(
+        "spatialmind_jobs_total",
+        "Finished query jobs, by final status.",
+        ["status"],
+    )
+)
+
+job_seconds = registry.register(
+    Histogram(
+        "spatialmind_job_seconds",
+        "Time from submitting a query job until it finished, by final status.",
+        ["status"],
+        buckets=(0.1, 0.5, 1.0, 5.0, 10.0, 30.0, 60.0, 300.0, 900.0, 3600.0),
+    )
+)
+
+
+def _row_bytes(row):
+    """:return: The memory held by the values of a row, in bytes."""
+    return sum(sys.getsizeof(value) for value in row)
+
+
+class JobCancelled(Exception):
+    """Raised inside a job's worker thread when the job was cancelled."""
+
+
+class Job:
+    """
+    A query submitted for background execution.
+
+    The worker thread appends rows as they are fetched, so `rows` can be read in pages
+    while the job is still running; `rows_fetched` is its progress.
+    """
+
+    def __init__(self, session_id, database, query, on_finish=None, admit=None):
+        """
+        :param session_id: The session that submitted the query.
+        :param database: The session's database connector.
+        :param query: The SQL query.
+        :param on_finish: Optional callable (job) run in the worker thread once the job
+                          succeeded or failed.
+        :param admit: Optional callable returning a context manager (such as an admission
+                      slot) held while the job runs.
+        """
+        self.job_id = uuid.uuid4().hex
+        self.session_id = session_id
+        self.database = database
+        self.query = query
+        self.on_finish = on_finish
+        self.admit = admit
+
+        # The connection the job runs on, opened by the worker.
+        self.connector = None
+
+        self.status = QUEUED
+        self.description = []
+        self.rows = []
+        self.bytes = 0
+        self.truncated = False
+        self.error = None
+
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+
+        self.done = threading.Event()
+        self.cancelled = threading.Event()
+
+        # Whether the worker is inside a statement that only the server can interrupt.
+        self._executing = False
+        self._lock = threading.Lock()
+
+    def keep(self, rows):
+        """Append fetched rows and account the memory their values hold."""
+        self.rows.extend(rows)
+        self.bytes += sum(_row_bytes(row) for row in rows)
+
+    def shrink(self, max_bytes):
+        """
+        Drop the last rows of a finished job until the kept ones hold at most `max_bytes`;
+        the job is then marked truncated.
+
+        :param max_bytes: Bytes the job may keep (0 drops every row).
+        :return: The number of bytes freed.
+        """
+        kept = 0
+        count = 0
+        for row in self.rows:
+            size = _row_bytes(row)
+            if kept + size > max_bytes:
+                break
+            kept += size
+            count += 1
+
+        if count == len(self.rows):
+            return 0
+
+        freed = self.bytes - kept
+        self.rows = self.rows[:count]
+        self.bytes = kept
+        self.truncated = True
+
+        return freed
+
+    @property
+    def rows_fetched(self):
+        return len(self.rows)
+
+    @property
+    def column_names(self):
+        return [column[0] for column in self.description]
+
+    def info(self, ttl=job_result_ttl):
+        """
+        :param ttl: Seconds a finished job is kept.
+        :return: A dict with the job's id, session, status, progress, columns, error and
+                 its creation, start, end and expiry times (Unix time).
+        """
+        return {
+            "job_id": self.job_id,
+            "session_id": self.session_id,
+            "status": self.status,
+            "rows_fetched": self.rows_fetched,
+            "column_names": self.column_names,
+            "column_types": column_types(self.description),
+            "truncated": self.truncated,
+            "error": self.error,
+            "created": self.created,
+            "started": self.started,
+            "finished": self.finished,
+            "expires": self.finished + ttl if self.finished and ttl else None,
+        }
+
+
+class JobManager:
+    """
+    Runs queries on a pool of worker threads and keeps their results for a while.
+
+    Each job runs on its own database connection, so a long query does not hold up the
+    statements and schema reads of other sessions on the shared connector. Rows are
+    read from a server-side cursor in batches of `batch_size`, so progress is
+    visible and a cancelled job stops at the next batch; a statement still executing on
+    the server is interrupted with a cancel request. At most `max_rows` rows are kept
+    per job, the rest are dropped and the job is marked truncated. Finished jobs are
+    removed `result_ttl` seconds after they finished.
+
+    Jobs live in the memory of the worker process that runs them, so with several API
+    workers, a client must poll the worker it submitted to.
+    """
+
+    def __init__(
+        self,
+        workers=job_workers,
+        max_queue=job_max_queue,
+        batch_size=job_batch_size,
+        max_rows=job_max_rows,
+        result_ttl=job_result_ttl,
+    ):
+        """
+        :param workers: Number of worker threads.
+        :param max_queue: Maximum number of jobs waiting for a worker (0 for no bound).
+        :param batch_size: Rows fetched per round trip.
+        :param max_rows: Maximum number of rows kept per job (0 for no limit).
+        :param result_ttl: Seconds finished jobs are kept (0 to keep them until removed).
+        """
+        self.name = "jobs"
+        self.workers = max(1, int(workers))
+        self.max_queue = max_queue
+        self.batch_size = max(1, int(batch_size))
+        self.max_rows = max_rows
+        self.result_ttl = result_ttl
+
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(
+            max_workers=self.workers, thread_name_prefix="spatialmind-job"
+        )
+
+        self.seconds_total = 0.0
+        self.finished = 0
+
+    def submit(self, session_id, database, query, on_finish=None, admit=None):
+        """
+        Queue a query for execution.
+
+        :param session_id: The session that submits the query.
+        :param database: The session's database connector.
+        :param query: The SQL query.
+        :param on_finish: Optional callable (job) run once the job succeeded or failed.
+        :param admit: Optional callable returning a context manager held while the job
+                      runs; a job it rejects with QueueFull fails.
+        :return: The new Job.
+        :raises QueueFull: If `max_queue` jobs are already waiting for a worker.
+        """
+        job = Job(session_id, database, query, on_finish, admit)
+
+        with self._lock:
+            queued = sum(1 for other in self._jobs.values() if other.status == QUEUED)
+            if self.max_queue and queued >= self.max_queue:
+                # Each worker frees up after an average job; the queue drains that fast.
+                average = self.seconds_total / self.finished if self.finished else 1.0
+                raise QueueFull(
+                    self, max(1, math.ceil(average * (queued + 1) / self.workers))
+                )
+
+            self._jobs[job.job_id] = job
+
+        self._pool.submit(self._run, job)
+
+        return job
+
+    def _run(self, job):
+        """Execute a job in a worker thread."""
+        try:
+            with job.admit() if job.admit is not None else nullcontext():
+                self._execute(job)
+        except QueueFull as e:
+            job.error = str(e)
+            self._finish(job, FAILED)
+
+    def _execute(self, job):
+        """Execute an admitted job."""
+        if job.cancelled.is_set():
+            return self._finish(job, CANCELLED)
+
+        job.status = RUNNING
+        job.started = time.time()
+
+        try:
+            # Each job runs on its own connection: it never holds the shared connector's
+            # lock, which other sessions need for their statements and schema reads, and a
+            # cancel request can only interrupt this job's statements.
+            job.connector = job.database.dedicated()
+            if job.connector is None:
+                raise ConnectionError("Failed to connect to the database.")
+
+            try:
+                self._fetch(job)
+            finally:
+                with job._lock:
+                    job._executing = False
+                job.connector.close()
+        except Exception as e:
+            if job.cancelled.is_set():
+                return self._finish(job, CANCELLED)
+
+            job.error = str(e)
+            return self._finish(job, FAILED)
+
+        self._finish(job, SUCCEEDED)
+
+    def _fetch(self, job):
+        """Read the rows of a job batch by batch until done, cancelled or truncated."""
+        if job.cancelled.is_set():
+            raise JobCancelled()
+
+        batches = job.connector.iterate_query(job.query, self.batch_size)
+
+        with closing(batches):
+            with job._lock:
+                job._executing = True
+
+            for description, rows in batches:
+                with job._lock:
+                    job._executing = False
+
+                if job.cancelled.is_set():
+                    raise JobCancelled()
+
+                job.description = description
+
+                if self.max_rows and job.rows_fetched + len(rows) > self.max_rows:
+                    job.keep(rows[: self.max_rows - job.rows_fetched])
+                    job.truncated = True
+                    return
+
+                job.keep(rows)
+
+                with job._lock:
+                    job._executing = True
+
+    def _finish(self, job, status):
+        job.status = status
+        job.finished = time.time()
+
+        seconds = job.finished - job.created
+        with self._lock:
+            self.seconds_total += seconds
+            self.finished += 1
+
+        jobs_finished.inc(status=status)
+        job_seconds.observe(seconds, status=status)
+
+        if job.on_finish is not None and status != CANCELLED:
+            try:
+                job.on_finish(job)
+            except Exception as e:
+                print(f"Job {job.job_id} callback failed: {e}")
+
+        job.done.set()
+
+    def get(self, job_id):
+        """
+        :param job_id: The job id.
+        :return: The Job, or None if it does not exist (or has expired).
+        """
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def jobs(self, session_id=None):
+        """
+        :param session_id: Only list the jobs of this session, if given.
+        :return: The jobs, oldest first.
+        """
+        with self._lock:
+            jobs = list(self._jobs.values())
+
+        return [
+            job for job in jobs if session_id is None or job.session_id == session_id
+        ]
+
+    def active(self, session_id):
+        """
+        :param session_id: The session id.
+        :return: Whether the session has a queued or running job.
+        """
+        return any(not job.done.is_set() for job in self.jobs(session_id))
+
+    def retained_bytes(self, session_id):
+        """
+        :param session_id: The session id.
+        :return: The estimated size of the rows kept by the session's jobs, in bytes.
+        """
+        return sum(job.bytes for job in self.jobs(session_id))
+
+    def release(self, session_id, nbytes):
+        """
+        Free memory held by a session's finished jobs: the rows of its oldest results
+        are dropped first, and the last one needed is truncated rather than dropped.
+        Rows of running jobs are left alone (`max_rows` bounds them).
+
+        :param session_id: The session id.
+        :param nbytes: The number of bytes to free.
+        :return: The number of bytes freed.
+        """
+        freed = 0
+        for job in self.jobs(session_id):
+            if freed >= nbytes:
+                break
+            if job.done.is_set():
+                freed += job.shrink(max(0, job.bytes - (nbytes - freed)))
+
+        return freed
+
+    def cancel(self, job_id):
+        """
+        Cancel a queued or running job. A running statement is interrupted on the server;
+        rows fetched so far are kept.
+
+        :param job_id: The job id.
+        :return: The Job, or None if it does not exist.
+        """
+        job = self.get(job_id)
+        if job is None or job.done.is_set():
+            return job
+
+        job.cancelled.set()
+
+        with job._lock:
+            if job._executing:
+                job.connector.cancel()
+
+        return job
+
+    def remove(self, job_id):
+        """
+        Cancel a job if it is still active and forget it.
+
+        :param job_id: The job id.
+        :return: True if the job existed, False otherwise.
+        """
+        job = self.cancel(job_id)
+        if job is None:
+            return False
+
+        with self._lock:
+            self._jobs.pop(job_id, None)
+
+        return True
+
+    def reap(self):
+        """
+        Remove the jobs that finished more than `result_ttl` seconds ago.
+
+        :return: The ids of the removed jobs.
+        """
+        if not self.result_ttl:
+            return []
+
+        deadline = time.time() - self.result_ttl
+
+        with self._lock:
+            expired = [
+                job_id
+                for job_id, job in self._jobs.items()
+                if job.finished is not None and job.finished < deadline
+            ]
+            for job_id in expired:
+                del self._jobs[job_id]
+
+        return expired
+
+    async def run_reaper(self, interval=session_reap_interval):
+        """
+        Periodically remove expired jobs; runs until cancelled.
+
+        :param interval: Seconds between two checks.
+        :return: None
+        """
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                self.reap()
+            except Exception as e:
+                print(f"Job reaper failed: {e}")
+
+    def close(self):
+        """
+        Cancel every active job and stop the worker threads.
+
+        :return: None
+        """
+        for job in self.jobs():
+            self.cancel(job.job_id)
+
+        self._pool.shutdown(wait=False, cancel_futures=True)
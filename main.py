@@ -1,15 +1,210 @@
+import time
+import asyncio
+from collections import OrderedDict
 import uvicorn
 from dotenv import load_dotenv
-from pydantic import BaseModel
-from fastapi import FastAPI, HTTPException
-from typing import Optional, Dict, List, Any
+from pydantic import BaseModel, Field
+from fastapi import (
+    FastAPI,
+    HTTPException,
+    UploadFile,
+    File,
+    Request,
+    Query,
+    WebSocket,
+)
+from fastapi.responses import PlainTextResponse, JSONResponse
+from typing import Optional, Dict, List, Any, Union
 from factory import ChatbotFactory, DatabaseFactory, ChatbotType, DatabaseType
+from chatbot.candidates import agenerate_candidates
+from chatbot.image_store import image_store
+from chatbot.image_preprocessing import sniff_mime_type, run_in_image_pool
+from chatbot.ollama_runtime import awarm_up_models, gate_stats
+from chatbot.client_registry import ClientRegistry
+from chatbot.concurrency import QueueFull
+from chatbot.single_flight import chat_flights
+from chatbot.example_store import get_example_store, database_key, normalize_sql
+from chatbot.sql_utils import extract_sql_query
+from chatbot.token_stream import stream_tokens
+from database import PostgresqlDBConnector, column_types, returns_rows
+from session_manager import SessionManager
+from session_store import create_session_store
+from admission import llm_admission, db_admission, job_admission, admission_stats
+from job_manager import JobManager
+from cursor_manager import CursorManager
+from response_encoding import json_response, rows_response, rows_text
+from websocket_channel import Channel
+from metrics import (
+    registry,
+    Gauge,
+    request_seconds,
+    collect_timings,
+    stage_timer,
+    timed,
+)
+from config import max_image_upload_bytes, ollama_preload_models, max_page_size
 
 load_dotenv()
 
 app = FastAPI(title="Spatial Mind")
 
-sessions: Dict[str, dict] = {}
+DATABASE_TYPES = {"postgresql": DatabaseType.POSTGRESQL}
+
+CHATBOT_TYPES = {
+    "gemini_text": ChatbotType.GEMINI_TEXT,
+    "gemini_vision": ChatbotType.GEMINI_VISION,
+    "ollama_text": ChatbotType.OLLAMA_TEXT,
+    "hedged_text": ChatbotType.HEDGED_TEXT,
+    "fake_text": ChatbotType.FAKE_TEXT,
+    "fake_vision": ChatbotType.FAKE_VISION,
+}
+
+
+def _open_session(config):
+    """
+    Open the database connector and create the chatbot of a session.
+
+    :param config: Dict with "database_config", "chatbot_type" and "model_name", as
+                   given to /initialize (and saved in the session store).
+    :return: A tuple (database, chatbot).
+    """
+    database_config = config["database_config"]
+
+    database = DatabaseFactory.get_database_connector(
+        db_type=DATABASE_TYPES[database_config["db_type"].lower()],
+        db_name=database_config["db_name"],
+        db_user=database_config["db_user"],
+        db_password=database_config["db_password"],
+        db_host=database_config["db_host"],
+        db_port=database_config["db_port"],
+    )
+
+    database.connect()
+
+    chatbot = ChatbotFactory.create_chatbot(
+        chatbot_type=CHATBOT_TYPES[config["chatbot_type"].lower()],
+        database_connector=database,
+        model_name=config["model_name"],
+    )
+
+    return database, chatbot
+
+
+jobs = JobManager()
+
+cursors = CursorManager()
+
+
+def _stop_session_work(session_id):
+    """Discard a session's jobs (cancelling the active ones) and close its cursors."""
+    for job in jobs.jobs(session_id):
+        jobs.remove(job.job_id)
+    cursors.close_session(session_id)
+
+
+# With SESSION_STORE set, sessions are shared through the store and every worker
+# rebuilds the ones it serves; jobs, cursors and images are not shared, so the workers
+# must sit behind sticky routing (see config.py). Every way a session is dropped (delete, idle expiry, LRU
+# or memory eviction) stops its jobs and cursors, and the rows its jobs keep count
+# toward its memory limits.
+sessions = SessionManager(
+    store=create_session_store(),
+    builder=_open_session,
+    on_close=_stop_session_work,
+    retained_bytes=jobs.retained_bytes,
+    release_retained=jobs.release,
+    busy=jobs.active,
+)
+
+background_tasks = set()
+
+# Generated queries remembered per session until they are executed.
+MAX_GENERATED_QUERIES = 20
+
+# Longest a GET /jobs/{job_id} request waits for the job to finish, and how often it checks.
+MAX_JOB_WAIT = 30.0
+JOB_POLL_INTERVAL = 0.1
+MAX_JOB_PAGE = 10000
+
+# Page size of a continuation request that does not give one.
+DEFAULT_PAGE_SIZE = 1000
+
+registry.register(
+    Gauge(
+        "spatialmind_sessions",
+        "Number of active chatbot sessions.",
+        function=lambda: len(sessions),
+    )
+)
+registry.register(
+    Gauge(
+        "spatialmind_session_bytes",
+        "Accounted memory of the sessions (conversation history and remembered queries).",
+        function=sessions.total_bytes,
+    )
+)
+registry.register(
+    Gauge(
+        "spatialmind_database_connections",
+        "Number of open database connections (shared by sessions on the same database).",
+        function=PostgresqlDBConnector.open_connections,
+    )
+)
+registry.register(
+    Gauge(
+        "spatialmind_schema_tokens",
+        "Estimated tokens of each rendered schema, by database and token budget.",
+        ["database", "budget"],
+        function=lambda: {
+            (connector.db_name, str(budget)): tokens
+            for connector in list(PostgresqlDBConnector._instance.values())
+            for budget, tokens in list(connector.schema_tokens.items())
+        },
+    )
+)
+registry.register(
+    Gauge(
+        "spatialmind_llm_clients",
+        "Number of shared LLM clients.",
+        function=ClientRegistry.client_count,
+    )
+)
+registry.register(
+    Gauge(
+        "spatialmind_websocket_connections",
+        "Number of connected WebSocket channels.",
+        function=Channel.open_channels,
+    )
+)
+registry.register(
+    Gauge(
+        "spatialmind_image_store_bytes",
+        "Bytes held by the image store.",
+        function=lambda: image_store.stats()["bytes"],
+    )
+)
+registry.register(
+    Gauge(
+        "spatialmind_ollama_requests",
+        "Requests holding or waiting for a slot of a local Ollama model.",
+        ["model", "state"],
+        function=lambda: {
+            (model_name, state): stats[state]
+            for model_name, stats in gate_stats().items()
+            for state in ("active", "queued")
+        },
+    )
+)
+registry.register(
+    Gauge(
+        "spatialmind_coalesced_calls",
+        "Model calls made and calls shared by identical concurrent requests.",
+        ["kind"],
+        function=lambda: {
+            (kind,): value for kind, value in chat_flights.stats().items()
+        },
+    )
+)
 
 
 class DatabaseConfig(BaseModel):
@@ -24,17 +219,24 @@ class DatabaseConfig(BaseModel):
 class TextChatRequest(BaseModel):
     session_id: str
     message: str
+    candidates: int = 1
+    timings: bool = False
 
 
 class VisionChatRequest(BaseModel):
     session_id: str
     message: str
-    image: str
+    image: Optional[str] = None
+    image_id: Optional[str] = None
+    candidates: int = 1
+    timings: bool = False
 
 
 class ExecuteQueryRequest(BaseModel):
     session_id: str
-    query: str
+    query: str = ""
+    page_size: Optional[int] = Field(None, ge=1, le=max_page_size)
+    continuation: Optional[str] = None
 
 
 class ChatbotInitRequest(BaseModel):
@@ -44,9 +246,20 @@ class ChatbotInitRequest(BaseModel):
     model_name: str = "gemini-2.5-pro"
 
 
+class CandidateInfo(BaseModel):
+    model_name: str
+    temperature: float
+    query: Optional[str] = None
+    cost: Optional[float] = None
+    rows: Optional[float] = None
+    error: Optional[str] = None
+
+
 class ChatResponse(BaseModel):
     session_id: str
     response: str
+    candidates: Optional[List[CandidateInfo]] = None
+    timings: Optional[Dict[str, float]] = None
 
 
 class QueryExecutionResponse(BaseModel):
@@ -54,8 +267,45 @@ class QueryExecutionResponse(BaseModel):
     success: bool
     rows: List[List[Any]]
     column_names: List[str]
+    column_types: List[str]
     row_count: int
     error: Optional[str] = None
+    continuation: Optional[str] = None
+
+
+class JobRequest(BaseModel):
+    session_id: str
+    query: str
+
+
+class StreamQueryRequest(JobRequest):
+    chunk_size: int = Field(DEFAULT_PAGE_SIZE, ge=1, le=MAX_JOB_PAGE)
+
+
+class JobInfo(BaseModel):
+    job_id: str
+    session_id: str
+    status: str
+    rows_fetched: int
+    column_names: List[str]
+    column_types: List[str]
+    truncated: bool
+    error: Optional[str] = None
+    created: float
+    started: Optional[float] = None
+    finished: Optional[float] = None
+    expires: Optional[float] = None
+
+
+class JobRowsResponse(BaseModel):
+    job_id: str
+    status: str
+    offset: int
+    rows: List[List[Any]]
+    column_names: List[str]
+    column_types: List[str]
+    rows_fetched: int
+    next_offset: Optional[int] = None
 
 
 class StatusResponse(BaseModel):
@@ -63,6 +313,47 @@ class StatusResponse(BaseModel):
     message: str
 
 
+class SessionInfo(BaseModel):
+    session_id: str
+    chatbot_type: str
+    created: float
+    last_used: float
+    idle_seconds: float
+    history_messages: int
+    bytes: int
+
+
+class ImageUploadResponse(BaseModel):
+    image_id: str
+    size: int
+    mime_type: str
+
+
+@app.middleware("http")
+async def record_request_time(request: Request, call_next):
+    started = time.perf_counter()
+    response = await call_next(request)
+
+    route = request.scope.get("route")
+    request_seconds.observe(
+        time.perf_counter() - started,
+        method=request.method,
+        route=route.path if route is not None else "unmatched",
+        status=response.status_code,
+    )
+
+    return response
+
+
+@app.exception_handler(QueueFull)
+async def reject_when_busy(request: Request, exc: QueueFull):
+    return JSONResponse(
+        status_code=429,
+        content={"detail": f"Server is busy: {exc}"},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+
 @app.get("/")
 async def root():
     return {
@@ -71,89 +362,196 @@ async def root():
             "POST /initialize": "Initialize a chatbot session with database config",
             "POST /chat/text": "Send a message to the chatbot",
             "POST /chat/vision": "Send a message with an image to the chatbot",
-            "POST /execute": "Execute a SQL query",
+            "POST /images": "Upload an image once and reference it by id in /chat/vision",
+            "POST /execute": "Execute a SQL query (page_size and continuation for pages)",
+            "DELETE /execute/{continuation}": "Discard the remaining pages of a result",
+            "POST /jobs": "Execute a SQL query in the background and return a job id",
+            "GET /jobs/{job_id}": "Job status and progress (wait=seconds waits for the end)",
+            "GET /jobs/{job_id}/rows": "A page of a job's rows (offset, limit)",
+            "POST /jobs/{job_id}/cancel": "Cancel a job",
+            "DELETE /jobs/{job_id}": "Cancel a job and discard its results",
             "DELETE /session/{session_id}": "Close a session",
+            "WS /ws/{session_id}": "Chat, execute and cancel over one connection, with streamed tokens and rows",
+            "GET /sessions": "List sessions (details=true adds last use and size)",
+            "GET /metrics": "Prometheus metrics (stage latencies, tokens, sessions)",
+            "GET /models/ollama": "Queue depth and wait times of the local Ollama models",
+            "GET /admission": "Concurrency limits, queue depth and rejections of LLM and DB work",
         },
     }
 
 
+async def _initialize_session(request):
+    """Open a new session; shared by /initialize and the WebSocket channel."""
+    if await sessions.acontains(request.session_id):
+        raise HTTPException(
+            status_code=400, detail=f"Session {request.session_id} already exists."
+        )
+
+    db_type = DATABASE_TYPES.get(request.database_config.db_type.lower())
+    if not db_type:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unsupported database type: {request.database_config.db_type}",
+        )
+
+    chatbot_type = CHATBOT_TYPES.get(request.chatbot_type.lower())
+    if not chatbot_type:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unsupported chatbot type: {request.chatbot_type}",
+        )
+
+    config = {
+        "database_config": request.database_config.model_dump(),
+        "chatbot_type": request.chatbot_type,
+        "model_name": request.model_name,
+    }
+
+    database, chatbot = await asyncio.to_thread(_open_session, config)
+
+    await asyncio.to_thread(sessions.add, request.session_id, database, chatbot, config)
+
+    return StatusResponse(
+        status="success",
+        message=f"Session {request.session_id} initialized successfully.",
+    )
+
+
 @app.post("/initialize", response_model=StatusResponse)
 async def initialize_chatbot(request: ChatbotInitRequest):
     try:
-        if request.session_id in sessions:
-            raise HTTPException(
-                status_code=400, detail=f"Session {request.session_id} already exists."
-            )
+        return await _initialize_session(request)
 
-        db_type_map = {"postgresql": DatabaseType.POSTGRESQL}
-        chat_type_map = {
-            "gemini_text": ChatbotType.GEMINI_TEXT,
-            "gemini_vision": ChatbotType.GEMINI_VISION,
-            "ollama_text": ChatbotType.OLLAMA_TEXT,
-        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
 
-        db_type = db_type_map.get(request.database_config.db_type.lower())
-        if not db_type:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Unsupported database type: {request.database_config.db_type}",
-            )
 
-        chatbot_type = chat_type_map.get(request.chatbot_type.lower())
-        if not chatbot_type:
-            raise HTTPException(
-                status_code=400,
-                detail=f"Unsupported chatbot type: {request.chatbot_type}",
-            )
+async def _chat(chatbot, input, candidates=1):
+    """
+    Run a chat turn, optionally generating several candidate queries concurrently.
 
-        database = DatabaseFactory.get_database_connector(
-            db_type=db_type,
-            db_name=request.database_config.db_name,
-            db_user=request.database_config.db_user,
-            db_password=request.database_config.db_password,
-            db_host=request.database_config.db_host,
-            db_port=request.database_config.db_port,
+    :return: A tuple (response, candidates, timings); candidates is None in single-answer
+             mode and timings maps each stage to the seconds spent in it.
+    """
+    with collect_timings() as timings, stage_timer("chat"):
+        if candidates <= 1:
+            response, candidate_list = await chatbot.achat(input), None
+        else:
+            response, candidate_list = await agenerate_candidates(
+                chatbot, input, candidates
+            )
+            candidate_list = [
+                CandidateInfo(**candidate) for candidate in candidate_list
+            ]
+
+    return response, candidate_list, timings
+
+
+def _remember_generated(session, response, candidates):
+    """
+    Remember the question each generated query answered, so executing the query
+    can be recorded in the example store.
+    """
+    if get_example_store() is None or response is None:
+        return
+
+    history = session["chatbot"].get_history()
+    question = history[-2].content if len(history) >= 2 else None
+    if not isinstance(question, str):
+        return
+
+    generated = session.setdefault("generated", OrderedDict())
+    queries = [extract_sql_query(response)]
+    queries += [candidate.query for candidate in candidates or []]
+
+    for query in queries:
+        if query:
+            key = normalize_sql(query)
+            generated[key] = question
+            generated.move_to_end(key)
+
+    while len(generated) > MAX_GENERATED_QUERIES:
+        generated.popitem(last=False)
+
+
+def _record_example(database, question, query, seconds, success, rows=None):
+    """Record an executed generated query in the example store without delaying the response."""
+    task = asyncio.create_task(
+        asyncio.to_thread(
+            get_example_store().record,
+            database_key(database),
+            question,
+            query,
+            seconds,
+            success,
+            rows,
         )
+    )
+    background_tasks.add(task)
+    task.add_done_callback(background_tasks.discard)
 
-        database.connect()
 
-        chatbot = ChatbotFactory.create_chatbot(
-            chatbot_type=chatbot_type,
-            database_connector=database,
-            model_name=request.model_name,
-        )
+async def _session_chat(session_id, input, candidates=1):
+    """
+    Run a chat turn of a session under admission control and remember its queries;
+    shared by the chat endpoints and the WebSocket channel.
 
-        sessions[request.session_id] = {"database": database, "chatbot": chatbot}
+    :return: A tuple (response, candidates, timings) as returned by `_chat`.
+    """
+    session = await sessions.aget(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail=f"Session {session_id} not found.")
 
-        return StatusResponse(
-            status="success",
-            message=f"Session {request.session_id} initialized successfully.",
+    chatbot = session["chatbot"]
+    async with llm_admission.admit(session_id, chatbot.provider):
+        response, candidates, timings = await _chat(chatbot, input, candidates)
+    _remember_generated(session, response, candidates)
+    await asyncio.to_thread(sessions.update, session_id)
+
+    if response is None:
+        raise HTTPException(
+            status_code=500,
+            detail="Chatbot returned no response. Please check your API keys and try again.",
         )
 
-    except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e))
+    return response, candidates, timings
 
 
-@app.post("/chat/text", response_model=ChatResponse)
-async def text_chat(request: TextChatRequest):
-    if request.session_id not in sessions:
+def _vision_input(request):
+    """Check the image of a vision chat request and build the chatbot input."""
+    if not request.image and not request.image_id:
         raise HTTPException(
-            status_code=404, detail=f"Session {request.session_id} not found."
+            status_code=400, detail="Either image or image_id is required."
         )
 
-    try:
-        chatbot = sessions[request.session_id]["chatbot"]
-        response = chatbot.chat(request.message)
+    if request.image_id and request.image_id not in image_store:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Image {request.image_id} not found. Please upload it again.",
+        )
 
-        if response is None:
-            raise HTTPException(
-                status_code=500,
-                detail="Chatbot returned no response. Please check your API keys and try again.",
-            )
+    return {
+        "query": request.message,
+        "image": request.image,
+        "image_id": request.image_id,
+    }
+
+
+@app.post("/chat/text", response_model=ChatResponse)
+async def text_chat(request: TextChatRequest):
+    try:
+        response, candidates, timings = await _session_chat(
+            request.session_id, request.message, request.candidates
+        )
 
-        return ChatResponse(session_id=request.session_id, response=response)
+        return ChatResponse(
+            session_id=request.session_id,
+            response=response,
+            candidates=candidates,
+            timings=timings if request.timings else None,
+        )
 
-    except HTTPException:
+    except (HTTPException, QueueFull):
         raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -161,107 +559,374 @@ async def text_chat(request: TextChatRequest):
 
 @app.post("/chat/vision", response_model=ChatResponse)
 async def vision_chat(request: VisionChatRequest):
-    if request.session_id not in sessions:
-        raise HTTPException(
-            status_code=404, detail=f"Session {request.session_id} not found."
-        )
-
     try:
-        chatbot = sessions[request.session_id]["chatbot"]
-        response = chatbot.chat({"query": request.message, "image": request.image})
+        response, candidates, timings = await _session_chat(
+            request.session_id, _vision_input(request), request.candidates
+        )
 
-        if response is None:
+        return ChatResponse(
+            session_id=request.session_id,
+            response=response,
+            candidates=candidates,
+            timings=timings if request.timings else None,
+        )
+    except (HTTPException, QueueFull):
+        raise
+    except KeyError as e:
+        if request.image_id and request.image_id not in image_store:
             raise HTTPException(
-                status_code=500,
-                detail="Chatbot returned no response. Please check your API keys and try again.",
+                status_code=404,
+                detail=f"Image {request.image_id} not found. Please upload it again.",
             )
-
-        return ChatResponse(session_id=request.session_id, response=response)
-    except HTTPException:
-        raise
+        raise HTTPException(status_code=500, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/images", response_model=ImageUploadResponse)
+async def upload_image(file: UploadFile = File(...)):
+    data = await file.read(max_image_upload_bytes + 1)
+
+    if len(data) > max_image_upload_bytes:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Image is larger than {max_image_upload_bytes} bytes.",
+        )
+
+    mime_type = sniff_mime_type(data)
+    if mime_type is None:
+        raise HTTPException(status_code=415, detail="Unsupported image format.")
+
+    image_id = await run_in_image_pool(image_store.put, data)
+
+    return ImageUploadResponse(image_id=image_id, size=len(data), mime_type=mime_type)
+
+
+@app.get("/images/{image_id}", response_model=ImageUploadResponse)
+async def get_image_info(image_id: str):
+    data = image_store.get(image_id)
+
+    if data is None:
+        raise HTTPException(status_code=404, detail=f"Image {image_id} not found")
+
+    return ImageUploadResponse(
+        image_id=image_id, size=len(data), mime_type=sniff_mime_type(data)
+    )
+
+
+def _run_query(database, query):
+    """
+    Execute a query and read its column description while holding the connector lock,
+    so a concurrent statement on the shared cursor cannot replace the description.
+    """
+    with database.lock:
+        rows = timed("execute_query", database.execute_query, query)
+
+        description = list(database.cursor.description or [])
+
+    return rows, description
+
+
+# The response is built by `rows_response`: `rows_to_json` already turns the rows into
+# typed JSON values (numbers, booleans, null, exact decimal and ISO 8601 strings), so
+# validating them against the response model again would only cost time.
 @app.post("/execute", response_model=QueryExecutionResponse)
-async def execute_query(request: ExecuteQueryRequest):
-    if request.session_id not in sessions:
+async def execute_query(request: ExecuteQueryRequest, http_request: Request):
+    session = await sessions.aget(request.session_id)
+    if session is None:
         raise HTTPException(
             status_code=404,
             detail=f"Session {request.session_id} not found. Please initialize first.",
         )
 
-    try:
-        database = sessions[request.session_id]["database"]
+    if request.continuation is not None:
+        if cursors.owner(request.continuation) != request.session_id:
+            raise HTTPException(
+                status_code=404,
+                detail="The result pages expired or were already read. Please execute the query again.",
+            )
+    elif not request.query.strip():
+        raise HTTPException(status_code=400, detail="A query is required.")
 
-        rows = database.execute_query(request.query)
+    database = session["database"]
 
-        column_names = (
-            [desc[0] for desc in database.cursor.description]
-            if database.cursor.description
-            else []
-        )
+    # Only queries a chatbot generated have a question to learn from.
+    question = None
+    if get_example_store() is not None and request.continuation is None:
+        generated = session.get("generated") or {}
+        question = generated.get(normalize_sql(request.query))
 
-        rows_list = []
-        for row in rows:
-            row_list = []
-            for item in row:
-                if item is None:
-                    row_list.append(None)
-                else:
-                    row_list.append(str(item))
-            rows_list.append(row_list)
-
-        return QueryExecutionResponse(
-            session_id=request.session_id,
-            success=True,
-            rows=rows_list,
-            column_names=column_names,
-            row_count=len(rows_list),
-            error=None,
+    started = time.perf_counter()
+
+    try:
+        async with db_admission.admit(request.session_id, database_key(database)):
+            if request.continuation is not None:
+                rows, description, continuation = await asyncio.to_thread(
+                    timed,
+                    "execute_query",
+                    cursors.fetch,
+                    request.continuation,
+                    request.page_size or DEFAULT_PAGE_SIZE,
+                )
+            elif request.page_size and returns_rows(request.query):
+                # The rest of the result stays in a cursor on the database server.
+                rows, description, continuation = await asyncio.to_thread(
+                    timed,
+                    "execute_query",
+                    cursors.open,
+                    request.session_id,
+                    database,
+                    request.query,
+                    request.page_size,
+                )
+            else:
+                rows, description = await asyncio.to_thread(
+                    _run_query, database, request.query
+                )
+                continuation = None
+
+        if question:
+            _record_example(
+                database,
+                question,
+                request.query,
+                time.perf_counter() - started,
+                True,
+                len(rows) if continuation is None else None,
+            )
+
+        return await rows_response(
+            {
+                "session_id": request.session_id,
+                "success": True,
+                "rows": None,
+                "column_names": [column[0] for column in description],
+                "column_types": column_types(description),
+                "row_count": len(rows),
+                "error": None,
+                "continuation": continuation,
+            },
+            rows,
+            description,
+            http_request,
         )
 
+    except QueueFull:
+        raise
     except Exception as e:
-        return QueryExecutionResponse(
-            session_id=request.session_id,
-            success=False,
-            rows=[],
-            column_names=[],
-            row_count=0,
-            error=str(e),
+        if question:
+            _record_example(
+                database, question, request.query, time.perf_counter() - started, False
+            )
+
+        return json_response(
+            {
+                "session_id": request.session_id,
+                "success": False,
+                "rows": [],
+                "column_names": [],
+                "column_types": [],
+                "row_count": 0,
+                "error": str(e),
+                "continuation": None,
+            },
+            http_request,
         )
 
 
-@app.delete("/session/{session_id}", response_model=StatusResponse)
-async def delete_session(session_id: str):
-    if session_id not in sessions:
-        raise HTTPException(status_code=404, detail=f"Session {session_id} not found")
+@app.delete("/execute/{continuation}", response_model=StatusResponse)
+async def discard_result_pages(continuation: str):
+    if not await asyncio.to_thread(cursors.close, continuation):
+        raise HTTPException(
+            status_code=404, detail="The result pages expired or were already read."
+        )
 
-    try:
-        database = sessions[session_id]["database"]
-        database.close()
-        del sessions[session_id]
+    return StatusResponse(status="success", message="Result pages discarded")
 
-        return StatusResponse(
-            status="success", message=f"Session {session_id} closed successfully"
+
+def _job_info(job):
+    return JobInfo(**job.info(jobs.result_ttl))
+
+
+def _job_example_recorder(database, question):
+    """Return a job callback that records the executed generated query in the example store."""
+
+    def record(job):
+        if job.started is None:
+            # Rejected by admission before it ran; there is no execution to learn from.
+            return
+
+        get_example_store().record(
+            database_key(database),
+            question,
+            job.query,
+            job.finished - job.started,
+            job.error is None,
+            job.rows_fetched if job.error is None else None,
         )
 
+    return record
+
+
+async def _submit_job(session_id, query):
+    """Queue a query job for a session; shared by /jobs and the WebSocket channel."""
+    session = await sessions.aget(session_id)
+    if session is None:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Session {session_id} not found. Please initialize first.",
+        )
+
+    database = session["database"]
+
+    record = None
+    if get_example_store() is not None:
+        question = (session.get("generated") or {}).get(normalize_sql(query))
+        if question:
+            record = _job_example_recorder(database, question)
+
+    def on_finish(job):
+        try:
+            if record is not None:
+                record(job)
+        finally:
+            # Account the rows the job keeps toward the session's memory limits.
+            sessions.account(session_id)
+
+    # The job takes its admission slots once a worker starts it. Jobs have their own
+    # gates: they run on dedicated connections, not the shared connector /execute uses.
+    return jobs.submit(
+        session_id,
+        database,
+        query,
+        on_finish,
+        admit=lambda: job_admission.slot(session_id, database_key(database)),
+    )
+
+
+@app.post("/jobs", response_model=JobInfo, status_code=202)
+async def submit_job(request: JobRequest):
+    job = await _submit_job(request.session_id, request.query)
+
+    return _job_info(job)
+
+
+async def _get_job(job_id):
+    job = jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+
+    # Polling a job uses its session, so the idle reaper does not close the session
+    # (and cancel the job) while a client only polls.
+    await sessions.aget(job.session_id)
+
+    return job
+
+
+@app.get("/jobs", response_model=List[JobInfo])
+async def list_jobs(session_id: Optional[str] = None):
+    if session_id is not None:
+        await sessions.aget(session_id)
+
+    return [_job_info(job) for job in jobs.jobs(session_id)]
+
+
+@app.get("/jobs/{job_id}", response_model=JobInfo)
+async def get_job(job_id: str, wait: float = Query(0.0, ge=0.0)):
+    job = await _get_job(job_id)
+
+    # Long polling: answer as soon as the job finishes, or after `wait` seconds.
+    deadline = time.monotonic() + min(wait, MAX_JOB_WAIT)
+    while not job.done.is_set():
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        await asyncio.sleep(min(JOB_POLL_INTERVAL, remaining))
+
+    return _job_info(job)
+
+
+@app.get("/jobs/{job_id}/rows", response_model=JobRowsResponse)
+async def get_job_rows(
+    job_id: str,
+    http_request: Request,
+    offset: int = Query(0, ge=0),
+    limit: int = Query(1000, ge=1, le=MAX_JOB_PAGE),
+):
+    job = await _get_job(job_id)
+
+    # Rows are only appended, so a page read after checking `done` is complete if done.
+    done = job.done.is_set()
+    rows = job.rows[offset : offset + limit]
+    next_offset = offset + len(rows)
+
+    return await rows_response(
+        {
+            "job_id": job.job_id,
+            "status": job.status,
+            "offset": offset,
+            "rows": None,
+            "column_names": job.column_names,
+            "column_types": column_types(job.description),
+            "rows_fetched": job.rows_fetched,
+            "next_offset": (
+                next_offset if not done or next_offset < job.rows_fetched else None
+            ),
+        },
+        rows,
+        job.description,
+        http_request,
+    )
+
+
+@app.post("/jobs/{job_id}/cancel", response_model=JobInfo)
+async def cancel_job(job_id: str):
+    await _get_job(job_id)
+
+    return _job_info(jobs.cancel(job_id))
+
+
+@app.delete("/jobs/{job_id}", response_model=StatusResponse)
+async def delete_job(job_id: str):
+    if not jobs.remove(job_id):
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+
+    return StatusResponse(status="success", message=f"Job {job_id} discarded")
+
+
+@app.delete("/session/{session_id}", response_model=StatusResponse)
+async def delete_session(session_id: str):
+    try:
+        # Stops the session's jobs and cursors, then closes its connector unless
+        # another session still uses it.
+        removed = await asyncio.to_thread(sessions.remove, session_id)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+    if not removed:
+        raise HTTPException(status_code=404, detail=f"Session {session_id} not found")
+
+    return StatusResponse(
+        status="success", message=f"Session {session_id} closed successfully"
+    )
+
 
-@app.get("/sessions", response_model=List[str])
-async def list_sessions():
-    return list(sessions.keys())
+@app.get("/sessions", response_model=Union[List[SessionInfo], List[str]])
+async def list_sessions(details: bool = False):
+    if details:
+        return [SessionInfo(**info) for info in sessions.info()]
+
+    return await asyncio.to_thread(sessions.keys)
 
 
 @app.delete("/sessions", response_model=StatusResponse)
 async def delete_all_sessions():
+    for job in jobs.jobs():
+        jobs.cancel(job.job_id)
+
     try:
-        for session_id in list(sessions.keys()):
-            database = sessions[session_id]["database"]
-            database.close()
-            del sessions[session_id]
+        await asyncio.to_thread(cursors.close_all)
+        await asyncio.to_thread(sessions.clear)
 
         return StatusResponse(
             status="success", message="All sessions closed successfully"
@@ -271,14 +936,173 @@ async def delete_all_sessions():
         raise HTTPException(status_code=500, detail=str(e))
 
 
+async def _ws_initialize(channel, request_id, message):
+    request = ChatbotInitRequest.model_validate(
+        {**message, "session_id": channel.session_id}
+    )
+    status = await _initialize_session(request)
+
+    await channel.send(
+        {"type": "initialized", "id": request_id, "message": status.message}
+    )
+
+
+async def _ws_chat(channel, request_id, message):
+    """Run a chat turn (a vision turn if the message has an image), streaming its tokens."""
+    fields = {**message, "session_id": channel.session_id}
+    if fields.get("image") or fields.get("image_id"):
+        request = VisionChatRequest.model_validate(fields)
+        input = _vision_input(request)
+    else:
+        request = TextChatRequest.model_validate(fields)
+        input = request.message
+
+    async def send_token(call, token):
+        await channel.send(
+            {"type": "token", "id": request_id, "call": call, "text": token}
+        )
+
+    with stream_tokens(send_token):
+        response, candidates, timings = await _session_chat(
+            channel.session_id, input, request.candidates
+        )
+
+    await channel.send(
+        {
+            "type": "chat",
+            "id": request_id,
+            "response": response,
+            "candidates": (
+                [candidate.model_dump() for candidate in candidates]
+                if candidates
+                else None
+            ),
+            "timings": timings if request.timings else None,
+        }
+    )
+
+
+async def _ws_execute(channel, request_id, message):
+    """
+    Run a query as a job and push its progress and rows in chunks as they are fetched.
+    Cancelling the request (or disconnecting) cancels the job and discards its rows.
+    """
+    request = StreamQueryRequest.model_validate(
+        {**message, "session_id": channel.session_id}
+    )
+    job = await _submit_job(channel.session_id, request.query)
+
+    try:
+        offset = 0
+        progress = None
+        while True:
+            # Rows are only appended, so all rows were sent once `done` was set before.
+            done = job.done.is_set()
+
+            while offset < job.rows_fetched:
+                rows = job.rows[offset : offset + request.chunk_size]
+
+                chunk = {"type": "rows", "id": request_id, "offset": offset}
+                if offset == 0:
+                    chunk["column_names"] = job.column_names
+                    chunk["column_types"] = column_types(job.description)
+
+                # Large chunks are converted and serialized in a worker thread.
+                await channel.send(await rows_text(chunk, rows, job.description))
+                offset += len(rows)
+
+            if done:
+                break
+
+            if progress != (job.status, job.rows_fetched):
+                progress = (job.status, job.rows_fetched)
+                await channel.send(
+                    {
+                        "type": "progress",
+                        "id": request_id,
+                        "status": job.status,
+                        "rows_fetched": job.rows_fetched,
+                    }
+                )
+
+            await asyncio.sleep(JOB_POLL_INTERVAL)
+
+        await channel.send(
+            {
+                "type": "done",
+                "id": request_id,
+                "status": job.status,
+                "row_count": offset,
+                "column_names": job.column_names,
+                "column_types": column_types(job.description),
+                "truncated": job.truncated,
+                "error": job.error,
+            }
+        )
+    finally:
+        jobs.remove(job.job_id)
+
+
+async def _ws_close(channel, request_id, message):
+    status = await delete_session(channel.session_id)
+
+    await channel.send({"type": "closed", "id": request_id, "message": status.message})
+
+
+# Request types of the WebSocket channel and their handlers.
+WS_HANDLERS = {
+    "initialize": _ws_initialize,
+    "chat": _ws_chat,
+    "execute": _ws_execute,
+    "close": _ws_close,
+}
+
+
+@app.websocket("/ws/{session_id}")
+async def session_channel(websocket: WebSocket, session_id: str):
+    await websocket.accept()
+    await Channel(websocket, session_id, WS_HANDLERS).run()
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    return PlainTextResponse(
+        registry.render(), media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
+
+
+@app.get("/models/ollama")
+async def ollama_model_stats():
+    return gate_stats()
+
+
+@app.get("/admission")
+async def admission_gate_stats():
+    return admission_stats()
+
+
+@app.on_event("startup")
+async def startup_event():
+    for reaper in (sessions.run_reaper(), jobs.run_reaper(), cursors.run_reaper()):
+        task = asyncio.create_task(reaper)
+        background_tasks.add(task)
+        task.add_done_callback(background_tasks.discard)
+
+    if ollama_preload_models:
+        task = asyncio.create_task(awarm_up_models(ollama_preload_models))
+        background_tasks.add(task)
+        task.add_done_callback(background_tasks.discard)
+
+
 @app.on_event("shutdown")
 async def shutdown_event():
-    for session_id in list(sessions.keys()):
-        try:
-            sessions[session_id]["database"].close()
-        except:
-            pass
-    sessions.clear()
+    jobs.close()
+    cursors.close_all()
+    sessions.close()
+
+    example_store = get_example_store()
+    if example_store is not None:
+        example_store.close()
 
 
 if __name__ == "__main__":
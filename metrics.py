@@ -0,0 +1,385 @@
+import time
+import threading
+from abc import ABC, abstractmethod
+from contextvars import ContextVar
+from contextlib import contextmanager
+from langchain_core.callbacks import BaseCallbackHandler
+
+DEFAULT_BUCKETS = (
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+)
+
+TOKEN_BUCKETS = (16, 64, 256, 1024, 4096, 16384, 65536, 262144)
+
+# Per-request breakdown of stage durations, filled in by `stage_timer` when active.
+_timings = ContextVar("spatialmind_timings", default=None)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+class _Metric(ABC):
+    """Common parts of the metric types: name, help text, label names and a lock."""
+
+    type_name = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        """
+        :param name: Metric name as exposed to Prometheus.
+        :param documentation: Help text.
+        :param labelnames: Names of the labels every sample carries.
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+
+        self._lock = threading.Lock()
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def _labels(self, key, *extra):
+        return tuple(zip(self.labelnames, key)) + extra
+
+    def render(self):
+        """
+        :return: The metric in the Prometheus text exposition format.
+        """
+        lines = [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.type_name}",
+        ]
+        lines.extend(self._samples())
+
+        return "\n".join(lines)
+
+    @abstractmethod
+    def _samples(self):
+        """
+        :return: The sample lines of the metric, without the HELP and TYPE comments.
+        """
+        pass
+
+
+class Counter(_Metric):
+    """A monotonically increasing counter."""
+
+    type_name = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        """
+        Increase the counter.
+
+        :param amount: Non-negative amount to add.
+        :param labels: Label values.
+        :return: None
+        """
+        key = self._key(labels)
+
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self):
+        with self._lock:
+            values = dict(self._values)
+
+        for key, value in sorted(values.items()):
+            yield f"{self.name}{_format_labels(self._labels(key))} {_format_value(value)}"
+
+
+class Gauge(_Metric):
+    """
+    A value that can go up and down, either set explicitly or read from a callback
+    every time the metrics are rendered.
+    """
+
+    type_name = "gauge"
+
+    def __init__(self, name, documentation, labelnames=(), function=None):
+        """
+        :param function: Optional zero-argument callable returning the current value, or a
+                         dict mapping label value tuples to values for labelled gauges.
+        """
+        super().__init__(name, documentation, labelnames)
+        self.function = function
+        self._values = {}
+
+    def set(self, value, **labels):
+        """
+        Set the gauge.
+
+        :param value: The new value.
+        :param labels: Label values.
+        :return: None
+        """
+        key = self._key(labels)
+
+        with self._lock:
+            self._values[key] = value
+
+    def _samples(self):
+        if self.function is not None:
+            try:
+                values = self.function()
+            except Exception as e:
+                print(f"Failed to collect gauge {self.name}: {e}")
+                return
+
+            if not isinstance(values, dict):
+                values = {(): values}
+        else:
+            with self._lock:
+                values = dict(self._values)
+
+        for key, value in sorted(values.items()):
+            yield f"{self.name}{_format_labels(self._labels(key))} {_format_value(value)}"
+
+
+class Histogram(_Metric):
+    """A histogram with cumulative buckets, a sum and a count per label set."""
+
+    type_name = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        """
+        :param buckets: Increasing upper bounds of the buckets; +Inf is added automatically.
+        """
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self._values = {}
+
+    def observe(self, value, **labels):
+        """
+        Record an observation.
+
+        :param value: The observed value (e.g., a duration in seconds).
+        :param labels: Label values.
+        :return: None
+        """
+        key = self._key(labels)
+
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][i] += 1
+                    break
+
+            entry[1] += value
+            entry[2] += 1
+
+    def _samples(self):
+        with self._lock:
+            values = {key: (list(c), s, n) for key, (c, s, n) in self._values.items()}
+
+        for key, (counts, total, count) in sorted(values.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                labels = self._labels(key, ("le", _format_value(bound)))
+                yield f"{self.name}_bucket{_format_labels(labels)} {cumulative}"
+
+            labels = _format_labels(self._labels(key))
+            yield f"{self.name}_sum{labels} {_format_value(total)}"
+            yield f"{self.name}_count{labels} {count}"
+
+
+class MetricsRegistry:
+    """Ordered collection of metrics rendered together on the /metrics endpoint."""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        """
+        Add a metric, or return the metric already registered under the same name.
+
+        :param metric: A Counter, Gauge or Histogram.
+        :return: The registered metric.
+        """
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def render(self):
+        """
+        :return: Every registered metric in the Prometheus text exposition format.
+        """
+        with self._lock:
+            metrics = list(self._metrics.values())
+
+        return "\n".join(metric.render() for metric in metrics) + "\n"
+
+
+registry = MetricsRegistry()
+
+stage_seconds = registry.register(
+    Histogram(
+        "spatialmind_stage_seconds",
+        "Duration of each request processing stage.",
+        ["stage"],
+    )
+)
+
+llm_tokens = registry.register(
+    Histogram(
+        "spatialmind_llm_tokens",
+        "Tokens used per model call.",
+        ["provider", "model", "direction"],
+        buckets=TOKEN_BUCKETS,
+    )
+)
+
+llm_tokens_total = registry.register(
+    Counter(
+        "spatialmind_llm_tokens_total",
+        "Total tokens used by model calls.",
+        ["provider", "model", "direction"],
+    )
+)
+
+request_seconds = registry.register(
+    Histogram(
+        "spatialmind_request_seconds",
+        "Duration of HTTP requests.",
+        ["method", "route", "status"],
+    )
+)
+
+
+def observe_stage(stage, seconds):
+    """
+    Record the duration of a stage in the histogram and in the current timing breakdown.
+
+    :param stage: Stage name (e.g., "answer_chain").
+    :param seconds: Duration in seconds.
+    :return: None
+    """
+    stage_seconds.observe(seconds, stage=stage)
+
+    timings = _timings.get()
+    if timings is not None:
+        timings[stage] = timings.get(stage, 0.0) + seconds
+
+
+@contextmanager
+def stage_timer(stage):
+    """
+    Time the enclosed block as one occurrence of `stage`.
+
+    Works around both blocking code and awaits; repeated stages in one request
+    (e.g., repair attempts) add up in the timing breakdown.
+
+    :param stage: Stage name.
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe_stage(stage, time.perf_counter() - started)
+
+
+def timed(stage, func, *args, **kwargs):
+    """
+    Call a function and record its duration as `stage`.
+
+    :return: The function's result.
+    """
+    with stage_timer(stage):
+        return func(*args, **kwargs)
+
+
+async def atimed(stage, func, *args, **kwargs):
+    """
+    Await a coroutine function and record its duration as `stage`.
+
+    :return: The coroutine's result.
+    """
+    with stage_timer(stage):
+        return await func(*args, **kwargs)
+
+
+@contextmanager
+def collect_timings():
+    """
+    Collect the stages recorded in the enclosed block (including worker threads started
+    with `asyncio.to_thread`, which copy the context) into a dict of seconds per stage.
+    """
+    timings = {}
+    token = _timings.set(timings)
+    try:
+        yield timings
+    finally:
+        _timings.reset(token)
+
+
+class TokenUsageHandler(BaseCallbackHandler):
+    """
+    LangChain callback that records the token usage reported by a chat model.
+
+    Attached once to every shared client, so every chain built on top of it is counted.
+    """
+
+    def __init__(self, provider, model_name):
+        """
+        :param provider: Provider name used as a label.
+        :param model_name: Model name used as a label.
+        """
+        self.provider = provider
+        self.model_name = model_name
+
+    def on_llm_end(self, response, **kwargs):
+        for generations in response.generations:
+            for generation in generations:
+                message = getattr(generation, "message", None)
+                usage = getattr(message, "usage_metadata", None)
+                if not usage:
+                    continue
+
+                for direction in ("input", "output"):
+                    tokens = usage.get(f"{direction}_tokens")
+                    if tokens is None:
+                        continue
+
+                    labels = {
+                        "provider": self.provider,
+                        "model": self.model_name,
+                        "direction": direction,
+                    }
+                    llm_tokens.observe(tokens, **labels)
+                    llm_tokens_total.inc(tokens, **labels)
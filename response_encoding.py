@@ -0,0 +1,174 @@
+import gzip
+import json
+import asyncio
+from fastapi.responses import Response
+from database import rows_to_json
+from metrics import stage_timer
+from config import (
+    response_compression_min_bytes,
+    response_gzip_level,
+    response_zstd_level,
+    response_offload_min_values,
+)
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+def dumps(content):
+    """
+    Serialize a response body to JSON.
+
+    Uses orjson when it is installed (several times faster on large row lists), and the
+    standard library encoder otherwise.
+
+    :param content: JSON-serializable content (dicts, lists, strings, numbers, None).
+    :return: The UTF-8 encoded JSON document.
+    """
+    if orjson is not None:
+        return orjson.dumps(content)
+
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode(
+        "utf-8"
+    )
+
+
+def supported_encodings():
+    """:return: The content codings this server can produce, preferred first."""
+    return ["zstd", "gzip"] if zstandard is not None else ["gzip"]
+
+
+def negotiate_encoding(accept_encoding):
+    """
+    Pick the content coding for a response from an Accept-Encoding header.
+
+    :param accept_encoding: The header value (e.g., "gzip, zstd;q=0.9"), or None.
+    :return: "zstd", "gzip" or None for an uncompressed response. Between codings the
+             client accepts equally, the server's preference (zstd) wins.
+    """
+    if not accept_encoding:
+        return None
+
+    weights = {}
+    for item in accept_encoding.split(","):
+        coding, _, params = item.strip().partition(";")
+        weight = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                weight = float(params[2:])
+            except ValueError:
+                weight = 0.0
+        weights[coding.strip().lower()] = weight
+
+    best, best_weight = None, 0.0
+    for coding in supported_encodings():
+        weight = weights.get(coding, weights.get("*", 0.0))
+        if weight > best_weight:
+            best, best_weight = coding, weight
+
+    return best
+
+
+def compress(body, encoding):
+    """
+    :param body: The response body.
+    :param encoding: "zstd" or "gzip".
+    :return: The compressed body.
+    """
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=response_zstd_level).compress(body)
+
+    return gzip.compress(body, compresslevel=response_gzip_level, mtime=0)
+
+
+def json_response(content, request, status_code=200):
+    """
+    Build a JSON response without response model validation, compressed with the best
+    coding the client accepts when the body is large enough to be worth it.
+
+    :param content: JSON-serializable content, already in the shape of the response model.
+    :param request: The incoming request, for its Accept-Encoding header.
+    :param status_code: The HTTP status code.
+    :return: A Response.
+    """
+    body = dumps(content)
+    headers = {"Vary": "Accept-Encoding"}
+
+    if len(body) >= response_compression_min_bytes:
+        encoding = negotiate_encoding(request.headers.get("accept-encoding"))
+        if encoding is not None:
+            body = compress(body, encoding)
+            headers["Content-Encoding"] = encoding
+
+    return Response(
+        content=body,
+        status_code=status_code,
+        headers=headers,
+        media_type="application/json",
+    )
+
+
+def _rows_response(content, rows, description, request, status_code):
+    with stage_timer("row_conversion"):
+        content["rows"] = rows_to_json(rows, description)
+
+    with stage_timer("response_encoding"):
+        return json_response(content, request, status_code)
+
+
+async def rows_response(content, rows, description, request, status_code=200):
+    """
+    Build the JSON response of a query result (see `json_response`).
+
+    The rows are converted with `rows_to_json` and stored under "rows" in `content`.
+    For results of `response_offload_min_values` values or more, conversion, serialization and
+    compression run in a worker thread, so a large result does not stall the event loop
+    (and every other request) for the time it takes to encode.
+
+    :param content: The rest of the response, in the shape of the response model.
+    :param rows: Rows as returned by the cursor.
+    :param description: The cursor's description of the rows.
+    :param request: The incoming request, for its Accept-Encoding header.
+    :param status_code: The HTTP status code.
+    :return: A Response.
+    """
+    if len(rows) * max(len(description), 1) < response_offload_min_values:
+        return _rows_response(content, rows, description, request, status_code)
+
+    return await asyncio.to_thread(
+        _rows_response, content, rows, description, request, status_code
+    )
+
+
+def _rows_text(content, rows, description):
+    with stage_timer("row_conversion"):
+        content["rows"] = rows_to_json(rows, description)
+
+    with stage_timer("response_encoding"):
+        return dumps(content).decode("utf-8")
+
+
+async def rows_text(content, rows, description):
+    """
+    Serialize a message carrying rows, such as a WebSocket chunk, to JSON text.
+
+    Like `rows_response`, messages of `response_offload_min_values` values or more are
+    converted and serialized in a worker thread instead of on the event loop.
+
+    :param content: The rest of the message; the rows are stored under "rows".
+    :param rows: Rows as returned by the cursor.
+    :param description: The cursor's description of the rows.
+    :return: The JSON text.
+    """
+    if len(rows) * max(len(description), 1) < response_offload_min_values:
+        return _rows_text(content, rows, description)
+
+    return await asyncio.to_thread(_rows_text, content, rows, description)
@@ -0,0 +1,599 @@
+import time
+import uuid
+import asyncio
+import threading
+from collections import OrderedDict
+from langchain_core.messages import messages_from_dict, messages_to_dict
+from metrics import registry, Counter
+from config import (
+    session_idle_ttl,
+    session_max_count,
+    session_max_bytes,
+    session_max_total_bytes,
+    session_reap_interval,
+)
+
+sessions_evicted = registry.register(
+    Counter(
+        "spatialmind_sessions_evicted_total",
+        "Sessions closed by the server, by reason (idle, lru, memory).",
+        ["reason"],
+    )
+)
+
+
+def content_bytes(content):
+    """
+    Estimate the memory held by a message content.
+
+    :param content: A string, or a list of multimodal parts (strings and dicts).
+    :return: The number of bytes of text and inline data.
+    """
+    if isinstance(content, str):
+        return len(content.encode("utf-8"))
+
+    total = 0
+    for part in content or []:
+        if isinstance(part, str):
+            total += len(part.encode("utf-8"))
+        elif isinstance(part, dict):
+            total += sum(content_bytes(value) for value in part.values())
+
+    return total
+
+
+def session_bytes(session):
+    """
+    Estimate the memory a session holds beyond the shared clients and connectors:
+    its conversation history and the generated queries it remembers.
+
+    :param session: A session dict.
+    :return: The size in bytes.
+    """
+    total = sum(
+        content_bytes(message.content) for message in session["chatbot"].get_history()
+    )
+
+    for query, question in (session.get("generated") or {}).items():
+        total += len(query.encode("utf-8")) + len(question.encode("utf-8"))
+
+    return total
+
+
+class SessionManager:
+    """
+    Bounded store of chatbot sessions.
+
+    Each session is a dict with at least "database" and "chatbot"; request handlers may
+    keep further per-session state in it. Sessions are kept in least-recently-used
+    order and are closed when:
+    - they have been idle for longer than `idle_ttl` seconds and have no work running
+      (checked by the reaper),
+    - a new session would exceed `max_sessions` (the least recently used one goes),
+    - the sessions together hold more than `max_total_bytes` (least recently used first).
+
+    A session whose history grows beyond `max_session_bytes` loses its oldest
+    conversation turns instead. Data kept for a session elsewhere (`retained_bytes`, such
+    as the rows of its query jobs) counts toward both memory limits but never costs the
+    session its history: it is cut down with `release_retained` first, and only then
+    are other sessions evicted for the total limit. Whenever a session is closed, deleted
+    or evicted, `on_close` stops the work it still has running. Database connectors are shared by the sessions on the same database, so a
+    connector is only closed with the last session that uses it.
+
+    With a session store, every session's configuration and history are also saved
+    there after each change, and the sessions held in memory are only a per-worker
+    cache: a worker that does not hold a session (or holds an outdated copy) rebuilds
+    it from the store, opening its connector and chatbot with `builder`. Evicting a
+    session then only drops the local copy; the store expires idle sessions itself.
+    """
+
+    def __init__(
+        self,
+        idle_ttl=session_idle_ttl,
+        max_sessions=session_max_count,
+        max_session_bytes=session_max_bytes,
+        max_total_bytes=session_max_total_bytes,
+        store=None,
+        builder=None,
+        on_close=None,
+        retained_bytes=None,
+        release_retained=None,
+        busy=None,
+        clock=time.time,
+    ):
+        """
+        :param idle_ttl: Seconds a session may stay unused (0 disables expiry).
+        :param max_sessions: Maximum number of sessions (0 for no limit).
+        :param max_session_bytes: Maximum accounted size of one session (0 for no limit).
+        :param max_total_bytes: Maximum accounted size of all sessions (0 for no limit).
+        :param store: A BaseSessionStore shared by the workers, or None to keep sessions
+                      in this process only.
+        :param builder: Callable (config) -> (database, chatbot) that opens a stored
+                        session; required with a store.
+        :param on_close: Optional callable (session_id) run when this worker drops a
+                         session, before its connector is closed.
+        :param retained_bytes: Optional callable (session_id) -> bytes held for a session
+                               outside of it.
+        :param release_retained: Optional callable (session_id, bytes) -> bytes freed that
+                                 drops some of the data counted by `retained_bytes`.
+        :param busy: Optional callable (session_id) -> whether the session still has work
+                     running (such as query jobs); a busy session is not reaped as idle.
+        :param clock: Callable returning the current time in seconds.
+        """
+        self.idle_ttl = idle_ttl
+        self.max_sessions = max_sessions
+        self.max_session_bytes = max_session_bytes
+        self.max_total_bytes = max_total_bytes
+        self.store = store
+        self.builder = builder
+        self.on_close = on_close
+        self.retained_bytes = retained_bytes
+        self.release_retained = release_retained
+        self.busy = busy
+        self.clock = clock
+
+        self._sessions = OrderedDict()
+        self._info = {}
+        self._connectors = {}
+        self._lock = threading.RLock()
+        self._load_lock = threading.Lock()
+
+    def __contains__(self, session_id):
+        with self._lock:
+            return session_id in self._sessions
+
+    def __getitem__(self, session_id):
+        """Return a session and mark it as used."""
+        with self._lock:
+            session = self._sessions[session_id]
+            self._sessions.move_to_end(session_id)
+            self._info[session_id]["last_used"] = self.clock()
+
+            return session
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def keys(self):
+        """:return: The ids of every session (of every worker, with a store)."""
+        if self.store is not None:
+            return self.store.keys()
+
+        with self._lock:
+            return list(self._sessions.keys())
+
+    def values(self):
+        with self._lock:
+            return list(self._sessions.values())
+
+    def get(self, session_id):
+        """
+        Return a session held by this worker and mark it as used.
+
+        :param session_id: The session id.
+        :return: The session dict, or None if it does not exist.
+        """
+        with self._lock:
+            if session_id not in self._sessions:
+                return None
+
+            return self[session_id]
+
+    async def aget(self, session_id):
+        """
+        Return a session and mark it as used, loading it from the store when this worker
+        does not hold it or holds an outdated copy.
+
+        :param session_id: The session id.
+        :return: The session dict, or None if it does not exist.
+        """
+        # Both paths take the manager lock, which evictions may hold for a while.
+        load = self.get if self.store is None else self._load
+
+        return await asyncio.to_thread(load, session_id)
+
+    async def acontains(self, session_id):
+        """
+        :param session_id: The session id.
+        :return: True if the session exists (in any worker, with a store).
+        """
+        if self.store is None:
+            return await asyncio.to_thread(self.__contains__, session_id)
+
+        return await asyncio.to_thread(self.store.touch, session_id) is not None
+
+    def add(self, session_id, database, chatbot, config=None):
+        """
+        Register a new session, evicting the least recently used ones if the store is full.
+
+        :param session_id: The session id.
+        :param database: The session's database connector.
+        :param chatbot: The session's chatbot.
+        :param config: The settings the session was created with (database_config,
+                       chatbot_type, model_name), needed to rebuild it from the store.
+        :return: The session dict.
+        :raises KeyError: If the session already exists.
+        """
+        session = self._add_local(session_id, database, chatbot, config)
+        self.persist(session_id)
+
+        return session
+
+    def _add_local(self, session_id, database, chatbot, config):
+        evicted = []
+
+        try:
+            with self._lock:
+                return self._register(session_id, database, chatbot, config, evicted)
+        finally:
+            self._release_all(evicted)
+
+    def _register(self, session_id, database, chatbot, config, evicted):
+        """Add a session to this worker; called with the lock held."""
+        if session_id in self._sessions:
+            raise KeyError(f"Session {session_id} already exists.")
+
+        if self.max_sessions:
+            while len(self._sessions) >= self.max_sessions:
+                evicted.append(self._evict_oldest("lru"))
+
+        now = self.clock()
+        session = {"database": database, "chatbot": chatbot, "config": config}
+        self._sessions[session_id] = session
+        self._info[session_id] = {
+            "created": now,
+            "last_used": now,
+            "bytes": 0,
+            "version": None,
+        }
+
+        connector = self._connectors.setdefault(id(database), [database, 0])
+        connector[1] += 1
+
+        return session
+
+    def remove(self, session_id):
+        """
+        Remove a session (from the store too) and close its database connector if no
+        other session uses it.
+
+        :param session_id: The session id.
+        :return: True if the session existed, False otherwise.
+        """
+        existed = self.store is not None and self.store.touch(session_id) is not None
+        if self.store is not None:
+            self.store.delete(session_id)
+
+        return self._remove_local(session_id) or existed
+
+    def _remove_local(self, session_id):
+        """Drop this worker's copy of a session and release its connector."""
+        with self._lock:
+            database = self._pop_local(session_id)
+
+        if database is False:
+            return False
+
+        self._release_all([(session_id, database)])
+
+        return True
+
+    def _pop_local(self, session_id):
+        """
+        Unregister a session from this worker; called with the lock held.
+
+        :return: False if the session is not held here, otherwise its connector if no
+                 other session uses it (to be closed by `_release_all` once the lock is
+                 released), or None.
+        """
+        session = self._sessions.pop(session_id, None)
+        if session is None:
+            return False
+
+        del self._info[session_id]
+
+        database = session["database"]
+        connector = self._connectors[id(database)]
+        connector[1] -= 1
+        if connector[1] > 0:
+            return None
+
+        del self._connectors[id(database)]
+
+        return database
+
+    def _release_all(self, released):
+        """
+        Stop the work of unregistered sessions and close the connectors returned by
+        `_pop_local`; called without the lock, so other requests are not held up while a
+        connector waits for its running statement.
+
+        :param released: A list of (session_id, connector or None) tuples.
+        """
+        for session_id, database in released:
+            if self.on_close is not None:
+                try:
+                    self.on_close(session_id)
+                except Exception as e:
+                    print(f"Failed to stop the work of session {session_id}: {e}")
+
+            if database is None:
+                continue
+
+            # Connectors are shared per database, so a session added in the meantime may
+            # use this one again; the connector lock is taken first, as statements do.
+            with database.lock:
+                with self._lock:
+                    if id(database) in self._connectors:
+                        continue
+
+                database.close()
+
+    def clear(self):
+        """
+        Remove every session and close their connectors.
+
+        :return: None
+        """
+        if self.store is not None:
+            self.store.clear()
+
+        self._remove_all_local()
+
+    def close(self):
+        """
+        Release this worker's sessions and connectors on shutdown; stored sessions are
+        kept for the other workers.
+
+        :return: None
+        """
+        self._remove_all_local()
+
+        if self.store is not None:
+            self.store.close()
+
+    def _remove_all_local(self):
+        with self._lock:
+            local = list(self._sessions.keys())
+
+        for session_id in local:
+            try:
+                self._remove_local(session_id)
+            except Exception as e:
+                print(f"Failed to close session {session_id}: {e}")
+
+    def update(self, session_id):
+        """
+        Account and persist a session after a chat turn changed it.
+
+        :param session_id: The session id.
+        :return: None
+        """
+        self.account(session_id)
+        self.persist(session_id)
+
+    def persist(self, session_id):
+        """
+        Save a session's configuration, history and remembered queries to the store.
+
+        :param session_id: The session id.
+        :return: None
+        """
+        if self.store is None:
+            return
+
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is None or session.get("config") is None:
+                return
+
+            info = self._info[session_id]
+            info["version"] = uuid.uuid4().hex
+            state = {
+                "config": session["config"],
+                "history": messages_to_dict(list(session["chatbot"].get_history())),
+                "generated": list((session.get("generated") or {}).items()),
+                "created": info["created"],
+                "version": info["version"],
+            }
+
+        self.store.save(session_id, state)
+
+    def _load(self, session_id):
+        """Return a session, (re)building this worker's copy from the store if needed."""
+        version = self.store.touch(session_id)
+        if version is None:
+            # Deleted or expired, possibly by another worker.
+            self._remove_local(session_id)
+            return None
+
+        with self._lock:
+            session = self._sessions.get(session_id)
+            if session is not None and self._info[session_id]["version"] == version:
+                return self[session_id]
+
+        with self._load_lock:
+            state = self.store.load(session_id)
+            if state is None:
+                self._remove_local(session_id)
+                return None
+
+            with self._lock:
+                session = self._sessions.get(session_id)
+
+            if session is None:
+                database, chatbot = self.builder(state["config"])
+                session = self._add_local(
+                    session_id, database, chatbot, state["config"]
+                )
+
+            with self._lock:
+                chatbot = session["chatbot"]
+                chatbot.clear_history()
+                chatbot.get_history().extend(messages_from_dict(state["history"]))
+                session["generated"] = OrderedDict(
+                    tuple(item) for item in state.get("generated") or []
+                )
+
+                info = self._info[session_id]
+                info["created"] = state.get("created", info["created"])
+                info["version"] = state["version"]
+
+            self.account(session_id)
+
+            return self[session_id]
+
+    def account(self, session_id):
+        """
+        Update the accounted size of a session after it changed, trimming its history,
+        releasing its retained data or evicting other sessions if a memory limit is
+        exceeded.
+
+        :param session_id: The session id.
+        :return: The session's size in bytes (0 if it no longer exists).
+        """
+        evicted = []
+
+        try:
+            with self._lock:
+                return self._account(session_id, evicted)
+        finally:
+            self._release_all(evicted)
+
+    def _account(self, session_id, evicted):
+        """Account a session's size; called with the lock held."""
+        session = self._sessions.get(session_id)
+        if session is None:
+            return 0
+
+        own = session_bytes(session)
+
+        if self.max_session_bytes and own > self.max_session_bytes:
+            history = session["chatbot"].get_history()
+            # Drop whole turns (question and answer) but keep the latest one.
+            while own > self.max_session_bytes and len(history) > 2:
+                del history[:2]
+                own = session_bytes(session)
+
+        retained = self.retained_bytes(session_id) if self.retained_bytes else 0
+
+        if self.max_session_bytes and own + retained > self.max_session_bytes:
+            retained -= self._release(
+                session_id, own + retained - self.max_session_bytes
+            )
+
+        self._info[session_id]["bytes"] = own + retained
+
+        if self.max_total_bytes:
+            excess = self.total_bytes() - self.max_total_bytes
+            if excess > 0 and retained:
+                self._info[session_id]["bytes"] -= self._release(session_id, excess)
+
+            while self.total_bytes() > self.max_total_bytes and len(self._sessions) > 1:
+                oldest = next(iter(self._sessions))
+                if oldest == session_id:
+                    break
+                evicted.append(self._evict_oldest("memory"))
+
+        return self._info[session_id]["bytes"]
+
+    def _release(self, session_id, nbytes):
+        """:return: The bytes freed of the data retained for a session outside of it."""
+        if self.release_retained is None:
+            return 0
+
+        return self.release_retained(session_id, nbytes)
+
+    def total_bytes(self):
+        """:return: The accounted size of all sessions in bytes."""
+        with self._lock:
+            return sum(info["bytes"] for info in self._info.values())
+
+    def reap(self):
+        """
+        Close the sessions that have been idle for longer than the TTL, unless they
+        still have work running.
+
+        :return: The ids of the closed sessions.
+        """
+        if not self.idle_ttl:
+            return []
+
+        deadline = self.clock() - self.idle_ttl
+
+        with self._lock:
+            idle = [
+                session_id
+                for session_id, info in self._info.items()
+                if info["last_used"] < deadline
+            ]
+
+        busy = [
+            session_id
+            for session_id in idle
+            if self.busy is not None and self.busy(session_id)
+        ]
+        expired = [session_id for session_id in idle if session_id not in busy]
+
+        for session_id in expired:
+            print(f"Session {session_id} expired after {self.idle_ttl} s without use.")
+            # Another worker may still be serving a stored session; the store expires it.
+            if self._remove_local(session_id):
+                sessions_evicted.inc(reason="idle")
+
+        if self.store is not None:
+            # Keep the stored copy of a busy session from expiring as well.
+            for session_id in busy:
+                self.store.touch(session_id)
+            expired += self.store.expire(self.idle_ttl)
+
+        return expired
+
+    async def run_reaper(self, interval=session_reap_interval):
+        """
+        Periodically close idle sessions; runs until cancelled.
+
+        :param interval: Seconds between two checks.
+        :return: None
+        """
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await asyncio.to_thread(self.reap)
+            except Exception as e:
+                print(f"Session reaper failed: {e}")
+
+    def info(self):
+        """
+        Describe the sessions, most recently used first.
+
+        :return: A list of dicts with the session id, chatbot type, creation and last use
+                 (Unix time), idle seconds, number of history messages and size in bytes.
+        """
+        now = self.clock()
+
+        with self._lock:
+            return [
+                {
+                    "session_id": session_id,
+                    "chatbot_type": type(session["chatbot"]).__name__,
+                    "created": self._info[session_id]["created"],
+                    "last_used": self._info[session_id]["last_used"],
+                    "idle_seconds": now - self._info[session_id]["last_used"],
+                    "history_messages": len(session["chatbot"].get_history()),
+                    "bytes": self._info[session_id]["bytes"],
+                }
+                for session_id, session in reversed(self._sessions.items())
+            ]
+
+    def _evict_oldest(self, reason):
+        """
+        Unregister the least recently used session; called with the lock held.
+
+        :return: A tuple (session_id, connector to close) for `_release_all`.
+        """
+        session_id = next(iter(self._sessions))
+        print(f"Closing least recently used session {session_id} ({reason} limit).")
+        sessions_evicted.inc(reason=reason)
+
+        return session_id, self._pop_local(session_id)
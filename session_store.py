@@ -0,0 +1,280 @@
+import json
+import time
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from config import session_store_url, session_idle_ttl
+
+
+class BaseSessionStore(ABC):
+    """
+    Abstract interface for storing session state outside the worker process, so any
+    worker can serve any session.
+
+    A state is a JSON-serializable dict with the session's configuration (database
+    connection settings, chatbot type and model), its conversation history and a
+    version string that changes with every save. The database password is part of the
+    configuration, so the store must be as protected as the database itself.
+    """
+
+    @abstractmethod
+    def save(self, session_id, state):
+        """
+        Store the state of a session, replacing the previous one.
+
+        :param session_id: The session id.
+        :param state: The session state.
+        :return: None
+        """
+        pass
+
+    @abstractmethod
+    def load(self, session_id):
+        """
+        :param session_id: The session id.
+        :return: The stored state, or None if the session does not exist.
+        """
+        pass
+
+    @abstractmethod
+    def touch(self, session_id):
+        """
+        Mark a session as used so it does not expire.
+
+        :param session_id: The session id.
+        :return: The version of the stored state, or None if the session does not exist.
+        """
+        pass
+
+    @abstractmethod
+    def delete(self, session_id):
+        """
+        Delete a session.
+
+        :param session_id: The session id.
+        :return: None
+        """
+        pass
+
+    @abstractmethod
+    def keys(self):
+        """
+        :return: The ids of every stored session.
+        """
+        pass
+
+    @abstractmethod
+    def expire(self, idle_seconds):
+        """
+        Delete the sessions that have not been used for a while.
+
+        :param idle_seconds: Maximum time since the last use.
+        :return: The ids of the deleted sessions.
+        """
+        pass
+
+    def clear(self):
+        """
+        Delete every session.
+
+        :return: None
+        """
+        for session_id in self.keys():
+            self.delete(session_id)
+
+    def close(self):
+        """
+        Release the store's connection.
+
+        :return: None
+        """
+        pass
+
+
+class SQLiteSessionStore(BaseSessionStore):
+    """
+    Session store in a local SQLite file, shared by the workers on one host.
+    """
+
+    def __init__(self, path):
+        """
+        :param path: The SQLite file.
+        """
+        self.path = path
+
+        self._local = threading.local()
+
+        with self._connect() as connection:
+            connection.execute(
+                """
+                CREATE TABLE IF NOT EXISTS sessions (
+                    session_id TEXT PRIMARY KEY,
+                    state TEXT NOT NULL,
+                    version TEXT NOT NULL,
+                    used REAL NOT NULL
+                )
+                """
+            )
+
+    def _connect(self):
+        """Return this thread's connection; SQLite connections are not shared across threads."""
+        connection = getattr(self._local, "connection", None)
+
+        if connection is None:
+            # Workers write concurrently; wait for the lock instead of failing.
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.execute("PRAGMA journal_mode=WAL")
+            self._local.connection = connection
+
+        return connection
+
+    def save(self, session_id, state):
+        with self._connect() as connection:
+            connection.execute(
+                "INSERT OR REPLACE INTO sessions (session_id, state, version, used) "
+                "VALUES (?, ?, ?, ?)",
+                (session_id, json.dumps(state), state["version"], time.time()),
+            )
+
+    def load(self, session_id):
+        row = (
+            self._connect()
+            .execute("SELECT state FROM sessions WHERE session_id = ?", (session_id,))
+            .fetchone()
+        )
+
+        return json.loads(row[0]) if row else None
+
+    def touch(self, session_id):
+        with self._connect() as connection:
+            connection.execute(
+                "UPDATE sessions SET used = ? WHERE session_id = ?",
+                (time.time(), session_id),
+            )
+            row = connection.execute(
+                "SELECT version FROM sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+
+        return row[0] if row else None
+
+    def delete(self, session_id):
+        with self._connect() as connection:
+            connection.execute(
+                "DELETE FROM sessions WHERE session_id = ?", (session_id,)
+            )
+
+    def keys(self):
+        rows = self._connect().execute(
+            "SELECT session_id FROM sessions ORDER BY session_id"
+        )
+
+        return [row[0] for row in rows]
+
+    def expire(self, idle_seconds):
+        deadline = time.time() - idle_seconds
+
+        with self._connect() as connection:
+            expired = [
+                row[0]
+                for row in connection.execute(
+                    "SELECT session_id FROM sessions WHERE used < ?", (deadline,)
+                )
+            ]
+            connection.execute("DELETE FROM sessions WHERE used < ?", (deadline,))
+
+        return expired
+
+    def close(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
+
+
+class RedisSessionStore(BaseSessionStore):
+    """
+    Session store in Redis (or a Redis-compatible server), shared by workers on any host.
+
+    Each session is a hash with its state and version. Keys expire after the idle TTL,
+    which every use renews, so Redis expires idle sessions by itself. Requires the
+    `redis` package.
+    """
+
+    def __init__(self, url, ttl=session_idle_ttl, prefix="spatialmind:session:"):
+        """
+        :param url: A redis:// or rediss:// URL.
+        :param ttl: Seconds without use after which a session expires (0 for never).
+        :param prefix: Prefix of the session keys.
+        """
+        import redis
+
+        self.ttl = int(ttl)
+        self.prefix = prefix
+
+        self._client = redis.Redis.from_url(url)
+
+    def _key(self, session_id):
+        return f"{self.prefix}{session_id}"
+
+    def save(self, session_id, state):
+        pipeline = self._client.pipeline()
+        pipeline.hset(
+            self._key(session_id),
+            mapping={"state": json.dumps(state), "version": state["version"]},
+        )
+        if self.ttl:
+            pipeline.expire(self._key(session_id), self.ttl)
+        pipeline.execute()
+
+    def load(self, session_id):
+        state = self._client.hget(self._key(session_id), "state")
+
+        return json.loads(state) if state is not None else None
+
+    def touch(self, session_id):
+        pipeline = self._client.pipeline()
+        pipeline.hget(self._key(session_id), "version")
+        if self.ttl:
+            pipeline.expire(self._key(session_id), self.ttl)
+        version = pipeline.execute()[0]
+
+        return version.decode("utf-8") if version is not None else None
+
+    def delete(self, session_id):
+        self._client.delete(self._key(session_id))
+
+    def keys(self):
+        return sorted(
+            key.decode("utf-8")[len(self.prefix) :]
+            for key in self._client.scan_iter(match=f"{self.prefix}*")
+        )
+
+    def expire(self, idle_seconds):
+        # Keys carry their own TTL.
+        return []
+
+    def close(self):
+        self._client.close()
+
+
+def create_session_store(url=session_store_url):
+    """
+    Create the session store configured by a URL.
+
+    :param url: "sqlite:///path/to/file.sqlite3", "redis://host:port/db", or empty to
+                keep sessions in the worker's memory only.
+    :return: A BaseSessionStore, or None for in-memory sessions.
+    :raises ValueError: If the URL scheme is not supported.
+    """
+    if not url:
+        return None
+
+    if url.startswith("sqlite:///"):
+        return SQLiteSessionStore(url[len("sqlite:///") :])
+
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisSessionStore(url)
+
+    raise ValueError(
+        f"Unsupported session store: {url}, expected 'sqlite:///path' or 'redis://host:port/db'."
+    )
@@ -0,0 +1,134 @@
+import pytest
+import threading
+from chatbot.prompt_cache import BaseContextCacheProvider, PromptPrefixCache
+
+SCHEMA = "roads(id int, geom geometry(LineString,4326))"
+OTHER_SCHEMA = "parcels(id int, geom geometry(Polygon,4326))"
+
+
+class FakeContextCacheProvider(BaseContextCacheProvider):
+    """
+    In-memory context cache provider for tests.
+
+    Every created entry is recorded in `created`, so callers can check how often the
+    provider was asked to store a prefix.
+    """
+
+    def __init__(self, fail=False):
+        """
+        :param fail: If True, every creation raises, like a provider that rejects the prefix.
+        """
+        self.fail = fail
+        self.created = []
+
+    def create(self, model_name, system_instruction, ttl_seconds):
+        """
+        Record a system instruction and return a handle for it.
+
+        :param model_name: The model the cached content is bound to.
+        :param system_instruction: The static prompt prefix to cache.
+        :param ttl_seconds: Lifetime of the cached content in seconds.
+        :return: A handle of the form "cachedContents/fake-<n>".
+        :raises RuntimeError: If the provider was created with fail=True.
+        """
+        if self.fail:
+            raise RuntimeError("Context caching is not supported.")
+
+        self.created.append((model_name, system_instruction, ttl_seconds))
+
+        return f"cachedContents/fake-{len(self.created)}"
+
+
+def test_handle_is_created_once_per_fingerprint():
+    provider = FakeContextCacheProvider()
+    cache = PromptPrefixCache(provider, ttl_seconds=3600)
+
+    handles = [cache.get_handle("gemini-2.5-pro", SCHEMA) for _ in range(5)]
+
+    assert len(provider.created) == 1
+    assert set(handles) == {"cachedContents/fake-1"}
+    assert (cache.misses, cache.hits) == (1, 4)
+
+    other = cache.get_handle("gemini-2.5-pro", OTHER_SCHEMA)
+
+    assert other == "cachedContents/fake-2"
+    assert len(provider.created) == 2
+    assert cache.get_handle("gemini-2.5-pro", SCHEMA) == "cachedContents/fake-1"
+
+
+def test_failed_creation_is_not_retried_on_every_turn():
+    provider = FakeContextCacheProvider(fail=True)
+    cache = PromptPrefixCache(provider, retry_after=300)
+
+    assert cache.get_handle("gemini-2.5-pro", SCHEMA) is None
+    assert cache.get_handle("gemini-2.5-pro", SCHEMA) is None
+    assert cache.misses == 1
+
+
+def test_sessions_share_the_handle(monkeypatch):
+    pytest.importorskip("langchain_google_genai")
+    monkeypatch.setenv("GOOGLE_API_KEY", "test")
+
+    from benchmarks.standin import synthetic_catalog, standin_connector
+    from chatbot.gemini_text_chatbot import GeminiTextChatbot
+    from config import system_prompt
+
+    provider = FakeContextCacheProvider()
+    cache = PromptPrefixCache(provider)
+    database = standin_connector(synthetic_catalog(3))
+
+    # Two sessions on the same database, each answering several turns.
+    sessions = [GeminiTextChatbot(database, prefix_cache=cache) for _ in range(2)]
+    for _ in range(3):
+        for chatbot in sessions:
+            chatbot._get_answer_chain(SCHEMA)
+
+    assert len(provider.created) == 1
+    assert provider.created[0][1] == system_prompt.format(schema=SCHEMA)
+    assert cache.hits == 5
+
+
+class SlowContextCacheProvider(FakeContextCacheProvider):
+    """Blocks each creation until `release` is set."""
+
+    def __init__(self):
+        super().__init__()
+        self.entered = threading.Event()
+        self.release = threading.Event()
+
+    def create(self, model_name, system_instruction, ttl_seconds):
+        self.entered.set()
+        self.release.wait(5)
+        return super().create(model_name, system_instruction, ttl_seconds)
+
+
+def test_concurrent_callers_share_one_creation_outside_the_lock():
+    provider = SlowContextCacheProvider()
+    cache = PromptPrefixCache(provider)
+
+    provider.release.set()
+    assert cache.get_handle("gemini-2.5-pro", OTHER_SCHEMA) == "cachedContents/fake-1"
+    provider.entered.clear()
+    provider.release.clear()
+
+    handles = []
+    threads = [
+        threading.Thread(
+            target=lambda: handles.append(cache.get_handle("gemini-2.5-pro", SCHEMA))
+        )
+        for _ in range(4)
+    ]
+    for thread in threads:
+        thread.start()
+    assert provider.entered.wait(5)
+
+    # While the creation is in flight, other prefixes are still served.
+    assert cache.get_handle("gemini-2.5-pro", OTHER_SCHEMA) == "cachedContents/fake-1"
+
+    provider.release.set()
+    for thread in threads:
+        thread.join()
+
+    assert len(provider.created) == 2
+    assert handles == ["cachedContents/fake-2"] * 4
+    assert cache.misses == 2
@@ -0,0 +1,96 @@
+import threading
+from langchain_core.messages import HumanMessage, AIMessage
+from job_manager import Job, JobManager
+from session_manager import SessionManager
+
+
+class StubChatbot:
+    def __init__(self):
+        self.history = []
+
+    def get_history(self):
+        return self.history
+
+
+class StubDatabase:
+    def __init__(self):
+        self.lock = threading.RLock()
+
+    def close(self):
+        pass
+
+
+def finished_job(jobs, session_id, rows):
+    job = Job(session_id, None, "SELECT name FROM roads")
+    job.keep([("x" * 40,)] * rows)
+    job.done.set()
+    with jobs._lock:
+        jobs._jobs[job.job_id] = job
+
+    return job
+
+
+def test_job_rows_are_released_instead_of_history():
+    jobs = JobManager(workers=1)
+    closed = []
+    sessions = SessionManager(
+        max_session_bytes=1000,
+        max_total_bytes=0,
+        retained_bytes=jobs.retained_bytes,
+        release_retained=jobs.release,
+        on_close=closed.append,
+    )
+    session = sessions.add("a", StubDatabase(), StubChatbot())
+    for _ in range(4):
+        session["chatbot"].history += [HumanMessage("q" * 50), AIMessage("a" * 50)]
+
+    oldest = finished_job(jobs, "a", 10)
+    newest = finished_job(jobs, "a", 10)
+
+    assert sessions.account("a") <= 1000
+    assert len(session["chatbot"].history) == 8
+    assert oldest.rows_fetched == 0 and oldest.truncated
+    assert 0 < newest.rows_fetched < 10 and newest.truncated
+    assert closed == []
+
+    jobs.close()
+
+
+def test_job_rows_are_released_before_other_sessions_are_evicted():
+    jobs = JobManager(workers=1)
+    closed = []
+    sessions = SessionManager(
+        max_session_bytes=0,
+        max_total_bytes=2000,
+        retained_bytes=jobs.retained_bytes,
+        release_retained=jobs.release,
+        on_close=closed.append,
+    )
+    sessions.add("a", StubDatabase(), StubChatbot())
+    sessions.add("b", StubDatabase(), StubChatbot())
+
+    finished_job(jobs, "b", 100)
+
+    assert sessions.account("b") <= 2000
+    assert "a" in sessions and closed == []
+
+    jobs.close()
+
+
+def test_idle_sessions_with_running_jobs_are_not_reaped():
+    now = [0.0]
+    running = {"a"}
+    sessions = SessionManager(
+        idle_ttl=60, busy=running.__contains__, clock=lambda: now[0]
+    )
+    sessions.add("a", StubDatabase(), StubChatbot())
+    sessions.add("b", StubDatabase(), StubChatbot())
+
+    now[0] = 120.0
+
+    assert sessions.reap() == ["b"]
+    assert "a" in sessions
+
+    running.clear()
+
+    assert sessions.reap() == ["a"]
@@ -0,0 +1,50 @@
+import pytest
+from chatbot.sql_utils import single_statement
+
+
+def test_trailing_semicolons_are_stripped():
+    assert single_statement("SELECT 1;; \n") == "SELECT 1"
+    assert single_statement("SELECT 'a;b', \"c;d\" /* ; */ FROM t;") == (
+        "SELECT 'a;b', \"c;d\" /* ; */ FROM t"
+    )
+
+
+@pytest.mark.parametrize(
+    "query",
+    [
+        "SELECT 1; DROP TABLE t",
+        "SELECT E'\\''; DROP TABLE t; COMMIT; SELECT 'x'",
+        "SELECT e'\\\\'; DROP TABLE t",
+        "SELECT $$;$$; DROP TABLE t",
+        "SELECT $tag$ $$ ; $tag$; DROP TABLE t",
+        "SELECT /* /* */ ; */ 1; DROP TABLE t",
+        "SELECT 1; -- trailing comment",
+    ],
+)
+def test_multiple_statements_are_rejected(query):
+    with pytest.raises(ValueError, match="single SQL statement"):
+        single_statement(query)
+
+
+@pytest.mark.parametrize(
+    "query",
+    ["SELECT 'a; DROP TABLE t", 'SELECT "a; b', "SELECT $x$;", "SELECT /* /* */ ;"],
+)
+def test_unterminated_tokens_are_rejected(query):
+    with pytest.raises(ValueError, match="Unterminated"):
+        single_statement(query)
+
+
+def test_quoted_semicolons_are_part_of_the_statement():
+    assert (
+        single_statement("SELECT E'it\\'s;', 'it''s;'") == "SELECT E'it\\'s;', 'it''s;'"
+    )
+    assert single_statement("SELECT $a$;$a$, $1, a$b FROM t") == (
+        "SELECT $a$;$a$, $1, a$b FROM t"
+    )
+    assert single_statement("SELECT /* /* ; */ ; */ 1") == "SELECT /* /* ; */ ; */ 1"
+
+
+def test_empty_query_is_rejected():
+    with pytest.raises(ValueError, match="Empty"):
+        single_statement(" ; ")
@@ -0,0 +1,93 @@
+import asyncio
+from chatbot.sql_validator import SQLValidator, repair_answer, arepair_answer
+
+VALID = "```sql\nSELECT id FROM roads;\n```"
+INVALID = "```sql\nSELECT id FROM nowhere;\n```"
+
+
+class StubValidator:
+    """Rejects every query that reads from `nowhere`."""
+
+    def __init__(self):
+        self.validated = []
+
+    def validate(self, query):
+        self.validated.append(query)
+        return 'relation "nowhere" does not exist' if "nowhere" in query else None
+
+
+def test_regenerated_answer_is_validated():
+    validator = StubValidator()
+
+    answer = repair_answer(validator, INVALID, lambda previous, error: VALID, 2)
+
+    assert answer == VALID
+    assert len(validator.validated) == 2
+
+
+def test_answer_still_invalid_after_last_attempt_is_flagged():
+    validator = StubValidator()
+    regenerated = []
+
+    def regenerate(previous, error):
+        regenerated.append(error)
+        return INVALID
+
+    answer = repair_answer(validator, INVALID, regenerate, 2)
+
+    assert len(regenerated) == 2
+    assert len(validator.validated) == 3
+    assert answer.startswith(INVALID)
+    assert 'relation "nowhere" does not exist' in answer
+
+
+def test_zero_attempts_still_validates():
+    validator = StubValidator()
+
+    answer = repair_answer(validator, INVALID, None, 0)
+
+    assert len(validator.validated) == 1
+    assert answer != INVALID and answer.startswith(INVALID)
+    assert repair_answer(validator, VALID, None, 0) == VALID
+
+
+def test_async_repair_validates_the_last_answer():
+    validator = StubValidator()
+
+    async def regenerate(previous, error):
+        return INVALID
+
+    answer = asyncio.run(arepair_answer(validator, INVALID, regenerate, 1))
+
+    assert len(validator.validated) == 2
+    assert "does not exist" in answer
+
+
+class StubDatabase:
+    """Records the statements handed to EXPLAIN."""
+
+    def __init__(self):
+        self.planned = []
+
+    def get_catalog(self):
+        return {"t": ["x"]}
+
+    def explain_query(self, query):
+        self.planned.append(query)
+        return {"cost": 1.0, "rows": 1}
+
+
+def test_statements_the_lexer_cannot_prove_single_are_never_planned():
+    database = StubDatabase()
+    validator = SQLValidator(database)
+
+    for query in (
+        "SELECT E'\\''; DROP TABLE t; COMMIT; SELECT 'x'",
+        "SELECT $$;$$; DROP TABLE t",
+        "SELECT x FROM t WHERE x = 'unterminated",
+    ):
+        assert validator.validate(query) is not None
+
+    assert database.planned == []
+    assert validator.validate("SELECT x FROM t;") is None
+    assert database.planned == ["SELECT x FROM t"]
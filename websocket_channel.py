@@ -0,0 +1,195 @@
+import json
+import asyncio
+from fastapi import HTTPException, WebSocketDisconnect
+from pydantic import ValidationError
+from chatbot.concurrency import QueueFull
+from response_encoding import dumps
+from metrics import registry, Counter
+from config import ws_max_inflight, ws_send_queue
+
+ws_messages = registry.register(
+    Counter(
+        "spatialmind_websocket_messages_total",
+        "Messages received on WebSocket channels, by type.",
+        ["type"],
+    )
+)
+
+
+class Channel:
+    """
+    A client's WebSocket connection to one session, multiplexing concurrent requests.
+
+    Every request message has a "type" and a client-chosen "id"; its handler runs as a
+    task and tags every message it sends with that id. A request ends with exactly one
+    final message (the handler's result, "error" or "cancelled"); before that it may
+    send any number of intermediate ones (tokens, progress, row chunks). A "cancel"
+    message with the id of a running request cancels its task.
+
+    Outgoing messages go through a bounded queue, so a client that reads slowly slows
+    its own requests down instead of growing the server's memory.
+    """
+
+    _open = 0
+
+    def __init__(
+        self,
+        websocket,
+        session_id,
+        handlers,
+        max_inflight=ws_max_inflight,
+        send_queue=ws_send_queue,
+    ):
+        """
+        :param websocket: The accepted WebSocket.
+        :param session_id: The session the channel belongs to.
+        :param handlers: Dict mapping request types to coroutine functions
+                         (channel, request_id, message).
+        :param max_inflight: Maximum number of requests running at once (0 for no limit).
+        :param send_queue: Outgoing messages buffered before senders wait (0 for no bound).
+        """
+        self.websocket = websocket
+        self.session_id = session_id
+        self.handlers = handlers
+        self.max_inflight = max_inflight
+
+        self._outbox = asyncio.Queue(send_queue)
+        self._tasks = {}
+
+    @classmethod
+    def open_channels(cls):
+        """:return: The number of connected channels."""
+        return cls._open
+
+    async def send(self, message):
+        """
+        Queue a message for the client, waiting while the outgoing queue is full.
+
+        :param message: A JSON-serializable dict, or a message already serialized to JSON
+                        text (large row chunks are encoded off the event loop).
+        :return: None
+        """
+        await self._outbox.put(message)
+
+    async def run(self):
+        """
+        Serve the connection until the client disconnects; requests still running are
+        cancelled then.
+
+        :return: None
+        """
+        Channel._open += 1
+        sender = asyncio.create_task(self._send_loop())
+
+        try:
+            while True:
+                self._dispatch(await self.websocket.receive_text())
+        except WebSocketDisconnect:
+            pass
+        finally:
+            Channel._open -= 1
+            tasks = [sender, *self._tasks.values()]
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def _send_loop(self):
+        while True:
+            message = await self._outbox.get()
+            if not isinstance(message, str):
+                message = dumps(message).decode("utf-8")
+            await self.websocket.send_text(message)
+
+    def _reply_nowait(self, message):
+        """Queue a reply to a request that was not started, dropping it if the queue is full."""
+        try:
+            self._outbox.put_nowait(message)
+        except asyncio.QueueFull:
+            pass
+
+    def _dispatch(self, text):
+        """Start the handler of a request message, or cancel a running request."""
+        try:
+            message = json.loads(text)
+            message_type, request_id = message["type"], message["id"]
+            valid = isinstance(message_type, str) and isinstance(request_id, (str, int))
+        except (ValueError, TypeError, KeyError):
+            valid = False
+
+        if not valid:
+            ws_messages.inc(type="invalid")
+            self._reply_nowait(
+                _error(
+                    None, 400, "Messages must be JSON objects with a type and an id."
+                )
+            )
+            return
+
+        known = message_type == "cancel" or message_type in self.handlers
+        ws_messages.inc(type=message_type if known else "unknown")
+
+        if message_type == "cancel":
+            task = self._tasks.get(request_id)
+            if task is not None:
+                task.cancel()
+            return
+
+        handler = self.handlers.get(message_type)
+        if handler is None:
+            self._reply_nowait(
+                _error(request_id, 400, f"Unknown message type: {message_type}")
+            )
+            return
+
+        if request_id in self._tasks:
+            self._reply_nowait(
+                _error(request_id, 409, f"Request {request_id} is already running.")
+            )
+            return
+
+        if self.max_inflight and len(self._tasks) >= self.max_inflight:
+            self._reply_nowait(
+                _error(
+                    request_id,
+                    429,
+                    f"At most {self.max_inflight} requests may run at once.",
+                    retry_after=1,
+                )
+            )
+            return
+
+        self._tasks[request_id] = asyncio.create_task(
+            self._serve(handler, request_id, message)
+        )
+
+    async def _serve(self, handler, request_id, message):
+        try:
+            await handler(self, request_id, message)
+        except asyncio.CancelledError:
+            self._reply_nowait({"type": "cancelled", "id": request_id})
+        except HTTPException as e:
+            await self.send(_error(request_id, e.status_code, e.detail))
+        except QueueFull as e:
+            await self.send(
+                _error(
+                    request_id,
+                    429,
+                    f"Server is busy: {e}",
+                    retry_after=e.retry_after,
+                )
+            )
+        except ValidationError as e:
+            await self.send(_error(request_id, 422, str(e)))
+        except Exception as e:
+            await self.send(_error(request_id, 500, str(e)))
+        finally:
+            self._tasks.pop(request_id, None)
+
+
+def _error(request_id, status, detail, retry_after=None):
+    """:return: An "error" message with an HTTP-like status code."""
+    message = {"type": "error", "id": request_id, "status": status, "detail": detail}
+    if retry_after is not None:
+        message["retry_after"] = retry_after
+
+    return message